@@ -0,0 +1,189 @@
+# Controle de admissão e escalonamento das chamadas ao Gemini (por processo)
+# Quando geração em lote, tarefas em segundo plano e usuários interativos dividem a mesma chave de API,
+# um lote grande não pode deixar quem clicou em "Gerar Texto" esperando. Aqui:
+# - limitamos quantas chamadas rodam ao mesmo tempo;
+# - quem espera fica numa fila por classe de prioridade (interativa > lote > fundo);
+# - dentro de cada classe, os usuários são atendidos em rodízio (fila justa por usuário);
+# - com a fila cheia (ou espera longa demais), recusamos na hora com "ocupado, tente em N s".
+
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+import config
+import metrics
+
+# Classes de prioridade, da mais para a menos prioritária
+INTERATIVA, LOTE, FUNDO = 'interativa', 'lote', 'fundo'
+PRIORIDADES = (INTERATIVA, LOTE, FUNDO)
+
+# Espera máxima padrão (s) por classe antes de desistir; None = espera o quanto for preciso
+ESPERA_MAXIMA_PADRAO = {INTERATIVA: 30, LOTE: 300, FUNDO: None}
+
+# De quanto em quanto tempo (s) quem espera na fila confere se a chamada foi cancelada
+INTERVALO_CANCELAMENTO = 0.25
+
+
+class ServidorOcupado(Exception):
+    """O servidor está sobrecarregado; o pedido foi recusado sem chamar o modelo."""
+
+    def __init__(self, tentar_em):
+        self.tentar_em = tentar_em
+        super().__init__(f"Servidor ocupado no momento. Tente novamente em {tentar_em} s.")
+
+
+class _Pedido:
+    def __init__(self):
+        self.evento = threading.Event()
+        self.liberado = False
+        self.inicio = time.monotonic()
+
+
+class Escalonador:
+    """Limita as chamadas simultâneas e decide quem é atendido primeiro quando todas as vagas estão ocupadas."""
+
+    def __init__(self, max_concorrencia, max_fila):
+        self.max_concorrencia = max_concorrencia
+        self.max_fila = max_fila # Por classe de prioridade
+        self.em_uso = 0
+        # Para cada classe: usuário -> fila de pedidos. A ordem dos usuários define o rodízio.
+        self.filas = {prioridade: OrderedDict() for prioridade in PRIORIDADES}
+        self.aguardando = {prioridade: 0 for prioridade in PRIORIDADES}
+        self._lock = threading.Lock()
+
+    def _atualizar_medidores(self):
+        metrics.definir('admissao.em_uso', self.em_uso)
+        for prioridade in PRIORIDADES:
+            metrics.definir(f'admissao.fila.{prioridade}', self.aguardando[prioridade])
+
+    def estimar_espera(self, prioridade):
+        """Estimativa (s) até uma vaga ficar livre para esta classe, usada no "tente novamente em N s"."""
+        na_frente = sum(self.aguardando[p] for p in PRIORIDADES[:PRIORIDADES.index(prioridade) + 1])
+        duracao = metrics.percentil('gemini.duracao', 50) or 5.0
+        return max(1, math.ceil((na_frente + 1) / self.max_concorrencia * duracao))
+
+    def tem_vaga_livre(self):
+        """True se uma chamada nova começaria agora, sem ninguém esperando na fila."""
+        with self._lock:
+            return self.em_uso < self.max_concorrencia and not any(self.aguardando.values())
+
+    def tentar_entrar(self):
+        """Ocupa uma vaga só se houver uma livre agora, sem ninguém esperando. Retorna True se ocupou."""
+        with self._lock:
+            if self.em_uso >= self.max_concorrencia or any(self.aguardando.values()):
+                return False
+            self.em_uso += 1
+            self._atualizar_medidores()
+            return True
+
+    def entrar(self, prioridade, usuario, espera_maxima, cancelamento=None):
+        """Ocupa uma vaga, esperando na fila se preciso. Levanta ServidorOcupado se não for possível.
+
+        Com `cancelamento`, a espera é interrompida (ChamadaCancelada) se a chamada for cancelada na fila.
+        """
+        with self._lock:
+            ninguem_esperando = not any(self.aguardando.values())
+            if self.em_uso < self.max_concorrencia and ninguem_esperando:
+                self.em_uso += 1
+                self._atualizar_medidores()
+                metrics.observar(f'admissao.espera.{prioridade}', 0.0)
+                return
+            if self.aguardando[prioridade] >= self.max_fila:
+                metrics.incrementar(f'admissao.recusadas.{prioridade}')
+                raise ServidorOcupado(self.estimar_espera(prioridade))
+
+            pedido = _Pedido()
+            self.filas[prioridade].setdefault(usuario, deque()).append(pedido)
+            self.aguardando[prioridade] += 1
+            self._atualizar_medidores()
+
+        if not self._esperar(pedido, espera_maxima, cancelamento):
+            with self._lock:
+                if not pedido.liberado: # A vaga pode ter chegado bem no limite do tempo
+                    fila = self.filas[prioridade][usuario]
+                    fila.remove(pedido)
+                    if not fila:
+                        del self.filas[prioridade][usuario]
+                    self.aguardando[prioridade] -= 1
+                    self._atualizar_medidores()
+                    if cancelamento is not None and cancelamento.cancelado:
+                        cancelamento.verificar()
+                    metrics.incrementar(f'admissao.recusadas.{prioridade}')
+                    raise ServidorOcupado(self.estimar_espera(prioridade))
+        if cancelamento is not None and cancelamento.cancelado:
+            self.sair() # A vaga chegou junto com o cancelamento: passa adiante
+            cancelamento.verificar()
+        metrics.observar(f'admissao.espera.{prioridade}', time.monotonic() - pedido.inicio)
+
+    @staticmethod
+    def _esperar(pedido, espera_maxima, cancelamento):
+        """Espera a vaga. Retorna False se o tempo acabou ou a chamada foi cancelada antes."""
+        if cancelamento is None:
+            return pedido.evento.wait(espera_maxima)
+        limite = None if espera_maxima is None else pedido.inicio + espera_maxima
+        while not cancelamento.cancelado:
+            fatia = INTERVALO_CANCELAMENTO if limite is None else min(INTERVALO_CANCELAMENTO, limite - time.monotonic())
+            if fatia <= 0:
+                return False
+            if pedido.evento.wait(fatia):
+                return True
+        return pedido.evento.is_set()
+
+    def _proximo(self):
+        """Escolhe o próximo pedido: classe mais prioritária primeiro, rodízio entre usuários dentro dela."""
+        for prioridade in PRIORIDADES:
+            usuarios = self.filas[prioridade]
+            if not usuarios:
+                continue
+            usuario, fila = usuarios.popitem(last=False)
+            pedido = fila.popleft()
+            if fila:
+                usuarios[usuario] = fila # Volta para o fim do rodízio
+            self.aguardando[prioridade] -= 1
+            return pedido
+        return None
+
+    def sair(self):
+        """Libera a vaga, passando-a diretamente para o próximo da fila, se houver."""
+        with self._lock:
+            pedido = self._proximo()
+            if pedido is None:
+                self.em_uso -= 1
+            else:
+                pedido.liberado = True
+                pedido.evento.set()
+            self._atualizar_medidores()
+
+
+_escalonador = None
+_escalonador_lock = threading.Lock()
+
+
+def escalonador():
+    """Escalonador único do processo, criado com a configuração atual."""
+    global _escalonador
+    with _escalonador_lock:
+        if _escalonador is None:
+            _escalonador = Escalonador(
+                max_concorrencia=config.ler_int('GERAI_MAX_CONCORRENCIA', 8),
+                max_fila=config.ler_int('GERAI_MAX_FILA', 50)
+            )
+        return _escalonador
+
+
+def espera_maxima(prioridade):
+    """Segundos que um pedido da classe espera antes de desistir (None = sem limite)."""
+    padrao = ESPERA_MAXIMA_PADRAO[prioridade]
+    return config.ler_float(f'GERAI_ESPERA_MAXIMA_{prioridade.upper()}', padrao) if padrao else None
+
+
+@contextmanager
+def vaga(prioridade=INTERATIVA, usuario=None, cancelamento=None):
+    """Ocupa uma vaga de chamada ao modelo durante o bloco `with`."""
+    escalonador().entrar(prioridade, usuario or 'anonimo', espera_maxima(prioridade), cancelamento)
+    try:
+        yield
+    finally:
+        escalonador().sair()
@@ -1,54 +1,58 @@
 # Início do Arquivo
 
-import google.generativeai as genai
 import os
+import contextlib
 from dotenv import load_dotenv
 import docx
 from docx import Document
 import streamlit as st
 from io import BytesIO
 import sqlite3 # Importa a biblioteca SQLite
-from datetime import datetime # Para registrar a data/hora
+from datetime import datetime, timedelta # Para registrar a data/hora
+import time # Duração das chamadas (latência no histórico)
+import gemini_client # Chamada ao Gemini compartilhada entre os scripts
+import metrics # Métricas de desempenho em memória
+import packing # Geração em lote com vários temas por chamada
+import edit_correction # Correção por lista de edições (diff em linha)
+import history_db # Acesso compartilhado ao gerai_history.db
+import incremental_correction # Correção só dos parágrafos alterados
+import jobs # Fila persistente de tarefas em segundo plano
+import admission # Fila de prioridade das chamadas ao Gemini
+import usage # Contagem de tokens e orçamentos de uso
+import semantic_cache # Reaproveita gerações de temas parecidos (opcional)
+import prompts # Modelos de prompt compartilhados (sem indentação)
+import uuid # Identificador anônimo da sessão
+import cancellation # Cancelamento de chamadas substituídas ou abandonadas
+import transport # Transporte (gRPC/REST), keepalive e prazo das chamadas ao Gemini
+import coordination # Cache de respostas e limite de chamadas compartilhados entre processos
+import archive # Arquivo Parquet do histórico e análises com Arrow
+import config # Configurações opcionais (variáveis de ambiente / .env)
+import retention # Retenção do histórico com vacuum incremental
+import ingestion # Leitura de arquivos .txt/.docx em fluxo de parágrafos
+import export # Exportação em massa do histórico (.zip)
+import prefetch # Geração especulativa enquanto o usuário ainda escolhe (opcional)
+import output_guard # Limites de tamanho da saída por tipo de texto
+import precheck # Pré-verificação local da correção (evita ou reduz chamadas)
 
 
 # --- Configuração SQLite para Histórico ---
-DATABASE_NAME = 'gerai_history.db'
+DATABASE_NAME = history_db.DATABASE_NAME # 'gerai_history.db'
 
 def init_db():
     """Inicializa o banco de dados SQLite e cria a tabela de histórico se não existir."""
     try:
-        conn = sqlite3.connect(DATABASE_NAME)
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS interactions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT,
-                operation_type TEXT, -- 'gerar' ou 'corrigir'
-                model_used TEXT,
-                input_text TEXT, -- Tema para gerar, Texto original para corrigir
-                output_text TEXT, -- Texto gerado/revisado
-                text_type TEXT, -- Tipo de texto (Artigo, Email, etc.) - para gerar
-                tone TEXT -- Tom (Formal, Amigável, etc.)
-                -- Poderiam adicionar mais colunas conforme necessário (ex: max_tokens, temperature)
-            )
-        ''')
+        conn = history_db.conectar()
+        history_db.init_interactions(conn) # CREATE TABLE IF NOT EXISTS interactions (...)
         conn.commit()
         conn.close()
     except Exception as e:
         st.error(f"Erro ao inicializar o banco de dados: {e}")
 
-def save_interaction(operation_type, model_used, input_text, output_text, text_type=None, tone=None):
+def save_interaction(operation_type, model_used, input_text, output_text, text_type=None, tone=None, latency_ms=None):
     """Salva uma interação no banco de dados."""
     try:
-        conn = sqlite3.connect(DATABASE_NAME)
-        cursor = conn.cursor()
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S') # Formato YYYY-MM-DD HH:MM:SS
-
-        cursor.execute('''
-            INSERT INTO interactions (timestamp, operation_type, model_used, input_text, output_text, text_type, tone)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (timestamp, operation_type, model_used, input_text, output_text, text_type, tone))
-
+        conn = history_db.conectar()
+        history_db.inserir_interacao(conn, operation_type, model_used, input_text, output_text, text_type, tone, latency_ms)
         conn.commit()
         conn.close()
         # st.success("Interação salva no histórico!") # Mensagem opcional de sucesso
@@ -61,7 +65,8 @@ def load_interactions(limit=20):
         conn = sqlite3.connect(DATABASE_NAME)
         cursor = conn.cursor()
         # Ordena por timestamp em ordem decrescente (mais recente primeiro)
-        cursor.execute('SELECT * FROM interactions ORDER BY timestamp DESC LIMIT ?', (limit,))
+        cursor.execute('SELECT id, timestamp, operation_type, model_used, input_text, output_text, text_type, tone '
+                       'FROM interactions ORDER BY timestamp DESC LIMIT ?', (limit,))
         interactions = cursor.fetchall() # Pega todos os resultados
         conn.close()
         return interactions
@@ -84,38 +89,110 @@ if not GOOGLE_API_KEY:
     st.info("Por favor, adicione GOOGLE_API_KEY='sua_chave_aqui' ao seu arquivo .env na raiz do projeto.")
     st.stop() # Para a execução do script Streamlit aqui
 
-# Configura a ferramenta do Google Gemini com a sua chave
-genai.configure(api_key=GOOGLE_API_KEY)
+# Configura a ferramenta do Google Gemini com a sua chave (transporte e conexão vêm do .env; o cliente
+# é reaproveitado entre as execuções do script)
+transport.configurar(GOOGLE_API_KEY)
 
 # Nome do modelo padrão para usar - **SUBSTITUA PELO NOME CORRETO DA SUA LISTA!**
 # Ex: 'models/gemini-1.5-flash' ou 'models/gemini-1.5-pro'
 default_model_name = 'models/gemini-1.5-flash' # <--- VERIFIQUE/SUBSTITUA ESTE NOME SE NECESSÁRIO
 
+# Inicia (uma vez por processo) os workers da fila de tarefas em segundo plano.
+# Tarefas que ficaram na fila antes de um reinício são retomadas aqui.
+jobs.iniciar_workers()
+# Retenção do histórico em segundo plano (só roda se algum limite estiver configurado)
+retention.iniciar()
+
 # Mostra o modelo usado na barra lateral (opcional)
 st.sidebar.info(f"Modelo usado: {default_model_name}")
 # --- Fim Configuração da API ---
 
 
-# Função auxiliar para interagir com o modelo Gemini
-# Esta função agora VAI LEVANTAR exceções em caso de erro, para que o chamador possa capturá-las.
-def interagir_com_gemini(prompt, max_tokens, temperature, top_p=0.9, top_k=0):
-    """Envia um prompt para o modelo Gemini e retorna a resposta. Levanta exceção em caso de erro."""
-    model = genai.GenerativeModel(default_model_name)
+# Identificador anônimo da sessão, usado para dividir as vagas de chamada de forma justa entre usuários
+if 'usuario_id' not in st.session_state:
+    st.session_state.usuario_id = uuid.uuid4().hex
 
-    generation_config = genai.GenerationConfig(
-        max_output_tokens=max_tokens,
-        temperature=temperature,
-        top_p=top_p,
-        top_k=top_k
-    )
 
-    # AQUI: removemos o try...except interno. Deixamos a exceção "caminhar" para o chamador.
-    response = model.generate_content(
-        prompt,
-        generation_config=generation_config
-    )
+# Chamadas sem prévia do texto (lista de edições, parágrafos, arquivo, lote, verificação local)
+@contextlib.contextmanager
+def chamada_da_sessao():
+    """Cancela a chamada anterior da sessão e entrega o Cancelamento da nova.
+
+    A cada pedaço recebido, um aviso na página é atualizado: é nesse ponto que o Streamlit consegue
+    interromper o script (novo clique, troca de página), como a prévia faz em interagir_com_gemini.
+    """
+    aviso = st.empty()
+    cancelamento = cancellation.substituir(st.session_state.get('chamada_em_andamento'),
+                                           ao_verificar=lambda: aviso.caption("Recebendo a resposta da IA..."))
+    st.session_state.chamada_em_andamento = cancelamento
+    try:
+        yield cancelamento
+    finally:
+        aviso.empty()
+
+
+# Função auxiliar para interagir com o modelo Gemini
+# Esta função agora VAI LEVANTAR exceções em caso de erro, para que o chamador possa capturá-las.
+def interagir_com_gemini(prompt, max_tokens, temperature, top_p=0.9, top_k=0, text_type=None, prioridade=admission.INTERATIVA, tone=None,
+                         instrucao_sistema=None, especulacao=None, cancelamento=None):
+    """Envia um prompt para o modelo Gemini e retorna a resposta. Levanta exceção em caso de erro.
+
+    Com `especulacao` (prefetch.aproveitar), mostra a geração especulativa já começada em vez de chamar o modelo.
+    Com `cancelamento` (de chamada_da_sessao), a chamada faz parte de uma operação maior e usa o cancelamento dela.
+    """
+    # A chamada (e o modo hedging opcional) fica em gemini_client, compartilhado com os outros scripts.
+    # AQUI: não há try...except interno. Deixamos a exceção "caminhar" para o chamador.
+    # Com o servidor sobrecarregado, levanta admission.ServidorOcupado ("tente novamente em N s");
+    # com o limite diário de tokens atingido, levanta usage.OrcamentoEsgotado.
+    # Cada sessão guarda a chamada em andamento: uma chamada nova cancela a anterior que ainda estiver rodando.
+    if cancelamento is None:
+        cancelamento = cancellation.substituir(st.session_state.get('chamada_em_andamento'))
+    if especulacao is not None:
+        cancelamento = especulacao.cancelamento
+    st.session_state.chamada_em_andamento = cancelamento
+    # O texto aparece enquanto chega. Cada atualização da prévia é um ponto em que o Streamlit interrompe o
+    # script (novo clique, troca de página, aba fechada): o stream é fechado e a vaga de chamada liberada.
+    previa = st.empty()
+    partes = []
+    if especulacao is not None:
+        fluxo = especulacao.acompanhar()
+    else:
+        fluxo = gemini_client.stream_texto(default_model_name, prompt, max_tokens, temperature, top_p, top_k, text_type=text_type,
+                                           prioridade=prioridade, usuario=st.session_state.usuario_id, tom=tone,
+                                           instrucao_sistema=instrucao_sistema, cancelamento=cancelamento)
+    try:
+        for pedaco in fluxo:
+            partes.append(pedaco)
+            previa.markdown(''.join(partes) + '▌')
+    finally:
+        fluxo.close()
+    previa.empty()
+    return ''.join(partes)
+
+
+# Correção de arquivos enviados (.txt/.docx)
+def corrigir_arquivo(arquivo, tom, cancelamento=None):
+    """Corrige um documento enviado, lido em fluxo de parágrafos, mostrando o progresso. Levanta exceção em caso de erro."""
+    progresso = st.empty()
+    corrigidos, sugestoes = [], []
+    enviados = reaproveitados = grupos_com_falha = 0
+    paragrafos = ingestion.ler_paragrafos(arquivo, arquivo.name)
+    for grupo in incremental_correction.corrigir_documento(default_model_name, paragrafos, tom,
+                                                           st.session_state.setdefault('cache_paragrafos', {}),
+                                                           usuario=st.session_state.usuario_id, cancelamento=cancelamento):
+        corrigidos.extend(grupo['paragrafos'])
+        sugestoes.extend(grupo['sugestoes'])
+        enviados += grupo['enviados']
+        reaproveitados += grupo['reaproveitados']
+        grupos_com_falha += grupo['falhou']
+        progresso.caption(f"{len(corrigidos)} parágrafo(s) corrigido(s)...")
+    if not corrigidos:
+        raise ingestion.DocumentoInvalido("O arquivo não tem texto para corrigir.")
+    progresso.caption(f"{len(corrigidos)} parágrafo(s) no arquivo: {enviados} enviado(s) à IA, {reaproveitados} reaproveitado(s) de correções anteriores.")
+    if grupos_com_falha:
+        st.warning("Alguns trechos não puderam ser corrigidos e ficaram como no original.")
+    return edit_correction.formatar_resultado('\n\n'.join(corrigidos), sugestoes)
 
-    return response.text
 
 # Função auxiliar para preparar DOCX para download
 def to_docx_buffer(text_content):
@@ -129,36 +206,66 @@ def to_docx_buffer(text_content):
     return buffer
 
 
+# --- Tarefas em segundo plano ---
+# Os ids ficam na URL (query params) para sobreviver a recarregamentos e reconexões da página
+def ids_tarefas():
+    """Retorna os ids das tarefas em segundo plano acompanhadas nesta página."""
+    return [int(job_id) for job_id in st.query_params.get('tarefas', '').split(',') if job_id.isdigit()]
+
+def acompanhar_tarefa(job_id):
+    """Passa a acompanhar uma tarefa recém-enfileirada."""
+    st.query_params['tarefas'] = ','.join(str(i) for i in ids_tarefas() + [job_id])
+
+@st.fragment(run_every=2)
+def painel_tarefas():
+    """Mostra o status das tarefas (atualiza sozinho a cada 2 segundos)."""
+    icones = {jobs.QUEUED: '⏳ Na fila', jobs.RUNNING: '⚙️ Executando', jobs.DONE: '✅ Concluída', jobs.FAILED: '❌ Falhou'}
+    for tarefa in reversed(jobs.consultar(ids_tarefas())):
+        descricao = tarefa['text_type'] or 'Correção'
+        cabecalho = f"Tarefa #{tarefa['id']} - {icones.get(tarefa['status'], tarefa['status'])} ({descricao}, {tarefa['tone']})"
+        with st.expander(cabecalho, expanded=tarefa['status'] == jobs.DONE):
+            st.write(f"**Input:** {tarefa['input_text']}")
+            if tarefa['status'] == jobs.DONE:
+                st.write(tarefa['result'])
+                st.download_button("Download como TXT", data=tarefa['result'], file_name=f"gerai_tarefa_{tarefa['id']}.txt",
+                                   mime="text/plain", key=f"dl_tarefa_{tarefa['id']}")
+            elif tarefa['status'] == jobs.FAILED:
+                st.error(f"Ocorreu um erro durante a tarefa: {tarefa['error']}")
+
+
 # --- Lógica da Interface Streamlit ---
 st.title("GerAI - Seu Assistente de Escrita com IA") # Título principal
 
+# --- Opções de tipo de texto e tom (usadas nas páginas de geração) ---
+tipos_texto_gerar = { # Usamos chaves numéricas, mas o selectbox usa os valores como labels
+    '1': 'Artigo/Texto Acadêmico',
+    '2': 'E-mail Profissional',
+    '3': 'Post para Redes Sociais (Ideias e Sugestões)',
+    '4': 'Conteúdo de Marketing Digital (Ideias, sugestões, descrição de Produto)',
+    '5': 'Roteiro Simples (Viagens entre outros)',
+    '6': 'Descrição de Produto'
+}
+
+tons_disponiveis = {
+    '1': 'Formal', '2': 'Amigável', '3': 'Persuasivo',
+    '4': 'Técnico', '5': 'Criativo', '6': 'Neutro'
+}
+
 # --- Opções de Operação (Gerar ou Corrigir) ---
 # Usamos st.sidebar para colocar as opções na barra lateral
-operacao = st.sidebar.radio("O que gostaria de fazer?", ["Gerar um novo texto", "Corrigir/Aprimorar um texto existente", "Ver Histórico"]) # Adicionado opção Histórico
+operacao = st.sidebar.radio("O que gostaria de fazer?", ["Gerar um novo texto", "Gerar em lote (vários temas)", "Corrigir/Aprimorar um texto existente", "Ver Histórico"]) # Adicionado opção Histórico
 
 # --- Se a operação escolhida for Gerar Texto ---
 if operacao == "Gerar um novo texto":
     st.header("Gerar Novo Texto") # Título da seção
 
     # --- Inputs para Geração ---
-    tipos_texto_gerar = { # Usamos chaves numéricas, mas o selectbox usa os valores como labels
-        '1': 'Artigo/Texto Acadêmico',
-        '2': 'E-mail Profissional',
-        '3': 'Post para Redes Sociais (Ideias e Sugestões)',
-        '4': 'Conteúdo de Marketing Digital (Ideias, sugestões, descrição de Produto)',
-        '5': 'Roteiro Simples (Viagens entre outros)',
-        '6': 'Descrição de Produto'
-    }
     # Obtemos o nome da opção selecionada diretamente pelo valor do dicionário
     tipo_selecionado_label = st.selectbox("Escolha o tipo de texto a gerar:", list(tipos_texto_gerar.values()))
     # Encontramos a chave numérica correspondente (útil para salvar no DB se necessário, ou apenas o label)
     tipo_selecionado_key = list(tipos_texto_gerar.keys())[list(tipos_texto_gerar.values()).index(tipo_selecionado_label)]
 
 
-    tons_disponiveis = {
-        '1': 'Formal', '2': 'Amigável', '3': 'Persuasivo',
-        '4': 'Técnico', '5': 'Criativo', '6': 'Neutro'
-    }
     # Obtemos o nome do tom selecionado
     tom_selecionado_label = st.selectbox("Escolha o tom para o texto:", list(tons_disponiveis.values()))
     # Encontramos a chave numérica correspondente (opcional)
@@ -166,6 +273,14 @@ if operacao == "Gerar um novo texto":
 
 
     tema = st.text_input("Certo, qual tema/assunto deve ter o seu texto?")
+    em_segundo_plano = st.checkbox("Executar em segundo plano (o resultado não se perde se a página recarregar)", key='gerar_segundo_plano')
+
+    # Geração especulativa: com os campos estáveis, a geração começa antes do clique (GERAI_PREFETCH=1)
+    especulacao = None
+    if prefetch.ativo() and not em_segundo_plano:
+        especulacao = prefetch.agendar(st.session_state.get('prefetch'), default_model_name, st.session_state.usuario_id,
+                                       tipo_selecionado_label, tom_selecionado_label, tema)
+        st.session_state.prefetch = especulacao
 
     # --- Botão para acionar a geração ---
     if st.button("Gerar Texto"):
@@ -173,73 +288,52 @@ if operacao == "Gerar um novo texto":
             st.warning("Por favor, digite um tema/assunto.")
         else:
             # --- Lógica de construção do prompt e chamada da API ---
-            prompt_base = f"""Crie um texto completo e bem estruturado do tipo "{tipo_selecionado_label}" sobre o tema/assunto: "{tema}"
-            Use um tom "{tom_selecionado_label}".
-            Não use gírias, palavrões ou termos complexos demais a menos que o tema ou o tom técnico exijam e sejam explicados.
-            Responda em formato Markdown.
-            """
-            # Ajustes de parâmetros padrão para geração
-            temp = 0.7
-            max_tok = 1000 # Limite padrão para geração
-            top_p_val = 0.9
-            top_k_val = 0
-
-            # Adiciona instruções e ajusta parâmetros específicos baseados no tipo de texto
-            if tipo_selecionado_label == 'Artigo/Texto Acadêmico':
-                 prompt_base += "\nInclua introdução, desenvolvimento com argumentos e exemplos relevantes, e conclusão. Mantenha a formalidade e objetividade."
-                 temp = 0.6
-                 max_tok = 1800
-                 top_p_val = 0.95
-                 top_k_val = 50
-            elif tipo_selecionado_label == 'E-mail Profissional':
-                 prompt_base += "\nFormate a resposta como um e-mail profissional pronto para envio, com linhas para Assunto: e Corpo:."
-                 temp = 0.5
-                 max_tok = 800
-                 top_p_val = 0.9
-                 top_k_val = 0
-            elif 'Post para Redes Sociais' in tipo_selecionado_label:
-                 prompt_base += "\nSeja conciso (máximo 280 caracteres se for Twitter, ajuste para outras redes), use linguagem engajadora e inclua hashtags relevantes ao tema."
-                 temp = 0.8
-                 max_tok = 400
-                 top_p_val = 0.9
-                 top_k_val = 0
-            elif 'Marketing Digital' in tipo_selecionado_label:
-                 prompt_base += "\nFoque nos benefícios, crie urgência ou desejo e inclua uma chamada para ação (call to action) clara relevante ao tema/produto/serviço."
-                 temp = 0.9
-                 max_tok = 1000
-                 top_p_val = 0.9
-                 top_k_val = 0
-            elif 'Roteiro Simples' in tipo_selecionado_label:
-                 prompt_base += "\nFormate como um roteiro básico, com indicação de cenas, diálogos e ações."
-                 temp = 0.8
-                 max_tok = 1200
-                 top_p_val = 0.95
-                 top_k_val = 50
-            elif tipo_selecionado_label == 'Descrição de Produto':
-                 prompt_base += "\nDescreva as características e benefícios do produto de forma atraente para um público comprador."
-                 temp = 0.7
-                 max_tok = 600
-                 top_p_val = 0.9
-                 top_k_val = 0
+            prompt_base, max_tok, temp, top_p_val, top_k_val = prompts.montar_prompt_geracao(tipo_selecionado_label, tom_selecionado_label, tema)
 
             # --- CHAMADA PARA A API COM TRATAMENTO DE ERRO MELHORADO ---
             texto_gerado = None # Inicializa a variável
-            try:
-                with st.spinner("Gerando texto..."):
-                     texto_gerado = interagir_com_gemini(prompt_base, max_tok, temp, top_p_val, top_k_val)
-                # Se a API retornar uma mensagem de erro (começando com "Ocorreu um erro..."), mostre como erro
-                if texto_gerado and texto_gerado.startswith("Ocorreu um erro"):
-                     st.error(texto_gerado)
-                     texto_gerado = None # Limpa o texto gerado se for uma mensagem de erro
-                elif texto_gerado: # Se não for erro e tiver texto
-                    st.subheader("Texto Gerado:")
-                    st.write(texto_gerado) # Exibe o texto gerado
-
-                    # Salva no histórico
-                    save_interaction('gerar', default_model_name, tema, texto_gerado, tipo_selecionado_label, tom_selecionado_label)
-
-            except Exception as e: # Captura qualquer outro erro durante a chamada ou processamento
-                st.error(f"Ocorreu um erro inesperado durante a geração: {e}")
+            if em_segundo_plano:
+                job_id = jobs.enfileirar('gerar', default_model_name, prompt_base, max_tok, temp, top_p_val, top_k_val,
+                                         text_type=tipo_selecionado_label, input_text=tema, tone=tom_selecionado_label,
+                                         instrucao_sistema=prompts.instrucao_geracao(tipo_selecionado_label))
+                acompanhar_tarefa(job_id)
+                st.info(f"Tarefa #{job_id} enviada para a fila. Acompanhe em \"Tarefas em segundo plano\"; o resultado é salvo no histórico.")
+            else:
+                try:
+                    inicio = time.monotonic()
+                    with st.spinner("Gerando texto..."):
+                         texto_gerado, do_cache = semantic_cache.gerar_com_cache(
+                             default_model_name, tipo_selecionado_label, tom_selecionado_label, tema,
+                             lambda: interagir_com_gemini(prompt_base, max_tok, temp, top_p_val, top_k_val, text_type=tipo_selecionado_label, tone=tom_selecionado_label,
+                                                          instrucao_sistema=prompts.instrucao_geracao(tipo_selecionado_label),
+                                                          especulacao=prefetch.aproveitar(especulacao, tipo_selecionado_label,
+                                                                                          tom_selecionado_label, tema))
+                         )
+                    prefetch.descartar(especulacao) # Não aproveitada (ex.: o cache semântico respondeu antes)
+                    # Se a API retornar uma mensagem de erro (começando com "Ocorreu um erro..."), mostre como erro
+                    if texto_gerado and texto_gerado.startswith("Ocorreu um erro"):
+                         st.error(texto_gerado)
+                         texto_gerado = None # Limpa o texto gerado se for uma mensagem de erro
+                    elif texto_gerado: # Se não for erro e tiver texto
+                        st.subheader("Texto Gerado:")
+                        st.write(texto_gerado) # Exibe o texto gerado
+                        if do_cache:
+                            st.caption("Texto reaproveitado de um pedido com tema parecido (cache semântico).")
+                        elif especulacao is not None and especulacao.aproveitada:
+                            st.caption("Texto adiantado enquanto você escolhia as opções (geração especulativa).")
+
+                        # Salva no histórico. Sem chamada ao modelo neste pedido (cache semântico ou geração especulativa
+                        # já adiantada), a latência fica vazia para não distorcer os percentis.
+                        sem_chamada = do_cache or (especulacao is not None and especulacao.aproveitada)
+                        save_interaction('gerar', default_model_name, tema, texto_gerado, tipo_selecionado_label, tom_selecionado_label,
+                                         latency_ms=None if sem_chamada else (time.monotonic() - inicio) * 1000)
+
+                except (admission.ServidorOcupado, usage.OrcamentoEsgotado, transport.PrazoEsgotado) as e: # Sobrecarga, limite de uso ou prazo: avisa na hora
+                    st.warning(str(e))
+                except cancellation.ChamadaCancelada: # Substituída por um pedido mais novo desta sessão
+                    st.info("Geração cancelada: um pedido mais novo tomou o lugar desta.")
+                except Exception as e: # Captura qualquer outro erro durante a chamada ou processamento
+                    st.error(f"Ocorreu um erro inesperado durante a geração: {e}")
 
 
             # --- Botões de Download ---
@@ -270,12 +364,62 @@ if operacao == "Gerar um novo texto":
                       st.error(f"Erro ao preparar DOCX para download: {e}")
 
 
+# --- Se a operação escolhida for Gerar em Lote ---
+elif operacao == "Gerar em lote (vários temas)":
+    st.header("Gerar em Lote")
+    st.write("Gere um texto para cada tema da lista. Vários temas vão numa única chamada, "
+             "o que rende muito mais itens por minuto em textos curtos (posts, descrições de produto).")
+
+    tipo_lote = st.selectbox("Escolha o tipo de texto a gerar:", list(tipos_texto_gerar.values()), index=2)
+    tom_lote = st.selectbox("Escolha o tom para os textos:", list(tons_disponiveis.values()))
+    temas_texto = st.text_area("Temas/assuntos (um por linha):", height=200)
+
+    if st.button("Gerar Lote"):
+        temas = [linha.strip() for linha in temas_texto.splitlines() if linha.strip()]
+        if not temas:
+            st.warning("Por favor, digite pelo menos um tema/assunto.")
+        else:
+            instrucao, max_tok, temp, top_p_val, top_k_val = prompts.parametros_geracao(tipo_lote)
+
+            def gerar_individual(tema):
+                """Refaz sozinho um item que não veio válido no pacote (com o cancelamento do lote)."""
+                prompt_item, max_tok_item, temp_item, top_p_item, top_k_item = prompts.montar_prompt_geracao(tipo_lote, tom_lote, tema)
+                return interagir_com_gemini(prompt_item, max_tok_item, temp_item, top_p_item, top_k_item, text_type=tipo_lote,
+                                            prioridade=admission.LOTE, tone=tom_lote, instrucao_sistema=prompts.instrucao_geracao(tipo_lote),
+                                            cancelamento=cancelamento)
+
+            progresso = st.progress(0.0, text="Gerando textos...")
+            gerados = 0
+            try:
+                with chamada_da_sessao() as cancelamento:
+                    resultados = packing.gerar_em_lote(default_model_name, temas, tipo_lote, tom_lote, instrucao,
+                                                       max_tok, temp, top_p_val, top_k_val, gerar_individual,
+                                                       usuario=st.session_state.usuario_id, cancelamento=cancelamento)
+                    for numero, (tema, texto, erro) in enumerate(resultados, start=1):
+                        progresso.progress(numero / len(temas), text=f"{numero} de {len(temas)} temas processados")
+                        if erro is not None:
+                            st.error(f"Erro ao gerar o texto para \"{tema}\": {erro}")
+                            continue
+
+                        gerados += 1
+                        # Cada item vira uma linha própria no histórico
+                        save_interaction('gerar', default_model_name, tema, texto, tipo_lote, tom_lote)
+                        with st.expander(f"{numero}. {tema}"):
+                            st.write(texto)
+
+                st.success(f"{gerados} de {len(temas)} textos gerados e salvos no histórico.")
+            except cancellation.ChamadaCancelada: # Substituída por um pedido mais novo desta sessão
+                st.info(f"Lote cancelado: um pedido mais novo tomou o lugar deste ({gerados} texto(s) já salvos no histórico).")
+
+
 # --- Se a operação escolhida for Corrigir Texto ---
 elif operacao == "Corrigir/Aprimorar um texto existente":
     st.header("Corrigir/Aprimorar Texto") # Título da seção
 
     # --- Inputs para Correção ---
     texto_original = st.text_area("Cole o texto aqui:", height=200)
+    # Documentos grandes: lidos em fluxo de parágrafos, sem colar (os parágrafos do arquivo são mantidos)
+    arquivo_correcao = st.file_uploader("Ou envie um arquivo (.txt ou .docx):", type=['txt', 'docx'])
 
     tons_disponiveis_correcao = { # Usamos os mesmos tons
         '1': 'Formal', '2': 'Amigável', '3': 'Persuasivo',
@@ -286,49 +430,108 @@ elif operacao == "Corrigir/Aprimorar um texto existente":
     # Encontramos a chave numérica correspondente (opcional)
     tom_selecionado_correcao_key = list(tons_disponiveis_correcao.keys())[list(tons_disponiveis_correcao.values()).index(tom_selecionado_correcao_label)]
 
+    # Lista de edições: a IA devolve só o que muda, bem mais rápido em textos longos e quase corretos
+    # Parágrafos alterados: ao corrigir de novo, só o que mudou desde a última correção vai para a IA
+    modo_correcao = st.radio("Modo de correção:", ["Texto completo revisado", "Lista de edições (mais rápido para textos longos)",
+                                                   "Somente parágrafos alterados (reaproveita correções anteriores)"])
+    em_segundo_plano_correcao = st.checkbox("Executar em segundo plano (o resultado não se perde se a página recarregar)", key='corrigir_segundo_plano')
+
 
     # --- Botão para acionar a correção ---
     if st.button("Corrigir Texto"):
-        if not texto_original:
-            st.warning("Por favor, cole o texto para corrigir.")
+        if not texto_original and arquivo_correcao is None:
+            st.warning("Por favor, cole o texto ou envie um arquivo para corrigir.")
         else:
              # --- Lógica de construção do prompt e chamada da API ---
-             prompt_correcao = f"""Por favor, revise e aprimore o seguinte texto.
-             Use um tom {tom_selecionado_correcao_label} na revisão e nas sugestões.
-             Corrija erros de ortografia, gramática, pontuação e dê sugestões para melhorar a clareza, a coesão e a fluidez. Mantenha o significado original do texto.
-             Não use gírias, palavrões ou termos complexos demais a menos que o texto original já os contenha e seja necessário revisá-los.
-             Forneça o texto revisado e, em uma seção separada marcada como "Sugestões:", liste as sugestões de melhoria em tópicos numerados.
-             Responda em formato Markdown.
-
-             Texto a revisar:
-             {texto_original}
-
-             Texto revisado:
-             """
+             if arquivo_correcao is not None:
+                 # O arquivo é corrigido por grupos de parágrafos (corrigir_arquivo), sem um prompt único
+                 texto_original = f"Arquivo: {arquivo_correcao.name}"
+                 prompt_correcao = None
+             else:
+                 # Texto colado sem espaços repetidos (os parágrafos continuam iguais)
+                 texto_original = prompts.normalizar_texto(texto_original)
+                 # As instruções fixas vão em prompts.instrucao_correcao(); aqui só o que muda a cada pedido
+                 prompt_correcao = prompts.montar_prompt_correcao(tom_selecionado_correcao_label, texto_original)
              # Parâmetros para correção
-             temp = 0.5
-             max_tok = 1500
-             top_p_val = 0.9
-             top_k_val = 0
+             max_tok, temp, top_p_val, top_k_val = prompts.PARAMETROS_CORRECAO
 
              # --- CHAMADA PARA A API COM TRATAMENTO DE ERRO MELHORADO ---
              texto_revisado_completo = None # Inicializa
-             try:
-                 with st.spinner("Corrigindo texto..."):
-                      texto_revisado_completo = interagir_com_gemini(prompt_correcao, max_tok, temp, top_p_val, top_k_val)
-                 # Se a API retornar uma mensagem de erro
-                 if texto_revisado_completo and texto_revisado_completo.startswith("Ocorreu um erro"):
-                      st.error(texto_revisado_completo)
-                      texto_revisado_completo = None # Limpa o resultado se for erro
-                 elif texto_revisado_completo: # Se não for erro e tiver texto
-                     st.subheader("Texto Revisado e Sugestões:")
-                     st.write(texto_revisado_completo) # st.write exibe o resultado
-
-                     # Salva no histórico
-                     save_interaction('corrigir', default_model_name, texto_original[:200] + '...' if len(texto_original) > 200 else texto_original, texto_revisado_completo, None, tom_selecionado_correcao_label) # Salva input truncado se for muito longo
-
-             except Exception as e: # Captura qualquer outro erro
-                 st.error(f"Ocorreu um erro inesperado durante a correção: {e}")
+             correcao_edicoes = None
+             if em_segundo_plano_correcao and arquivo_correcao is None:
+                 # Em segundo plano a correção é sempre a do texto completo (arquivos são corrigidos nesta página)
+                 job_id = jobs.enfileirar('corrigir', default_model_name, prompt_correcao, max_tok, temp, top_p_val, top_k_val,
+                                          input_text=texto_original[:200] + '...' if len(texto_original) > 200 else texto_original,
+                                          tone=tom_selecionado_correcao_label, instrucao_sistema=prompts.instrucao_correcao())
+                 acompanhar_tarefa(job_id)
+                 st.info(f"Tarefa #{job_id} enviada para a fila. Acompanhe em \"Tarefas em segundo plano\"; o resultado é salvo no histórico.")
+             else:
+                 try:
+                     inicio = time.monotonic()
+                     with st.spinner("Corrigindo texto..."), chamada_da_sessao() as cancelamento:
+                          correcao_previa = None
+                          if arquivo_correcao is None and not modo_correcao.startswith("Somente parágrafos") and precheck.ativo():
+                              # Verificação local: sem nada suspeito, nem chama a IA; com poucos trechos, só eles vão
+                              correcao_previa = precheck.corrigir(default_model_name, texto_original, tom_selecionado_correcao_label,
+                                                                  usuario=st.session_state.usuario_id, cancelamento=cancelamento)
+                          if arquivo_correcao is not None:
+                              texto_revisado_completo = corrigir_arquivo(arquivo_correcao, tom_selecionado_correcao_label, cancelamento)
+                          elif correcao_previa is not None:
+                              correcao_edicoes = correcao_previa
+                              texto_revisado_completo = correcao_previa['resultado']
+                              if correcao_previa['local']:
+                                  st.caption("Verificação local: nenhum problema que precise da IA; o texto não foi enviado e o tom escolhido não foi aplicado.")
+                              else:
+                                  st.caption(f"Verificação local: só {correcao_previa['trechos_enviados']} trecho(s) suspeito(s) enviado(s) à IA.")
+                          elif modo_correcao.startswith("Lista de edições"):
+                              # Se as edições não se aplicarem ao texto, cai na correção completa
+                              correcao_edicoes = edit_correction.corrigir_com_edicoes(
+                                  default_model_name, texto_original, tom_selecionado_correcao_label,
+                                  lambda: interagir_com_gemini(prompt_correcao, max_tok, temp, top_p_val, top_k_val, text_type='corrigir', tone=tom_selecionado_correcao_label,
+                                                               instrucao_sistema=prompts.instrucao_correcao(), cancelamento=cancelamento),
+                                  max_tokens=max_tok, usuario=st.session_state.usuario_id, cancelamento=cancelamento
+                              )
+                              texto_revisado_completo = correcao_edicoes['resultado']
+                          elif modo_correcao.startswith("Somente parágrafos"):
+                              correcao_incremental = incremental_correction.corrigir_incremental(
+                                  default_model_name, texto_original, tom_selecionado_correcao_label,
+                                  st.session_state.setdefault('cache_paragrafos', {}),
+                                  lambda: interagir_com_gemini(prompt_correcao, max_tok, temp, top_p_val, top_k_val, text_type='corrigir', tone=tom_selecionado_correcao_label,
+                                                               instrucao_sistema=prompts.instrucao_correcao(), cancelamento=cancelamento),
+                                  usuario=st.session_state.usuario_id, cancelamento=cancelamento
+                              )
+                              texto_revisado_completo = correcao_incremental['resultado']
+                              st.caption(f"{correcao_incremental['enviados']} parágrafo(s) enviado(s) à IA, "
+                                         f"{correcao_incremental['reaproveitados']} de {correcao_incremental['total']} reaproveitado(s) de correções anteriores.")
+                          else:
+                              texto_revisado_completo = interagir_com_gemini(prompt_correcao, max_tok, temp, top_p_val, top_k_val, text_type='corrigir', tone=tom_selecionado_correcao_label,
+                                                                             instrucao_sistema=prompts.instrucao_correcao(), cancelamento=cancelamento)
+                     # Se a API retornar uma mensagem de erro
+                     if texto_revisado_completo and texto_revisado_completo.startswith("Ocorreu um erro"):
+                          st.error(texto_revisado_completo)
+                          texto_revisado_completo = None # Limpa o resultado se for erro
+                     elif texto_revisado_completo: # Se não for erro e tiver texto
+                         if correcao_edicoes and correcao_edicoes['modo'] == 'edicoes':
+                             st.subheader("Alterações:")
+                             st.markdown(correcao_edicoes['diff'])
+                             with st.expander(f"Edições aplicadas ({len(correcao_edicoes['edicoes'])})"):
+                                 for edicao in correcao_edicoes['edicoes']:
+                                     st.write(f"~~{edicao['trecho']}~~ → **{edicao['substituicao']}** — {edicao['motivo']}")
+                         elif correcao_edicoes:
+                             st.info("As edições sugeridas não se encaixaram no texto; usamos a correção completa.")
+                         st.subheader("Texto Revisado e Sugestões:")
+                         st.write(texto_revisado_completo) # st.write exibe o resultado
+
+                         # Salva no histórico
+                         save_interaction('corrigir', default_model_name, texto_original[:200] + '...' if len(texto_original) > 200 else texto_original, texto_revisado_completo, None, tom_selecionado_correcao_label, # Salva input truncado se for muito longo
+                                          latency_ms=None if correcao_previa is not None and correcao_previa['local'] else (time.monotonic() - inicio) * 1000)
+
+                 except (admission.ServidorOcupado, usage.OrcamentoEsgotado, transport.PrazoEsgotado) as e: # Sobrecarga, limite de uso ou prazo: avisa na hora
+                     st.warning(str(e))
+                 except cancellation.ChamadaCancelada: # Substituída por um pedido mais novo desta sessão
+                     st.info("Correção cancelada: um pedido mais novo tomou o lugar desta.")
+                 except Exception as e: # Captura qualquer outro erro
+                     st.error(f"Ocorreu um erro inesperado durante a correção: {e}")
 
 
              # --- Botões de Download ---
@@ -363,6 +566,132 @@ elif operacao == "Corrigir/Aprimorar um texto existente":
 elif operacao == "Ver Histórico":
     st.header("Histórico de Interações")
 
+    # --- Resumo de uso (tokens e custo estimado) para planejar a capacidade ---
+    with st.expander("Resumo de uso (tokens e custo estimado)"):
+        agrupar_por = st.selectbox("Agrupar por:", list(usage.AGRUPAMENTOS.keys()),
+                                   format_func=lambda chave: chave.capitalize())
+        dias_resumo = st.number_input("Últimos dias:", min_value=1, max_value=365, value=30)
+        linhas_uso = usage.resumo(agrupar_por, int(dias_resumo))
+        if not linhas_uso:
+            st.info("Nenhum consumo de tokens registrado neste período.")
+        else:
+            total_tokens = sum(linha['tokens_total'] for linha in linhas_uso)
+            total_custo = sum(linha['custo_usd'] for linha in linhas_uso)
+            col_tokens, col_custo, col_hoje = st.columns(3)
+            col_tokens.metric("Tokens no período", f"{total_tokens:,}".replace(',', '.'))
+            col_custo.metric("Custo estimado (US$)", f"{total_custo:.4f}")
+            col_hoje.metric("Seus tokens hoje", usage.consumo_dia(st.session_state.usuario_id))
+            st.dataframe(linhas_uso, use_container_width=True)
+
+    # --- Análises do histórico completo (banco + arquivo Parquet) ---
+    with st.expander("Análises do histórico e arquivo (Parquet)"):
+        dias_analise = st.number_input("Analisar os últimos dias:", min_value=1, max_value=3650, value=365)
+        desde = (datetime.now() - timedelta(days=int(dias_analise))).strftime('%Y-%m-%d')
+        try:
+            analise = archive.analisar(desde=desde)
+            st.metric("Interações no período", analise['total'])
+            st.write("**Volume por tipo e tom:**")
+            st.dataframe(analise['volume'].to_pandas(), use_container_width=True)
+            st.write("**Volume por mês:**")
+            st.dataframe(analise['volume_mensal'].to_pandas(), use_container_width=True)
+            st.write("**Tamanho dos textos (caracteres):**")
+            st.dataframe(analise['tamanho_saida'].to_pandas(), use_container_width=True)
+            st.write("**Latência (ms):**")
+            st.dataframe(analise['latencia'].to_pandas(), use_container_width=True)
+        except Exception as e:
+            st.error(f"Erro ao analisar o histórico: {e}")
+
+        st.markdown("---")
+        dias_arquivo = st.number_input("Arquivar interações com mais de (dias):", min_value=1, max_value=3650,
+                                       value=config.ler_int('GERAI_ARQUIVAR_APOS_DIAS', archive.DIAS_PADRAO))
+        if st.button("Arquivar agora"):
+            try:
+                with st.spinner("Movendo interações antigas para o arquivo..."):
+                    movidas = archive.arquivar(int(dias_arquivo))
+                st.success(f"{movidas} interação(ões) movida(s) para {archive.diretorio()}.")
+            except Exception as e:
+                st.error(f"Erro ao arquivar o histórico: {e}")
+
+    # --- Retenção: interações além dos limites são apagadas em segundo plano ---
+    with st.expander("Retenção do histórico"):
+        limites_retencao = {operacao: retention.limites(operacao) for operacao in retention.OPERACOES}
+        st.write("**Limites (0 = sem limite):**")
+        st.json(limites_retencao)
+        relatorio_retencao = retention.ultimo_relatorio()
+        if relatorio_retencao:
+            st.write("**Última execução:**")
+            st.json(relatorio_retencao)
+        else:
+            st.info("A retenção ainda não foi executada.")
+        if st.button("Aplicar retenção agora"):
+            try:
+                with st.spinner("Apagando interações além dos limites..."):
+                    relatorio_retencao = retention.executar()
+                recuperados_mb = relatorio_retencao['bytes_recuperados'] / (1024 * 1024)
+                st.success(f"{sum(relatorio_retencao['linhas_apagadas'].values())} interação(ões) apagada(s), "
+                           f"{recuperados_mb:.1f} MB recuperados em {relatorio_retencao['duracao_s']} s.")
+            except Exception as e:
+                st.error(f"Erro ao aplicar a retenção: {e}")
+        if not retention.vacuum_incremental_ligado():
+            # Conversão única e explícita: o VACUUM completo trava as gravações até terminar
+            st.warning("O banco foi criado sem auto-vacuum: as interações apagadas liberam espaço para novas, mas o arquivo não diminui. "
+                       "A conversão faz um VACUUM completo, que trava o banco até terminar; faça num horário de pouco uso.")
+            if st.button("Converter para auto-vacuum incremental"):
+                try:
+                    with st.spinner("Reescrevendo o banco (VACUUM)..."):
+                        conversao = retention.converter_vacuum()
+                    if conversao:
+                        st.success(f"Banco convertido em {conversao['duracao_s']} s; "
+                                   f"{conversao['bytes_recuperados'] / (1024 * 1024):.1f} MB recuperados.")
+                except Exception as e:
+                    st.error(f"Erro ao converter o banco: {e}")
+
+    # --- Exportação em massa: um recorte do histórico num .zip (DOCX, TXT, JSONL ou CSV) ---
+    with st.expander("Exportar histórico"):
+        col_desde, col_ate = st.columns(2)
+        data_desde = col_desde.date_input("De:", value=datetime.now().date() - timedelta(days=30))
+        data_ate = col_ate.date_input("Até (inclusive):", value=datetime.now().date())
+        operacao_exportar = st.selectbox("Operação:", ["Todas", "gerar", "corrigir"])
+        formato_exportar = st.selectbox("Formato:", export.FORMATOS,
+                                        format_func=lambda formato: {'docx': 'DOCX (um arquivo por interação)',
+                                                                     'txt': 'TXT (um arquivo por interação)',
+                                                                     'jsonl': 'JSONL (um arquivo só)',
+                                                                     'csv': 'CSV (um arquivo só)'}[formato])
+        filtros_exportar = {
+            'desde': data_desde.strftime('%Y-%m-%d'),
+            'ate': (data_ate + timedelta(days=1)).strftime('%Y-%m-%d'),
+            'operation_type': None if operacao_exportar == "Todas" else operacao_exportar,
+        }
+        st.caption(f"{export.contar(**filtros_exportar)} interação(ões) no recorte.")
+        preparada_agora = False
+        if st.button("Preparar exportação"):
+            # Só um .zip por sessão no disco: o anterior é apagado (e os esquecidos, depois de GERAI_EXPORTAR_HORAS)
+            anterior = st.session_state.pop('exportacao', None)
+            if anterior and os.path.exists(anterior['caminho']):
+                os.remove(anterior['caminho'])
+            caminho_zip = export.novo_arquivo()
+            try:
+                with st.spinner("Montando o arquivo .zip..."):
+                    exportadas = export.exportar(caminho_zip, formato_exportar, **filtros_exportar)
+                st.session_state.exportacao = {'caminho': caminho_zip, 'formato': formato_exportar, 'total': exportadas}
+                preparada_agora = True
+            except Exception as e:
+                if os.path.exists(caminho_zip):
+                    os.remove(caminho_zip)
+                st.error(f"Erro ao exportar o histórico: {e}")
+        exportacao = st.session_state.get('exportacao')
+        if exportacao and os.path.exists(exportacao['caminho']):
+            tamanho_mb = os.path.getsize(exportacao['caminho']) / (1024 * 1024)
+            st.success(f"{exportacao['total']} interação(ões) exportada(s) ({tamanho_mb:.1f} MB).")
+            if not export.cabe_no_download(exportacao['caminho']):
+                st.info(f"O arquivo é grande demais para o download pelo navegador e ficou no servidor em `{exportacao['caminho']}`. "
+                        "Para recortes grandes, use `python main2.py export --out`.")
+            elif preparada_agora or st.button("Baixar o .zip preparado"):
+                # O .zip só é lido para a memória quando o download é pedido, não a cada rerun da página
+                with open(exportacao['caminho'], 'rb') as arquivo_zip:
+                    st.download_button("Download do .zip", data=arquivo_zip, mime=export.MIME_ZIP,
+                                       file_name=f"gerai_historico_{exportacao['formato']}.zip")
+
     # Carrega as interações do DB (pode ajustar o limite)
     interacoes = load_interactions(limit=50)
 
@@ -396,8 +725,43 @@ elif operacao == "Ver Histórico":
                  st.write(f"**Output:**")
                  st.success(output_text) # Exibe output em caixa verde
 
-                 # Opcional: Botões de download para cada item do histórico
-                 # st.download_button(...) # Poderia adicionar botões aqui
+                 # Download do item (mesmo conteúdo do .txt da exportação em massa)
+                 st.download_button("Download como TXT", key=f"download_historico_{id}",
+                                    data=export.renderizar_txt(dict(zip(export.COLUNAS, interaction + (None,)))),
+                                    file_name=export.nome_arquivo({'id': id, 'operation_type': op_type, 'timestamp': timestamp}, 'txt'),
+                                    mime="text/plain")
+
+
+# --- Painel das tarefas em segundo plano (aparece em todas as páginas) ---
+if ids_tarefas():
+    st.markdown("---")
+    st.subheader("Tarefas em segundo plano")
+    painel_tarefas()
+
+
+# --- Métricas de desempenho (por processo) ---
+with st.sidebar.expander("Métricas de desempenho"):
+    st.write("**Hedging (duplicação de chamadas lentas):**")
+    st.json(gemini_client.relatorio_hedge())
+    st.write("**Prompts compactos (tokens economizados, estimativa):**")
+    st.json(prompts.relatorio_economia())
+    if output_guard.ativo() and output_guard.relatorio():
+        st.write("**Limites de saída por tipo de texto (respostas interrompidas):**")
+        st.json(output_guard.relatorio())
+    if precheck.ativo():
+        st.write("**Pré-verificação local da correção (chamadas e tokens evitados):**")
+        st.json(precheck.relatorio())
+    if prefetch.ativo():
+        st.write("**Geração especulativa (aproveitamento):**")
+        st.json(prefetch.relatorio())
+    if semantic_cache.ativo():
+        st.write("**Cache semântico (temas parecidos):**")
+        st.json(semantic_cache.relatorio())
+    if coordination.cache_ativo():
+        st.write("**Cache compartilhado de respostas (L1 do processo + L2 no banco):**")
+        st.json(coordination.relatorio())
+    st.write("**Todas as métricas:**")
+    st.json(metrics.resumo())
 
 
 # --- Nota de rodapé opcional ---
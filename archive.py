@@ -0,0 +1,214 @@
+# Arquivo colunar do histórico (Parquet) e análises vetorizadas com Arrow
+# Interações mais antigas que o corte saem da tabela `interactions` e vão para arquivos Parquet
+# particionados por mês e operation_type (pasta gerai_archive/month=2025-01/operation_type=gerar/).
+# O banco ao vivo continua pequeno; as consultas leem o arquivo e o banco juntos e as análises
+# (volume por tipo/tom, tamanho das saídas, percentis de latência) são feitas sobre tabelas Arrow,
+# sem laço linha a linha.
+
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+import config
+import history_db
+import metrics
+
+DIRETORIO_PADRAO = 'gerai_archive'
+DIAS_PADRAO = 90 # Interações mais antigas que isso vão para o arquivo
+LOTE = 5000 # Linhas lidas/movidas por vez (memória limitada em bancos grandes)
+PERCENTIS = (50, 95, 99)
+
+# Colunas de `interactions`, na ordem do SELECT
+ESQUEMA = pa.schema([
+    ('id', pa.int64()),
+    ('timestamp', pa.string()),
+    ('operation_type', pa.string()),
+    ('model_used', pa.string()),
+    ('input_text', pa.string()),
+    ('output_text', pa.string()),
+    ('text_type', pa.string()),
+    ('tone', pa.string()),
+    ('latency_ms', pa.float64()),
+])
+COLUNAS = ', '.join(ESQUEMA.names)
+
+# Pastas no estilo Hive (month=AAAA-MM/operation_type=...): as consultas por período só abrem os meses pedidos
+PARTICIONAMENTO = ds.partitioning(pa.schema([('month', pa.string()), ('operation_type', pa.string())]), flavor='hive')
+
+
+def diretorio():
+    return Path(config.ler_str('GERAI_ARQUIVO_DIR', DIRETORIO_PADRAO))
+
+
+def _tabela(linhas):
+    """Monta a tabela Arrow (coluna a coluna) a partir das linhas do SELECT."""
+    if not linhas:
+        return ESQUEMA.empty_table()
+    colunas = list(zip(*linhas))
+    return pa.Table.from_arrays([pa.array(valores, type=campo.type) for valores, campo in zip(colunas, ESQUEMA)], schema=ESQUEMA)
+
+
+def _com_mes(tabela):
+    """Acrescenta a coluna `month` (AAAA-MM, tirada do timestamp) usada na partição."""
+    return tabela.append_column('month', pc.utf8_slice_codeunits(tabela['timestamp'], 0, 7))
+
+
+# --- Arquivamento ---
+
+def arquivar(dias=None):
+    """Move para o arquivo Parquet as interações com mais de `dias` dias. Retorna quantas foram movidas.
+
+    Cada lote é gravado no arquivo e apagado do banco dentro da mesma trava de escrita, então dois
+    processos arquivando ao mesmo tempo não gravam a mesma linha duas vezes.
+    """
+    if dias is None:
+        dias = config.ler_int('GERAI_ARQUIVAR_APOS_DIAS', DIAS_PADRAO)
+    corte = (datetime.now() - timedelta(days=dias)).strftime('%Y-%m-%d %H:%M:%S')
+    destino = diretorio()
+    movidas = 0
+    conn = history_db.conectar()
+    conn.isolation_level = None # Controlamos as transações manualmente (BEGIN IMMEDIATE)
+    try:
+        history_db.init_interactions(conn)
+        while True:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                linhas = conn.execute(f'SELECT {COLUNAS} FROM interactions WHERE timestamp < ? ORDER BY id LIMIT ?',
+                                      (corte, LOTE)).fetchall()
+                if linhas:
+                    ds.write_dataset(_com_mes(_tabela(linhas)), destino, format='parquet', partitioning=PARTICIONAMENTO,
+                                     basename_template=f'lote-{uuid.uuid4().hex}-{{i}}.parquet',
+                                     existing_data_behavior='overwrite_or_ignore')
+                    # Só apaga depois que o Parquet foi gravado; se o DELETE falhar, a consulta descarta a duplicata
+                    conn.execute('DELETE FROM interactions WHERE timestamp < ? AND id <= ?', (corte, linhas[-1][0]))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            if not linhas:
+                break
+            movidas += len(linhas)
+    finally:
+        conn.close()
+    metrics.incrementar('arquivo.linhas_movidas', movidas)
+    return movidas
+
+
+# --- Consulta (arquivo + banco ao vivo) ---
+
+def _ler_arquivo(desde, ate, operation_type, colunas):
+    pasta = diretorio()
+    if not pasta.exists():
+        return None
+    dataset = ds.dataset(pasta, format='parquet', partitioning=PARTICIONAMENTO)
+    filtro = None
+    condicoes = []
+    if desde:
+        condicoes += [ds.field('month') >= desde[:7], ds.field('timestamp') >= desde]
+    if ate:
+        condicoes += [ds.field('month') <= ate[:7], ds.field('timestamp') < ate]
+    if operation_type:
+        condicoes.append(ds.field('operation_type') == operation_type)
+    for condicao in condicoes:
+        filtro = condicao if filtro is None else filtro & condicao
+    return dataset.to_table(columns=colunas, filter=filtro)
+
+
+def _ler_banco(desde, ate, operation_type, colunas):
+    condicoes, parametros = [], []
+    if desde:
+        condicoes.append('timestamp >= ?')
+        parametros.append(desde)
+    if ate:
+        condicoes.append('timestamp < ?')
+        parametros.append(ate)
+    if operation_type:
+        condicoes.append('operation_type = ?')
+        parametros.append(operation_type)
+    onde = f"WHERE {' AND '.join(condicoes)}" if condicoes else ''
+    conn = history_db.conectar()
+    try:
+        history_db.init_interactions(conn)
+        cursor = conn.execute(f'SELECT {COLUNAS} FROM interactions {onde}', parametros)
+        lotes = []
+        while True:
+            linhas = cursor.fetchmany(LOTE)
+            if not linhas:
+                break
+            lotes.append(_tabela(linhas))
+    finally:
+        conn.close()
+    tabela = pa.concat_tables(lotes) if lotes else ESQUEMA.empty_table()
+    return tabela.select(colunas)
+
+
+def consultar(desde=None, ate=None, operation_type=None, colunas=None):
+    """Interações do arquivo e do banco ao vivo como uma tabela Arrow.
+
+    `desde`/`ate` são datas 'AAAA-MM-DD' (ou timestamps completos); `ate` é exclusivo.
+    """
+    colunas = list(colunas or ESQUEMA.names)
+    if 'id' not in colunas:
+        colunas.insert(0, 'id') # Necessário para descartar duplicatas entre arquivo e banco
+    ao_vivo = _ler_banco(desde, ate, operation_type, colunas)
+    arquivadas = _ler_arquivo(desde, ate, operation_type, colunas)
+    if arquivadas is None or not arquivadas.num_rows:
+        return ao_vivo
+    arquivadas = arquivadas.select(colunas).cast(ao_vivo.schema)
+    # Linhas gravadas no arquivo cujo DELETE não chegou a acontecer aparecem só uma vez
+    ao_vivo = ao_vivo.filter(pc.invert(pc.is_in(ao_vivo['id'], value_set=arquivadas['id'])))
+    return pa.concat_tables([arquivadas, ao_vivo])
+
+
+# --- Análises vetorizadas ---
+
+def volume(tabela, chaves=('operation_type', 'text_type', 'tone')):
+    """Quantidade de interações por combinação das colunas `chaves`."""
+    chaves = list(chaves)
+    return (tabela.group_by(chaves).aggregate([('id', 'count')])
+            .rename_columns(chaves + ['interacoes'])
+            .sort_by([('interacoes', 'descending')]))
+
+
+def volume_mensal(tabela):
+    """Quantidade de interações por mês e operação."""
+    return volume(_com_mes(tabela), ('month', 'operation_type')).sort_by([('month', 'ascending'), ('operation_type', 'ascending')])
+
+
+def tamanho_saida(tabela, chaves=('operation_type', 'text_type')):
+    """Tamanho (caracteres) dos textos gerados/revisados: média, mediana e máximo por grupo."""
+    chaves = list(chaves)
+    tabela = tabela.append_column('caracteres', pc.utf8_length(pc.fill_null(tabela['output_text'], '')))
+    return (tabela.group_by(chaves)
+            .aggregate([('caracteres', 'mean'), ('caracteres', 'approximate_median'), ('caracteres', 'max')])
+            .rename_columns(chaves + ['media', 'mediana', 'maximo']))
+
+
+def latencia(tabela, chaves=('operation_type',)):
+    """Percentis de latência (ms) por grupo, só das interações com latência registrada."""
+    chaves = list(chaves)
+    tabela = tabela.filter(pc.is_valid(tabela['latency_ms']))
+    agrupada = tabela.group_by(chaves).aggregate([
+        ('latency_ms', 'count'),
+        ('latency_ms', 'tdigest', pc.TDigestOptions(q=[p / 100 for p in PERCENTIS])),
+    ])
+    quantis = agrupada['latency_ms_tdigest']
+    colunas = [agrupada[chave] for chave in chaves] + [agrupada['latency_ms_count']]
+    colunas += [pc.list_element(quantis, indice) for indice in range(len(PERCENTIS))]
+    return pa.Table.from_arrays(colunas, names=chaves + ['amostras'] + [f'p{p}' for p in PERCENTIS])
+
+
+def analisar(desde=None, ate=None):
+    """Resumo do histórico (arquivo + banco) no período: volume, tamanho das saídas e latência."""
+    tabela = consultar(desde, ate, colunas=['id', 'timestamp', 'operation_type', 'text_type', 'tone', 'output_text', 'latency_ms'])
+    return {
+        'total': tabela.num_rows,
+        'volume': volume(tabela),
+        'volume_mensal': volume_mensal(tabela),
+        'tamanho_saida': tamanho_saida(tabela),
+        'latencia': latencia(tabela),
+    }
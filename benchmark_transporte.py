@@ -0,0 +1,241 @@
+# Benchmark comparativo dos transportes do SDK (gRPC x REST) contra um servidor local
+# Sobe um servidor que imita o GenerativeService (gRPC e REST com o mesmo cenário: tempo até o
+# primeiro pedaço, número de pedaços e intervalo entre eles) e mede, para cada transporte, com a
+# mesma configuração que os scripts usam (transport.configurar):
+# - latência: primeiro pedido (inclui abrir a conexão), TTFT e duração total dos seguintes;
+# - vazão com vários pedidos simultâneos (threads, como as sessões do Streamlit);
+# - memória: RSS do processo cliente antes e depois (cada transporte roda num processo próprio).
+# Nenhuma chamada sai para a API de verdade e nenhuma cota é gasta.
+#
+# Uso: python benchmark_transporte.py [--pedidos 50] [--concorrencia 1,8,32] [--pedacos 20]
+#                                     [--ttft 0.05] [--atraso 0.005] [--keepalive 30]
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent import futures
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MODELO = 'models/gemini-1.5-flash'
+SERVICO = 'google.ai.generativelanguage.v1beta.GenerativeService'
+TAMANHO_PEDACO = 80 # Caracteres de texto por pedaço da resposta
+
+
+# --- Servidor local (imita o GenerativeService) ---
+
+def _respostas(cenario):
+    """Pedaços da resposta em streaming: texto em cada um; o último leva o motivo de término e o uso de tokens."""
+    import google.ai.generativelanguage as glm
+
+    respostas = []
+    for i in range(cenario['pedacos']):
+        candidato = glm.Candidate(index=0, content=glm.Content(role='model', parts=[glm.Part(text='x' * (TAMANHO_PEDACO - 1) + ' ')]))
+        resposta = glm.GenerateContentResponse(candidates=[candidato])
+        if i == cenario['pedacos'] - 1:
+            resposta.candidates[0].finish_reason = glm.Candidate.FinishReason.STOP
+            resposta.usage_metadata = glm.GenerateContentResponse.UsageMetadata(
+                prompt_token_count=20, candidates_token_count=cenario['pedacos'] * TAMANHO_PEDACO // 4)
+        respostas.append(resposta)
+    return respostas
+
+
+def iniciar_servidor_grpc(cenario):
+    """Servidor gRPC sem TLS em 127.0.0.1 (porta livre). Retorna (servidor, porta)."""
+    import grpc
+    import google.ai.generativelanguage as glm
+
+    respostas = _respostas(cenario)
+
+    def stream_generate_content(pedido, contexto):
+        time.sleep(cenario['ttft'])
+        for i, resposta in enumerate(respostas):
+            if i:
+                time.sleep(cenario['atraso'])
+            yield resposta
+
+    manipulador = grpc.method_handlers_generic_handler(SERVICO, {
+        'StreamGenerateContent': grpc.unary_stream_rpc_method_handler(
+            stream_generate_content,
+            request_deserializer=glm.GenerateContentRequest.deserialize,
+            response_serializer=glm.GenerateContentResponse.serialize,
+        ),
+    })
+    servidor = grpc.server(futures.ThreadPoolExecutor(max_workers=64))
+    servidor.add_generic_rpc_handlers((manipulador,))
+    porta = servidor.add_insecure_port('127.0.0.1:0')
+    servidor.start()
+    return servidor, porta
+
+
+def iniciar_servidor_rest(cenario):
+    """Servidor HTTP/1.1 em 127.0.0.1 (porta livre) com o stream em array JSON, como a API. Retorna (servidor, porta)."""
+    import google.ai.generativelanguage as glm
+
+    partes = [glm.GenerateContentResponse.to_json(resposta).encode() for resposta in _respostas(cenario)]
+
+    class Manipulador(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1' # Mantém a conexão aberta entre pedidos (como a API)
+
+        def _enviar(self, dados):
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(dados), dados))
+            self.wfile.flush()
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json; charset=UTF-8')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            time.sleep(cenario['ttft'])
+            for i, parte in enumerate(partes):
+                if i:
+                    time.sleep(cenario['atraso'])
+                self._enviar((b',' if i else b'[') + parte)
+            self._enviar(b']')
+            self.wfile.write(b'0\r\n\r\n')
+            self.wfile.flush()
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), Manipulador)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name='benchmark-rest', daemon=True).start()
+    return servidor, servidor.server_address[1]
+
+
+# --- Cliente (roda num processo próprio por transporte) ---
+
+def _rss_mb():
+    """Memória residente atual do processo (MB), ou None fora do Linux."""
+    try:
+        with open('/proc/self/statm') as arquivo:
+            return int(arquivo.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _pedido(modelo):
+    """Um pedido em streaming. Retorna (ttft, duração total, caracteres recebidos)."""
+    inicio = time.perf_counter()
+    ttft = None
+    caracteres = 0
+    for chunk in modelo.generate_content('Escreva um parágrafo.', stream=True):
+        if ttft is None:
+            ttft = time.perf_counter() - inicio
+        caracteres += len(chunk.text)
+    return ttft, time.perf_counter() - inicio, caracteres
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    return round(ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))], 4)
+
+
+def medir(args):
+    """Mede o transporte configurado no ambiente (GERAI_TRANSPORTE, GERAI_API_ENDPOINT) e imprime um JSON."""
+    import google.generativeai as genai
+    import transport
+
+    rss_inicial = _rss_mb()
+    transport.configurar('chave-do-benchmark')
+    modelo = genai.GenerativeModel(MODELO)
+
+    resultado = {'transporte': transport.transporte(), 'primeiro_s': round(_pedido(modelo)[1], 4)}
+    ttfts, totais = [], []
+    for _ in range(args.pedidos):
+        ttft, total, _ = _pedido(modelo)
+        ttfts.append(ttft)
+        totais.append(total)
+    resultado.update(ttft_p50=_percentil(ttfts, 50), ttft_p95=_percentil(ttfts, 95),
+                     total_p50=_percentil(totais, 50), total_p95=_percentil(totais, 95))
+
+    vazao = {}
+    for concorrencia in args.concorrencia:
+        quantidade = max(args.pedidos, concorrencia * 4)
+        erros = 0
+        inicio = time.perf_counter()
+        with futures.ThreadPoolExecutor(max_workers=concorrencia) as pool:
+            for tarefa in [pool.submit(_pedido, modelo) for _ in range(quantidade)]:
+                try:
+                    tarefa.result()
+                except Exception:
+                    erros += 1
+        vazao[str(concorrencia)] = {'pedidos_s': round(quantidade / (time.perf_counter() - inicio), 1), 'erros': erros}
+    resultado['vazao'] = vazao
+    rss_final = _rss_mb()
+    if rss_inicial is not None:
+        resultado['rss_mb'] = round(rss_final, 1)
+        resultado['rss_acrescimo_mb'] = round(rss_final - rss_inicial, 1)
+    print(json.dumps(resultado))
+
+
+# --- Execução ---
+
+def _medir_em_processo(args, nome, endpoint):
+    ambiente = dict(os.environ, GERAI_TRANSPORTE=nome, GERAI_API_ENDPOINT=endpoint)
+    if args.keepalive:
+        ambiente['GERAI_GRPC_KEEPALIVE'] = str(args.keepalive)
+    comando = [sys.executable, os.path.abspath(__file__), '--medir', '--pedidos', str(args.pedidos),
+               '--concorrencia', ','.join(map(str, args.concorrencia))]
+    saida = subprocess.run(comando, env=ambiente, capture_output=True, text=True, check=True).stdout
+    return json.loads(saida.strip().splitlines()[-1])
+
+
+def _tabela(resultados, concorrencias):
+    colunas = ['transporte', '1º pedido (s)', 'TTFT p50', 'TTFT p95', 'total p50', 'total p95']
+    colunas += [f'pedidos/s c={c}' for c in concorrencias] + ['RSS (MB)', '+RSS (MB)']
+    linhas = []
+    for r in resultados:
+        linha = [r['transporte'], r['primeiro_s'], r['ttft_p50'], r['ttft_p95'], r['total_p50'], r['total_p95']]
+        for c in concorrencias:
+            v = r['vazao'][str(c)]
+            linha.append(f"{v['pedidos_s']}" + (f" ({v['erros']} erros)" if v['erros'] else ''))
+        linha += [r.get('rss_mb', '-'), r.get('rss_acrescimo_mb', '-')]
+        linhas.append([str(valor) for valor in linha])
+    larguras = [max(len(c), *(len(l[i]) for l in linhas)) for i, c in enumerate(colunas)]
+    print(' | '.join(c.ljust(w) for c, w in zip(colunas, larguras)))
+    print('-+-'.join('-' * w for w in larguras))
+    for linha in linhas:
+        print(' | '.join(v.ljust(w) for v, w in zip(linha, larguras)))
+
+
+def _lista_inteiros(texto):
+    return [int(parte) for parte in texto.split(',') if parte.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compara os transportes gRPC e REST do SDK contra um servidor local.")
+    parser.add_argument('--pedidos', type=int, default=50, help="Pedidos em sequência para a latência (padrão: 50).")
+    parser.add_argument('--concorrencia', type=_lista_inteiros, default=[1, 8, 32],
+                        help="Pedidos simultâneos para a vazão, separados por vírgula (padrão: 1,8,32).")
+    parser.add_argument('--pedacos', type=int, default=20, help="Pedaços por resposta (padrão: 20).")
+    parser.add_argument('--ttft', type=float, default=0.05, help="Segundos até o primeiro pedaço (padrão: 0.05).")
+    parser.add_argument('--atraso', type=float, default=0.005, help="Segundos entre pedaços (padrão: 0.005).")
+    parser.add_argument('--keepalive', type=float, default=0, help="GERAI_GRPC_KEEPALIVE do cliente gRPC (padrão: desligado).")
+    parser.add_argument('--medir', action='store_true', help=argparse.SUPPRESS) # Processo filho: mede um transporte
+    args = parser.parse_args(argv)
+    if args.medir:
+        return medir(args)
+
+    cenario = {'pedacos': args.pedacos, 'ttft': args.ttft, 'atraso': args.atraso}
+    servidor_grpc, porta_grpc = iniciar_servidor_grpc(cenario)
+    servidor_rest, porta_rest = iniciar_servidor_rest(cenario)
+    print(f"Servidor local: {args.pedacos} pedaços por resposta, TTFT {args.ttft} s, {args.atraso} s entre pedaços.", file=sys.stderr)
+    try:
+        resultados = []
+        for nome, porta in (('grpc', porta_grpc), ('rest', porta_rest)):
+            print(f"Medindo {nome}...", file=sys.stderr)
+            resultados.append(_medir_em_processo(args, nome, f'http://127.0.0.1:{porta}'))
+    finally:
+        servidor_grpc.stop(None)
+        servidor_rest.shutdown()
+    _tabela(resultados, args.concorrencia)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+# Cancelamento de chamadas em andamento
+# Se o usuário clica "Gerar Texto" de novo, muda o tema no meio da geração ou sai da página, a chamada
+# anterior não precisa continuar até o fim (o resultado seria jogado fora). Cada chamada pode receber
+# um Cancelamento: quem a iniciou (ou quem a substitui) sinaliza, e o stream para no próximo pedaço,
+# liberando a vaga de chamada. Cancelamentos ficam registrados nas métricas.
+# No Streamlit, o script só é interrompido (novo clique, troca de página) quando chama o st: com
+# `ao_verificar`, cada verificação (a cada pedaço recebido) atualiza a página e vira um ponto de
+# interrupção, mesmo nas chamadas que não mostram a prévia do texto.
+
+import threading
+
+import metrics
+
+
+class ChamadaCancelada(Exception):
+    """A chamada foi cancelada antes de terminar (substituída por outra ou abandonada)."""
+
+
+class Cancelamento:
+    """Sinal de cancelamento de uma chamada, seguro entre threads."""
+
+    def __init__(self, ao_verificar=None):
+        self._evento = threading.Event()
+        self.motivo = None
+        self.ao_verificar = ao_verificar # Chamada a cada verificar(), na thread que verifica
+
+    @property
+    def cancelado(self):
+        return self._evento.is_set()
+
+    def cancelar(self, motivo='cancelada'):
+        """Pede o cancelamento. Só o primeiro motivo é guardado."""
+        if not self._evento.is_set():
+            self.motivo = motivo
+            self._evento.set()
+
+    def verificar(self):
+        """Levanta ChamadaCancelada se o cancelamento foi pedido."""
+        if self.ao_verificar is not None:
+            self.ao_verificar()
+        if self._evento.is_set():
+            raise ChamadaCancelada(f"Chamada cancelada ({self.motivo}).")
+
+    def esperar(self, timeout):
+        """Espera até `timeout` segundos ou até o cancelamento. Retorna True se foi cancelado."""
+        return self._evento.wait(timeout)
+
+
+def registrar(motivo):
+    """Conta uma chamada cancelada (total e por motivo)."""
+    metrics.incrementar('gemini.canceladas')
+    metrics.incrementar(f'gemini.canceladas.{motivo}')
+
+
+def substituir(anterior, ao_verificar=None):
+    """Cancela a chamada anterior de uma sessão (se ainda estiver rodando) e retorna um novo Cancelamento."""
+    if anterior is not None:
+        anterior.cancelar('substituida')
+    return Cancelamento(ao_verificar)
@@ -0,0 +1,43 @@
+# Leitura das configurações opcionais do GerAI
+# Todas as opções vêm de variáveis de ambiente (ou do arquivo .env, carregado pelos scripts principais).
+# As funções leem o valor no momento da chamada, então funcionam mesmo se o .env for carregado depois do import.
+
+import os
+
+
+def ler_str(nome, padrao=None):
+    """Retorna o valor da variável de ambiente como texto, ou o padrão se estiver vazia/ausente."""
+    valor = os.getenv(nome)
+    if valor is None or valor.strip() == '':
+        return padrao
+    return valor.strip()
+
+
+def ler_bool(nome, padrao=False):
+    """Interpreta a variável de ambiente como verdadeiro/falso (1, true, sim, on...)."""
+    valor = ler_str(nome)
+    if valor is None:
+        return padrao
+    return valor.lower() in ('1', 'true', 'sim', 's', 'yes', 'y', 'on')
+
+
+def ler_int(nome, padrao=0):
+    """Lê um número inteiro da variável de ambiente. Valores inválidos usam o padrão."""
+    valor = ler_str(nome)
+    if valor is None:
+        return padrao
+    try:
+        return int(valor)
+    except ValueError:
+        return padrao
+
+
+def ler_float(nome, padrao=0.0):
+    """Lê um número decimal da variável de ambiente. Valores inválidos usam o padrão."""
+    valor = ler_str(nome)
+    if valor is None:
+        return padrao
+    try:
+        return float(valor)
+    except ValueError:
+        return padrao
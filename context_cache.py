@@ -0,0 +1,42 @@
+# Instrução de sistema guardada para os prefixos fixos de instrução dos prompts
+# Toda correção reenviava o mesmo bloco de instruções ("Corrija erros de ortografia, gramática...")
+# no começo do prompt, e cada tipo de texto reenviava as suas. Com GERAI_CACHE_CONTEXTO=1, essas
+# instruções fixas vão como system_instruction de um GenerativeModel guardado aqui (um por modelo +
+# instrução), e o prompt de cada pedido leva só a parte variável.
+#
+# Não há economia de tokens: a instrução de sistema é cobrada a cada pedido, como antes. O ganho é
+# não montar o modelo a cada chamada e deixar as regras fora do texto do pedido. A API de context
+# caching (CachedContent) exige milhares de tokens de prefixo, muito mais que estas instruções (poucas
+# centenas), por isso não é usada.
+
+import hashlib
+import threading
+
+import google.generativeai as genai
+
+import config
+import metrics
+
+
+def ativo():
+    """Instruções de sistema em modelos guardados só são usadas quando ativadas na configuração."""
+    return config.ler_bool('GERAI_CACHE_CONTEXTO', False)
+
+
+_modelos = {}
+_lock = threading.Lock()
+
+
+def modelo(model_name, instrucao):
+    """Retorna o GenerativeModel com a instrução fixa como instrução de sistema, ou None se estiver desativado."""
+    if not ativo():
+        return None
+    chave = (model_name, hashlib.sha256(instrucao.encode('utf-8')).hexdigest())
+    with _lock:
+        guardado = _modelos.get(chave)
+        if guardado is None:
+            guardado = _modelos[chave] = genai.GenerativeModel(model_name, system_instruction=instrucao)
+            metrics.incrementar('contexto.modelos_criados')
+        else:
+            metrics.incrementar('contexto.reaproveitados')
+        return guardado
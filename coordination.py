@@ -0,0 +1,240 @@
+# Coordenação entre processos (vários workers do Streamlit atrás de um balanceador de carga)
+# Caches e limitadores em memória valem só para o próprio processo: com N processos o limite de
+# chamadas fica N vezes maior e cada processo esquenta o seu cache sozinho. Aqui ficam, no mesmo
+# gerai_history.db que todos os processos da máquina já compartilham:
+# - um cache de respostas em dois níveis: L1 em memória (por processo) na frente de um L2 na tabela
+#   `response_cache`, visto por todos os processos;
+# - um balde de fichas global (tabela `token_bucket`) que limita as chamadas por minuto somando
+#   todos os processos.
+# O banco fica em modo WAL (leituras do cache não esperam as escritas) e o balde é lido e atualizado
+# dentro de BEGIN IMMEDIATE (trava de escrita), então duas atualizações simultâneas não se perdem.
+
+import hashlib
+import json
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import admission
+import config
+import history_db
+import metrics
+
+TTL_CACHE_PADRAO = 86400 # Segundos que uma resposta fica no L2
+MAX_L1_PADRAO = 500 # Respostas guardadas em memória por processo
+MAX_L2_PADRAO = 20000 # Respostas guardadas no banco (somando todos os processos)
+PODA_A_CADA = 100 # Gravações no L2 entre uma limpeza e outra (por processo)
+BALDE_GLOBAL = 'gemini' # Nome do balde das chamadas ao modelo na tabela token_bucket
+
+
+def cache_ativo():
+    """O cache compartilhado de respostas só é usado quando ativado na configuração."""
+    return config.ler_bool('GERAI_CACHE_COMPARTILHADO', False)
+
+
+_wal_lock = threading.Lock()
+_wal_ativado = False
+
+
+def _conectar():
+    """Conexão no banco de histórico com as tabelas de coordenação criadas (e o modo WAL ligado uma vez)."""
+    global _wal_ativado
+    conn = history_db.conectar()
+    with _wal_lock:
+        if not _wal_ativado:
+            # O modo WAL fica gravado no arquivo: basta um processo ligar
+            conn.execute('PRAGMA journal_mode=WAL')
+            _wal_ativado = True
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS response_cache (
+            chave TEXT PRIMARY KEY, -- sha256 do modelo, instrução, prompt e parâmetros
+            resposta TEXT,
+            criado_em REAL, -- time.time()
+            expira_em REAL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_response_cache_expira ON response_cache (expira_em)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS token_bucket (
+            nome TEXT PRIMARY KEY,
+            fichas REAL,
+            atualizado_em REAL -- time.time() da última recarga
+        )
+    ''')
+    return conn
+
+
+# --- Cache de respostas (L1 por processo + L2 compartilhado) ---
+
+def chave_resposta(model_name, prompt, instrucao_sistema=None, **parametros):
+    """Chave do cache: mesma resposta só para o mesmo modelo, instrução, prompt e parâmetros de geração."""
+    conteudo = json.dumps([model_name, instrucao_sistema, prompt, parametros], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+
+class _CacheL1:
+    """LRU em memória com validade: guarda (resposta, expira_em)."""
+
+    def __init__(self):
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            if item[1] <= time.time():
+                del self._itens[chave]
+                return None
+            self._itens.move_to_end(chave)
+            return item[0]
+
+    def guardar(self, chave, resposta, expira_em):
+        with self._lock:
+            self._itens[chave] = (resposta, expira_em)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > config.ler_int('GERAI_CACHE_COMPARTILHADO_L1', MAX_L1_PADRAO):
+                self._itens.popitem(last=False)
+
+
+_l1 = _CacheL1()
+_gravacoes = 0
+_gravacoes_lock = threading.Lock()
+
+
+def obter(chave):
+    """Procura a resposta no L1 e depois no L2. Retorna o texto ou None."""
+    metrics.incrementar('cache_compartilhado.consultas')
+    resposta = _l1.obter(chave)
+    if resposta is not None:
+        metrics.incrementar('cache_compartilhado.acertos_l1')
+        return resposta
+    try:
+        conn = _conectar()
+        try:
+            linha = conn.execute('SELECT resposta, expira_em FROM response_cache WHERE chave = ? AND expira_em > ?',
+                                 (chave, time.time())).fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        metrics.incrementar('cache_compartilhado.erros')
+        return None
+    if linha is None:
+        return None
+    metrics.incrementar('cache_compartilhado.acertos_l2')
+    _l1.guardar(chave, linha[0], linha[1]) # Próximas consultas deste processo nem vão ao banco
+    return linha[0]
+
+
+def guardar(chave, resposta):
+    """Guarda a resposta nos dois níveis. Falhas no banco não interrompem a geração."""
+    global _gravacoes
+    agora = time.time()
+    expira_em = agora + config.ler_int('GERAI_CACHE_COMPARTILHADO_TTL', TTL_CACHE_PADRAO)
+    _l1.guardar(chave, resposta, expira_em)
+    with _gravacoes_lock:
+        _gravacoes += 1
+        podar = _gravacoes % PODA_A_CADA == 0
+    try:
+        conn = _conectar()
+        try:
+            # Dois processos gravando a mesma chave: fica a última (as duas respostas valem)
+            conn.execute('INSERT OR REPLACE INTO response_cache (chave, resposta, criado_em, expira_em) VALUES (?, ?, ?, ?)',
+                         (chave, resposta, agora, expira_em))
+            if podar:
+                _podar(conn, agora)
+            conn.commit()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        metrics.incrementar('cache_compartilhado.erros')
+
+
+def _podar(conn, agora):
+    """Tira as respostas vencidas e, acima do limite, as mais antigas."""
+    conn.execute('DELETE FROM response_cache WHERE expira_em <= ?', (agora,))
+    maximo = config.ler_int('GERAI_CACHE_COMPARTILHADO_MAX', MAX_L2_PADRAO)
+    conn.execute('''
+        DELETE FROM response_cache WHERE chave IN (
+            SELECT chave FROM response_cache ORDER BY criado_em DESC LIMIT -1 OFFSET ?
+        )
+    ''', (maximo,))
+
+
+def relatorio():
+    """Taxa de acerto de cada nível do cache compartilhado (neste processo)."""
+    consultas = metrics.contador('cache_compartilhado.consultas')
+    acertos_l1 = metrics.contador('cache_compartilhado.acertos_l1')
+    acertos_l2 = metrics.contador('cache_compartilhado.acertos_l2')
+    return {
+        'consultas': consultas,
+        'acertos_l1': acertos_l1,
+        'acertos_l2': acertos_l2,
+        'taxa_acerto': round((acertos_l1 + acertos_l2) / consultas, 3) if consultas else None,
+    }
+
+
+# --- Limite global de chamadas (balde de fichas) ---
+
+def _tentar_ficha(conn, taxa, capacidade):
+    """Recarrega o balde pelo tempo passado e tenta tirar uma ficha. Retorna 0 ou os segundos até a próxima."""
+    conn.execute('BEGIN IMMEDIATE') # Ler e atualizar o balde sem outro processo no meio
+    try:
+        linha = conn.execute('SELECT fichas, atualizado_em FROM token_bucket WHERE nome = ?', (BALDE_GLOBAL,)).fetchone()
+        agora = time.time()
+        fichas = capacidade if linha is None else min(capacidade, linha[0] + max(0.0, agora - linha[1]) * taxa)
+        espera = 0.0
+        if fichas >= 1:
+            fichas -= 1
+        else:
+            espera = (1 - fichas) / taxa
+        conn.execute('INSERT OR REPLACE INTO token_bucket (nome, fichas, atualizado_em) VALUES (?, ?, ?)',
+                     (BALDE_GLOBAL, fichas, agora))
+        conn.execute('COMMIT')
+        return espera
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def consumir_ficha(espera_maxima=None, cancelamento=None):
+    """Espera uma ficha do limite global (GERAI_LIMITE_GLOBAL_RPM), somando todos os processos.
+
+    Levanta admission.ServidorOcupado se a ficha não vier dentro de `espera_maxima` segundos.
+    Com o banco indisponível, deixa a chamada seguir (o limite por processo continua valendo).
+    """
+    rpm = config.ler_float('GERAI_LIMITE_GLOBAL_RPM', 0)
+    if rpm <= 0:
+        return
+    taxa = rpm / 60
+    capacidade = max(1.0, config.ler_float('GERAI_LIMITE_GLOBAL_RAJADA', rpm / 6)) # Padrão: ~10 s de chamadas
+    inicio = time.monotonic()
+    try:
+        conn = _conectar()
+    except sqlite3.Error:
+        metrics.incrementar('limite_global.erros')
+        return
+    conn.isolation_level = None # Controlamos as transações manualmente (BEGIN IMMEDIATE)
+    try:
+        while True:
+            try:
+                espera = _tentar_ficha(conn, taxa, capacidade)
+            except sqlite3.Error:
+                metrics.incrementar('limite_global.erros')
+                return
+            if espera == 0:
+                metrics.observar('limite_global.espera', time.monotonic() - inicio)
+                return
+            if espera_maxima is not None and time.monotonic() - inicio + espera > espera_maxima:
+                metrics.incrementar('limite_global.recusadas')
+                raise admission.ServidorOcupado(math.ceil(espera))
+            metrics.incrementar('limite_global.esperas')
+            if cancelamento is None:
+                time.sleep(espera)
+            elif cancelamento.esperar(espera):
+                cancelamento.verificar()
+    finally:
+        conn.close()
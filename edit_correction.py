@@ -0,0 +1,128 @@
+# Correção por lista de edições
+# Em vez de pedir ao modelo o texto inteiro reescrito (saída proporcional ao tamanho do documento),
+# pedimos só uma lista compacta de edições (trecho, substituição, motivo), aplicamos localmente no
+# texto original e mostramos um diff em linha. Se alguma edição não se encaixar no texto,
+# voltamos para a correção completa.
+
+import difflib
+import re
+
+import gemini_client
+import metrics
+import prompts
+
+
+def montar_prompt_edicoes(texto_original, tom):
+    """Monta o prompt de correção que pede apenas a lista de edições em JSON (texto já normalizado)."""
+    return prompts.montar('edicoes', tom=tom, texto=texto_original)
+
+
+def ler_edicoes(resposta):
+    """Valida a resposta JSON do modelo. Retorna (edicoes, sugestoes) ou levanta ValueError."""
+    dados = gemini_client.ler_json_resposta(resposta)
+    if not isinstance(dados, dict) or not isinstance(dados.get('edicoes', []), list):
+        raise ValueError("Resposta sem a lista de edições.")
+
+    edicoes = []
+    for edicao in dados.get('edicoes', []):
+        if (not isinstance(edicao, dict) or not isinstance(edicao.get('trecho'), str) or not edicao['trecho']
+                or not isinstance(edicao.get('substituicao'), str)):
+            raise ValueError(f"Edição inválida: {edicao!r}")
+        edicoes.append({
+            'trecho': edicao['trecho'],
+            'substituicao': edicao['substituicao'],
+            'motivo': str(edicao.get('motivo', '')),
+        })
+
+    sugestoes = [str(sugestao) for sugestao in dados.get('sugestoes', []) if str(sugestao).strip()]
+    return edicoes, sugestoes
+
+
+def aplicar_edicoes(texto_original, edicoes):
+    """Aplica as edições em ordem ao texto original. Retorna o texto corrigido, ou None se alguma não se encaixar."""
+    partes = []
+    cursor = 0
+    for edicao in edicoes:
+        posicao = texto_original.find(edicao['trecho'], cursor)
+        if posicao < 0:
+            return None # Trecho não encontrado (ou fora de ordem/sobreposto): não dá para aplicar com segurança
+        partes.append(texto_original[cursor:posicao])
+        partes.append(edicao['substituicao'])
+        cursor = posicao + len(edicao['trecho'])
+    partes.append(texto_original[cursor:])
+    return ''.join(partes)
+
+
+def _marcar(trecho, marca):
+    """Envolve o trecho com a marcação Markdown, deixando espaços e quebras de linha de fora."""
+    linhas = []
+    for linha in trecho.split('\n'):
+        nucleo = linha.strip()
+        if not nucleo:
+            linhas.append(linha)
+            continue
+        inicio = linha.index(nucleo)
+        linhas.append(f"{linha[:inicio]}{marca}{nucleo}{marca}{linha[inicio + len(nucleo):]}")
+    return '\n'.join(linhas)
+
+
+def diff_em_linha(texto_original, texto_corrigido):
+    """Gera um diff em Markdown, palavra a palavra: ~~removido~~ e **adicionado**."""
+    # Tokens: palavras, espaços e pontuação separados, para o diff ficar no nível da palavra
+    original = re.findall(r'\s+|\w+|[^\w\s]', texto_original)
+    corrigido = re.findall(r'\s+|\w+|[^\w\s]', texto_corrigido)
+    partes = []
+    for operacao, i1, i2, j1, j2 in difflib.SequenceMatcher(None, original, corrigido, autojunk=False).get_opcodes():
+        antes = ''.join(original[i1:i2])
+        depois = ''.join(corrigido[j1:j2])
+        if operacao == 'equal':
+            partes.append(antes)
+        if operacao in ('delete', 'replace'):
+            partes.append(_marcar(antes, '~~'))
+        if operacao == 'replace':
+            partes.append(' ')
+        if operacao in ('insert', 'replace'):
+            partes.append(_marcar(depois, '**'))
+    return ''.join(partes)
+
+
+def formatar_resultado(texto_revisado, sugestoes):
+    """Junta o texto revisado e as sugestões no mesmo formato da correção completa."""
+    if not sugestoes:
+        return texto_revisado
+    lista = '\n'.join(f"{numero}. {sugestao}" for numero, sugestao in enumerate(sugestoes, start=1))
+    return f"{texto_revisado}\n\n**Sugestões:**\n{lista}"
+
+
+def corrigir_com_edicoes(model_name, texto_original, tom, correcao_completa, max_tokens=1500, usuario=None, cancelamento=None):
+    """Corrige o texto pedindo só a lista de edições; usa `correcao_completa()` se elas não se aplicarem.
+
+    Retorna um dicionário com 'modo' ('edicoes' ou 'completo'), 'resultado' (texto final em Markdown),
+    'diff', 'edicoes' e 'sugestoes'. Com `cancelamento`, a chamada pode ser cancelada (cancellation.ChamadaCancelada).
+    """
+    prompt = montar_prompt_edicoes(texto_original, tom)
+    try:
+        resposta = gemini_client.gerar_texto(
+            model_name, prompt, max_tokens, 0.3, 0.9, 0, # Temperatura baixa: os trechos precisam ser citados exatamente
+            text_type='corrigir:edicoes', response_mime_type='application/json', usuario=usuario, tom=tom,
+            cancelamento=cancelamento
+        )
+        edicoes, sugestoes = ler_edicoes(resposta)
+        texto_revisado = aplicar_edicoes(texto_original, edicoes)
+    except ValueError:
+        texto_revisado = None # JSON inválido ou edição malformada
+
+    if texto_revisado is None:
+        metrics.incrementar('correcao.edicoes_fallback')
+        resultado = correcao_completa()
+        return {'modo': 'completo', 'resultado': resultado, 'diff': None, 'edicoes': [], 'sugestoes': []}
+
+    metrics.incrementar('correcao.edicoes_aplicadas', len(edicoes))
+    metrics.incrementar('correcao.modo_edicoes')
+    return {
+        'modo': 'edicoes',
+        'resultado': formatar_resultado(texto_revisado, sugestoes),
+        'diff': diff_em_linha(texto_original, texto_revisado),
+        'edicoes': edicoes,
+        'sugestoes': sugestoes,
+    }
@@ -0,0 +1,267 @@
+# Exportação em massa do histórico (tabela `interactions`) para um arquivo .zip
+# Até aqui cada texto só podia ser baixado logo depois de gerado. Aqui um recorte do histórico
+# (período, operação, tipo, tom) vira um .zip com um .docx ou .txt por interação, ou com um único
+# .jsonl/.csv. A memória fica constante qualquer que seja o tamanho do recorte:
+# - as linhas vêm do SQLite por um cursor, em lotes (fetchmany), nunca todas de uma vez;
+# - os .docx são montados num pool de processos (python-docx é lento e só usa uma CPU por processo),
+#   com poucos lotes em andamento ao mesmo tempo, e entram no .zip na ordem do histórico (os processos
+#   são iniciados com spawn: o Streamlit já tem canais gRPC e threads, que não sobrevivem a um fork);
+# - cada arquivo entra no .zip assim que fica pronto, e o .zip pode ser gravado direto no disco ou
+#   num fluxo não pesquisável (ex.: a saída padrão).
+# No app, o .zip fica numa pasta de exportações (GERAI_EXPORTAR_DIR) e os antigos são apagados.
+
+import csv
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+import uuid
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from docx import Document
+
+import config
+import history_db
+import metrics
+
+FORMATOS = ('docx', 'txt', 'jsonl', 'csv')
+COLUNAS = ('id', 'timestamp', 'operation_type', 'model_used', 'input_text', 'output_text', 'text_type', 'tone', 'latency_ms')
+LOTE = 500 # Linhas lidas do cursor por vez
+LOTE_DOCX = 32 # Interações montadas por tarefa do pool (menos idas e voltas entre processos)
+MIME_ZIP = 'application/zip'
+HORAS_PADRAO = 24 # Idade a partir da qual um .zip preparado no app é apagado
+DOWNLOAD_MAX_MB_PADRAO = 50 # Acima disso o .zip não é oferecido pelo navegador (o download passa pela memória)
+
+
+def _filtros(desde=None, ate=None, operation_type=None, text_type=None, tone=None):
+    """Cláusula WHERE e parâmetros do recorte. `desde`/`ate` são datas 'AAAA-MM-DD'; `ate` é exclusivo."""
+    condicoes, parametros = [], []
+    for coluna, operador, valor in (('timestamp', '>=', desde), ('timestamp', '<', ate), ('operation_type', '=', operation_type),
+                                    ('text_type', '=', text_type), ('tone', '=', tone)):
+        if valor:
+            condicoes.append(f'{coluna} {operador} ?')
+            parametros.append(valor)
+    return (f"WHERE {' AND '.join(condicoes)}" if condicoes else ''), parametros
+
+
+def contar(**filtros):
+    """Quantas interações o recorte tem (para mostrar antes de exportar)."""
+    onde, parametros = _filtros(**filtros)
+    conn = history_db.conectar()
+    try:
+        history_db.init_interactions(conn)
+        return conn.execute(f'SELECT COUNT(*) FROM interactions {onde}', parametros).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def linhas(**filtros):
+    """Gera as interações do recorte (dicionários com COLUNAS), em ordem de id, lidas do banco em lotes."""
+    onde, parametros = _filtros(**filtros)
+    conn = history_db.conectar()
+    try:
+        history_db.init_interactions(conn)
+        cursor = conn.execute(f"SELECT {', '.join(COLUNAS)} FROM interactions {onde} ORDER BY id", parametros)
+        while True:
+            lote = cursor.fetchmany(LOTE)
+            if not lote:
+                break
+            for linha in lote:
+                yield dict(zip(COLUNAS, linha))
+    finally:
+        conn.close()
+
+
+# --- Um arquivo por interação (.txt e .docx) ---
+
+def nome_arquivo(linha, extensao):
+    """Nome do arquivo da interação no .zip (ordenável por id)."""
+    momento = (linha['timestamp'] or '').replace(':', '-').replace(' ', '_')
+    return f"interacao_{linha['id']:06d}_{linha['operation_type']}_{momento}.{extensao}"
+
+
+def _cabecalho(linha):
+    """Linhas de identificação da interação (data, operação, tipo, tom, modelo)."""
+    tipo = linha['text_type'] if linha['operation_type'] == 'gerar' else 'Correção'
+    return [
+        f"Data: {linha['timestamp']}",
+        f"Operação: {linha['operation_type']}",
+        f"Tipo: {tipo}",
+        f"Tom: {linha['tone']}",
+        f"Modelo: {linha['model_used']}",
+    ]
+
+
+def renderizar_txt(linha):
+    """Conteúdo .txt de uma interação: cabeçalho, entrada e resultado."""
+    partes = [f"Interação #{linha['id']}", *_cabecalho(linha), '', 'Entrada:', linha['input_text'] or '', '',
+              'Resultado:', linha['output_text'] or '']
+    return '\n'.join(partes) + '\n'
+
+
+def renderizar_docx(linha):
+    """Conteúdo .docx (bytes) de uma interação, no mesmo formato do download depois da geração."""
+    document = Document()
+    document.add_heading(f"Interação #{linha['id']}", level=1)
+    for item in _cabecalho(linha):
+        document.add_paragraph(item)
+    document.add_heading('Entrada', level=2)
+    for paragraph in (linha['input_text'] or '').split('\n'):
+        document.add_paragraph(paragraph)
+    document.add_heading('Resultado', level=2)
+    for paragraph in (linha['output_text'] or '').split('\n'):
+        document.add_paragraph(paragraph)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def _renderizar_lote(lote):
+    """Tarefa do pool: monta os .docx de um lote de interações."""
+    return [(nome_arquivo(linha, 'docx'), renderizar_docx(linha)) for linha in lote]
+
+
+def _em_lotes(iteravel, tamanho):
+    lote = []
+    for item in iteravel:
+        lote.append(item)
+        if len(lote) == tamanho:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def _docx_em_ordem(fluxo, processos):
+    """Gera (nome, bytes) dos .docx na ordem do fluxo, montados em `processos` processos.
+
+    No máximo 2 lotes por processo ficam em andamento: a leitura do banco não corre na frente da
+    montagem dos documentos e a memória não cresce com o tamanho do recorte.
+    """
+    if processos <= 1:
+        for lote in _em_lotes(fluxo, LOTE_DOCX):
+            yield from _renderizar_lote(lote)
+        return
+    pool = ProcessPoolExecutor(max_workers=processos, mp_context=multiprocessing.get_context('spawn'))
+    try:
+        pendentes = deque()
+        for lote in _em_lotes(fluxo, LOTE_DOCX):
+            pendentes.append(pool.submit(_renderizar_lote, lote))
+            if len(pendentes) >= processos * 2:
+                yield from pendentes.popleft().result()
+        while pendentes:
+            yield from pendentes.popleft().result()
+    finally:
+        pool.shutdown(cancel_futures=True) # Exportação interrompida: descarta os lotes que nem começaram
+
+
+# --- Um arquivo para todo o recorte (.jsonl e .csv) ---
+
+def _entrada(nome):
+    """Entrada do .zip gravada em fluxo (data atual e compactada; sem isso ficaria com a data 1980-01-01)."""
+    info = zipfile.ZipInfo(nome, date_time=time.localtime()[:6])
+    info.compress_type = zipfile.ZIP_DEFLATED
+    return info
+
+
+def _escrever_jsonl(pacote, fluxo):
+    total = 0
+    with io.TextIOWrapper(pacote.open(_entrada('historico.jsonl'), 'w', force_zip64=True), encoding='utf-8', newline='') as saida:
+        for linha in fluxo:
+            saida.write(json.dumps(linha, ensure_ascii=False) + '\n')
+            total += 1
+    return total
+
+
+def _escrever_csv(pacote, fluxo):
+    total = 0
+    # utf-8-sig: o Excel reconhece os acentos ao abrir o .csv
+    with io.TextIOWrapper(pacote.open(_entrada('historico.csv'), 'w', force_zip64=True), encoding='utf-8-sig', newline='') as saida:
+        escritor = csv.DictWriter(saida, fieldnames=COLUNAS)
+        escritor.writeheader()
+        for linha in fluxo:
+            escritor.writerow(linha)
+            total += 1
+    return total
+
+
+# --- Arquivos preparados no app ---
+
+def diretorio():
+    """Pasta dos .zip preparados no app (GERAI_EXPORTAR_DIR; padrão: gerai_exports na pasta temporária do sistema)."""
+    caminho = config.ler_str('GERAI_EXPORTAR_DIR') or os.path.join(tempfile.gettempdir(), 'gerai_exports')
+    os.makedirs(caminho, exist_ok=True)
+    return caminho
+
+
+def limpar_antigos(horas=None):
+    """Apaga os .zip preparados há mais de `horas` (GERAI_EXPORTAR_HORAS). Retorna quantos foram apagados."""
+    horas = config.ler_float('GERAI_EXPORTAR_HORAS', HORAS_PADRAO) if horas is None else horas
+    limite = time.time() - horas * 3600
+    apagados = 0
+    with os.scandir(diretorio()) as entradas:
+        for entrada in entradas:
+            if not (entrada.name.startswith('gerai_export_') and entrada.name.endswith('.zip')):
+                continue
+            try:
+                if entrada.stat().st_mtime < limite:
+                    os.remove(entrada.path)
+                    apagados += 1
+            except OSError:
+                pass # Apagado por outro processo ou ainda em uso
+    metrics.incrementar('exportacao.arquivos_apagados', apagados)
+    return apagados
+
+
+def novo_arquivo():
+    """Caminho para um novo .zip na pasta de exportações (apagando antes os antigos)."""
+    limpar_antigos()
+    return os.path.join(diretorio(), f'gerai_export_{uuid.uuid4().hex}.zip')
+
+
+def cabe_no_download(caminho):
+    """True se o .zip pode ser oferecido pelo navegador (até GERAI_EXPORTAR_DOWNLOAD_MAX_MB)."""
+    return os.path.getsize(caminho) <= config.ler_float('GERAI_EXPORTAR_DOWNLOAD_MAX_MB', DOWNLOAD_MAX_MB_PADRAO) * 1024 * 1024
+
+
+# --- Exportação ---
+
+def processos_padrao():
+    """Processos do pool de .docx (GERAI_EXPORTAR_PROCESSOS; padrão: CPUs da máquina, até 4)."""
+    return max(1, config.ler_int('GERAI_EXPORTAR_PROCESSOS', min(4, os.cpu_count() or 1)))
+
+
+def exportar(destino, formato, processos=None, **filtros):
+    """Grava em `destino` um .zip com as interações do recorte no `formato` (FORMATOS). Retorna quantas foram exportadas.
+
+    `destino` é um caminho ou um arquivo binário aberto para escrita (pode ser não pesquisável, como a
+    saída padrão). Os filtros são os de linhas(): desde, ate, operation_type, text_type e tone.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato de exportação inválido: {formato!r}. Use um destes: {', '.join(FORMATOS)}.")
+    inicio = time.monotonic()
+    fluxo = linhas(**filtros)
+    total = 0
+    with zipfile.ZipFile(destino, 'w', compression=zipfile.ZIP_DEFLATED) as pacote:
+        if formato == 'docx':
+            processos = processos_padrao() if processos is None else processos
+            for nome, conteudo in _docx_em_ordem(fluxo, processos):
+                # O .docx já é compactado por dentro: compactar de novo só gastaria CPU
+                pacote.writestr(nome, conteudo, compress_type=zipfile.ZIP_STORED)
+                total += 1
+        elif formato == 'txt':
+            for linha in fluxo:
+                pacote.writestr(nome_arquivo(linha, 'txt'), renderizar_txt(linha))
+                total += 1
+        elif formato == 'jsonl':
+            total = _escrever_jsonl(pacote, fluxo)
+        else:
+            total = _escrever_csv(pacote, fluxo)
+    metrics.incrementar(f'exportacao.{formato}')
+    metrics.incrementar('exportacao.interacoes', total)
+    metrics.observar('exportacao.duracao', time.monotonic() - inicio)
+    return total
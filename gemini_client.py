@@ -0,0 +1,520 @@
+# Caminho de chamada ao Gemini compartilhado por app.py, streamlit_app.py e main2.py
+# Cada script continua com sua própria função interagir_com_gemini (e seu jeito de mostrar erros),
+# mas a chamada de fato ao modelo passa por aqui.
+#
+# Modo "hedging" (opcional, GERAI_HEDGE=1): se a chamada não produzir o primeiro pedaço de texto
+# dentro do limiar dinâmico (percentil observado para aquele tipo de texto), disparamos uma
+# chamada duplicada. Usamos a que responder primeiro e cancelamos o RPC da outra (mesmo se ela ainda
+# espera o primeiro pedaço). Um orçamento por processo limita a carga extra que as duplicatas podem
+# gerar; cada duplicata também ocupa uma vaga (admission) e uma ficha do limite global, sem esperar por
+# elas: sem vaga ou ficha livre na hora, a duplicata não é disparada.
+#
+# Cancelamento: as chamadas aceitam um cancellation.Cancelamento. O stream confere o sinal a cada
+# pedaço e para (liberando a vaga) quando a chamada é substituída; se quem consome o stream parar no
+# meio (rerun/fim da sessão no Streamlit, Ctrl+C no terminal), a chamada também conta como cancelada.
+#
+# Limites de saída: nos tipos de texto curtos (output_guard.py), o stream é fechado assim que a
+# resposta passa do tamanho do tipo ou chega a uma marca de parada (ex.: depois da assinatura do e-mail).
+#
+# Com vários processos, o limite global de chamadas e o cache compartilhado de respostas ficam em
+# coordination.py (no gerai_history.db): respostas em cache nem ocupam vaga nem gastam orçamento.
+
+import contextlib
+import json
+import queue
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import google.generativeai as genai
+
+import admission
+import cancellation
+import config
+import context_cache
+import coordination
+import metrics
+import output_guard
+import transport
+import usage
+
+# Pool de threads usado pelas tentativas em modo hedging
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='gerai-gemini')
+
+# Marcador de fim de stream colocado na fila de cada tentativa
+_FIM = object()
+
+# Mínimo de amostras antes de confiar no percentil observado para o limiar
+MIN_AMOSTRAS_LIMIAR = 20
+
+
+# --- Chamada básica em streaming ---
+
+def _modelo_e_prompt(model_name, prompt, instrucao_sistema=None):
+    """Escolhe o modelo e o prompt a enviar.
+
+    Com GERAI_CACHE_CONTEXTO, a instrução fixa vai como instrução de sistema do modelo guardado e o prompt leva só a parte
+    variável; sem ele, a instrução é colocada no início do prompt, como antes.
+    """
+    if instrucao_sistema:
+        model = context_cache.modelo(model_name, instrucao_sistema)
+        if model is not None:
+            return model, prompt
+        prompt = f"{instrucao_sistema}\n\n{prompt}"
+    return genai.GenerativeModel(model_name), prompt
+
+
+def _stream_gemini(model_name, prompt, generation_config, registrar_uso=None, instrucao_sistema=None, limite=None):
+    """Chama o modelo em modo streaming e devolve os pedaços de texto conforme chegam.
+
+    Com `registrar_uso`, o consumo de tokens (entrada, saída) da resposta é passado a ela quando o stream
+    termina (ou é fechado no meio), na thread que o consumia.
+    Com `limite` (time.monotonic()), a chamada termina com transport.PrazoEsgotado se passar dele.
+    """
+    model, prompt = _modelo_e_prompt(model_name, prompt, instrucao_sistema)
+    with transport.traduzir_prazo():
+        response = model.generate_content(
+            prompt,
+            generation_config=generation_config,
+            stream=True,
+            request_options=transport.opcoes_pedido(limite)
+        )
+
+        recebeu_texto = False
+        completo = False
+        try:
+            for chunk in response:
+                transport.verificar_prazo(limite)
+                # Pedaços sem conteúdo (ex.: só o motivo de término) não têm .text
+                if chunk.candidates and chunk.candidates[0].content.parts:
+                    recebeu_texto = True
+                    yield chunk.text
+            completo = True
+        finally:
+            if not completo and registrar_uso is not None:
+                # Stream fechado no meio (ex.: limite de saída): conta os tokens informados até o último pedaço recebido
+                uso = usage.ler_uso(response)
+                if uso:
+                    registrar_uso(uso)
+
+    if not recebeu_texto:
+        # Mesma exceção da versão sem streaming quando a resposta foi bloqueada
+        texto = response.text
+        if texto:
+            yield texto
+
+    if registrar_uso is not None:
+        uso = usage.ler_uso(response)
+        if uso:
+            registrar_uso(uso)
+
+
+def ler_json_resposta(texto):
+    """Interpreta uma resposta JSON do modelo (tolerando a cerca ```json). Levanta ValueError se for inválida."""
+    texto = texto.strip()
+    # Remove a cerca ```json ... ``` caso o modelo a inclua mesmo com response_mime_type JSON
+    cerca = re.match(r'^```(?:json)?\s*(.*?)\s*```$', texto, re.DOTALL)
+    if cerca:
+        texto = cerca.group(1)
+    return json.loads(texto)
+
+
+# --- Orçamento de duplicatas (hedging) ---
+
+class OrcamentoHedge:
+    """Balde de créditos: cada chamada libera `fracao` de crédito e cada duplicata consome 1."""
+
+    def __init__(self, fracao, maximo):
+        self.fracao = fracao
+        self.maximo = maximo
+        self.creditos = maximo
+        self._lock = threading.Lock()
+
+    def registrar_chamada(self):
+        """Libera crédito proporcional a uma chamada normal."""
+        with self._lock:
+            self.creditos = min(self.maximo, self.creditos + self.fracao)
+
+    def tentar_consumir(self):
+        """Consome 1 crédito se disponível. Retorna True se a duplicata pode ser disparada."""
+        with self._lock:
+            if self.creditos >= 1:
+                self.creditos -= 1
+                return True
+            return False
+
+
+_orcamento_hedge = None
+_orcamento_lock = threading.Lock()
+
+
+def _orcamento():
+    """Cria (uma vez por processo) o orçamento de hedging com a configuração atual."""
+    global _orcamento_hedge
+    with _orcamento_lock:
+        if _orcamento_hedge is None:
+            _orcamento_hedge = OrcamentoHedge(
+                fracao=config.ler_float('GERAI_HEDGE_ORCAMENTO', 0.1), # No máximo ~10% de chamadas extras
+                maximo=config.ler_float('GERAI_HEDGE_ORCAMENTO_MAX', 5)
+            )
+        return _orcamento_hedge
+
+
+def limiar_hedge(chave):
+    """Tempo (s) de espera pelo primeiro pedaço antes de disparar a duplicata, para este tipo de texto."""
+    nome = f'ttft.{chave}'
+    if metrics.quantidade(nome) >= MIN_AMOSTRAS_LIMIAR:
+        return metrics.percentil(nome, config.ler_float('GERAI_HEDGE_PERCENTIL', 95))
+    # Sem histórico suficiente ainda: usa um atraso fixo
+    return config.ler_float('GERAI_HEDGE_ATRASO_PADRAO', 2.0)
+
+
+class _Tentativa:
+    """Uma execução da chamada em streaming, rodando numa thread do pool."""
+
+    def __init__(self, avisos, vaga_propria=False):
+        self.avisos = avisos # Fila compartilhada: avisa quando esta tentativa respondeu (ou falhou)
+        self.vaga_propria = vaga_propria # Duplicata: ocupou uma vaga a mais, liberada quando termina
+        self.fila = queue.Queue() # Pedaços de texto recebidos
+        self.cancelada = threading.Event()
+        self.inicio = time.monotonic()
+        self.ttft = None # Tempo até o primeiro pedaço
+        self.erro = None
+        self._cancelar_rpc = None # Cancela a chamada em andamento (transport.ao_iniciar_chamada)
+        self._lock = threading.Lock()
+
+    def _chamada_iniciada(self, cancelar_rpc):
+        with self._lock:
+            self._cancelar_rpc = cancelar_rpc
+            cancelada = self.cancelada.is_set()
+        if cancelada:
+            cancelar_rpc() # Cancelada antes de o RPC existir
+
+    def cancelar(self):
+        """Para a tentativa: o RPC é cancelado na hora, sem esperar o próximo pedaço."""
+        with self._lock:
+            self.cancelada.set()
+            cancelar_rpc = self._cancelar_rpc
+        if cancelar_rpc is not None:
+            try:
+                cancelar_rpc()
+            except Exception:
+                pass # Chamada que já terminou
+
+    def executar(self, chamada):
+        avisou = False
+        try:
+            with transport.ao_iniciar_chamada(self._chamada_iniciada):
+                for pedaco in chamada():
+                    if self.cancelada.is_set():
+                        break # Paramos de ler o stream; a conexão é liberada com o iterador
+                    if not avisou:
+                        self.ttft = time.monotonic() - self.inicio
+                        self.avisos.put(self)
+                        avisou = True
+                    self.fila.put(pedaco)
+        except Exception as e:
+            self.erro = e
+        finally:
+            if self.vaga_propria:
+                admission.escalonador().sair()
+            if not avisou:
+                self.avisos.put(self)
+            self.fila.put(_FIM)
+
+
+def _reservar_duplicata():
+    """Ocupa, sem esperar, a vaga, o crédito do orçamento e a ficha do limite global de uma duplicata."""
+    if not admission.escalonador().tentar_entrar():
+        metrics.incrementar('hedge.negados_vaga')
+        return False
+    if not _orcamento().tentar_consumir():
+        admission.escalonador().sair()
+        metrics.incrementar('hedge.negados_orcamento')
+        return False
+    try:
+        coordination.consumir_ficha(espera_maxima=0)
+    except admission.ServidorOcupado:
+        admission.escalonador().sair()
+        metrics.incrementar('hedge.negados_limite_global')
+        return False
+    return True
+
+
+def _stream_com_hedge(chamada, chave):
+    """Executa `chamada` com hedging e devolve os pedaços da tentativa vencedora."""
+    avisos = queue.Queue()
+    principal = _Tentativa(avisos)
+    _executor.submit(principal.executar, chamada)
+    tentativas = [principal]
+    pendentes = 1
+    limiar = limiar_hedge(chave)
+    decidido = False # Já decidimos se haverá duplicata?
+    vencedora = None
+
+    try:
+        while vencedora is None:
+            try:
+                tentativa = avisos.get(timeout=None if decidido else limiar)
+            except queue.Empty:
+                decidido = True
+                if _reservar_duplicata():
+                    duplicata = _Tentativa(avisos, vaga_propria=True)
+                    _executor.submit(duplicata.executar, chamada)
+                    tentativas.append(duplicata)
+                    pendentes += 1
+                    metrics.incrementar('hedge.disparos')
+                continue
+
+            pendentes -= 1
+            decidido = True # Depois da primeira resposta não disparamos mais duplicatas
+            if tentativa.erro is not None and pendentes > 0:
+                continue # A outra tentativa ainda pode responder com sucesso
+            vencedora = tentativa
+
+        # Cancela a(s) perdedora(s)
+        for tentativa in tentativas:
+            if tentativa is not vencedora:
+                tentativa.cancelar()
+                metrics.incrementar('hedge.canceladas')
+
+        # Métricas de latência: o que o usuário viu x o que a chamada principal levaria
+        decorrido = time.monotonic() - principal.inicio
+        metrics.observar('hedge.ttft_efetivo', decorrido)
+        # Se a principal perdeu, sabemos apenas que ela levaria *pelo menos* este tempo
+        metrics.observar('hedge.ttft_principal', principal.ttft if principal.ttft is not None else decorrido)
+        if vencedora is not principal:
+            metrics.incrementar('hedge.vitorias_duplicata')
+        if vencedora.ttft is not None:
+            metrics.observar(f'ttft.{chave}', vencedora.ttft)
+
+        if vencedora.erro is not None:
+            raise vencedora.erro
+
+        while True:
+            pedaco = vencedora.fila.get()
+            if pedaco is _FIM:
+                break
+            yield pedaco
+        if vencedora.erro is not None:
+            raise vencedora.erro
+    finally:
+        # Se o chamador parar de ler antes do fim, nenhuma tentativa continua consumindo o stream
+        for tentativa in tentativas:
+            tentativa.cancelar()
+
+
+def relatorio_hedge():
+    """Resumo do modo hedging: ganho de latência na cauda e chamadas extras gastas."""
+    chamadas = metrics.contador('gemini.chamadas')
+    disparos = metrics.contador('hedge.disparos')
+    relatorio = {
+        'chamadas': chamadas,
+        'duplicatas_disparadas': disparos,
+        'duplicatas_vencedoras': metrics.contador('hedge.vitorias_duplicata'),
+        'negadas_por_orcamento': metrics.contador('hedge.negados_orcamento'),
+        'negadas_sem_vaga': metrics.contador('hedge.negados_vaga'),
+        'negadas_limite_global': metrics.contador('hedge.negados_limite_global'),
+        'chamadas_extras_pct': round(100 * disparos / chamadas, 1) if chamadas else 0.0,
+    }
+    for p in (50, 95, 99):
+        efetivo = metrics.percentil('hedge.ttft_efetivo', p)
+        principal = metrics.percentil('hedge.ttft_principal', p)
+        relatorio[f'ttft_p{p}_efetivo'] = efetivo
+        relatorio[f'ttft_p{p}_sem_hedge'] = principal # Limite inferior (principal cancelada)
+        if efetivo is not None and principal is not None:
+            relatorio[f'ganho_p{p}'] = round(principal - efetivo, 3)
+    return relatorio
+
+
+# --- Funções principais usadas pelos scripts ---
+
+def _generation_config(max_tokens, temperature, top_p, top_k, **extras):
+    """Monta o GenerationConfig com os parâmetros usados em todo o GerAI."""
+    return genai.GenerationConfig(
+        max_output_tokens=max_tokens,
+        temperature=temperature,
+        top_p=top_p,
+        top_k=top_k,
+        **extras
+    )
+
+
+def _limitar(fluxo, guarda):
+    """Aplica a um stream o limite de saída do tipo de texto (output_guard.LimiteSaida); sem limite, nada muda."""
+    if guarda is None:
+        yield from fluxo
+        return
+    with contextlib.closing(fluxo): # Atingido o limite, fecha o stream: a chamada é cancelada e o modelo para de gerar
+        for pedaco in fluxo:
+            texto = guarda.filtrar(pedaco)
+            if texto:
+                yield texto
+            if guarda.motivo is not None:
+                return
+    restante = guarda.finalizar()
+    if restante:
+        yield restante
+
+
+def _registrador_de_uso(model_name, usuario, text_type, tom):
+    """Função que grava o consumo de tokens de uma resposta.
+
+    Cada tentativa do hedging grava o seu ao terminar, na própria thread: duplicatas também custam,
+    mesmo as que perdem e terminam depois da vencedora.
+    """
+    def registrar(uso):
+        prompt_tokens, output_tokens = uso
+        usage.registrar(model_name, usuario, text_type, tom, prompt_tokens, output_tokens)
+    return registrar
+
+
+def stream_texto(model_name, prompt, max_tokens, temperature, top_p=0.9, top_k=0, text_type=None, hedge=None,
+                 prioridade=admission.INTERATIVA, usuario=None, tom=None, instrucao_sistema=None, cancelamento=None,
+                 prazo=None, **extras):
+    """Envia o prompt ao Gemini e devolve os pedaços de texto conforme chegam. Levanta exceção em caso de erro.
+
+    `prioridade` e `usuario` definem a posição na fila quando todas as vagas de chamada estão ocupadas
+    (levanta admission.ServidorOcupado se o servidor estiver sobrecarregado).
+    O consumo de tokens fica registrado por usuário, tipo de texto e `tom`; com o orçamento diário
+    esgotado, levanta usage.OrcamentoEsgotado antes de enviar.
+    `instrucao_sistema` é o bloco fixo de instruções (igual em todos os pedidos do mesmo tipo), enviado como
+    instrução de sistema com GERAI_CACHE_CONTEXTO (senão, no começo do prompt).
+    Com `cancelamento`, o stream para no próximo pedaço após o cancelamento (cancellation.ChamadaCancelada).
+    Com GERAI_CACHE_COMPARTILHADO=1, uma resposta já guardada para o mesmo pedido volta inteira, sem chamar o modelo.
+    `prazo` (s; padrão: transport.prazo(prioridade)) limita a chamada ao modelo, contado a partir da vaga obtida
+    e valendo também para as duplicatas do hedging; passado dele, levanta transport.PrazoEsgotado.
+    Parâmetros extras (ex.: response_mime_type) vão direto para o GenerationConfig.
+    """
+    chave_cache = None
+    if coordination.cache_ativo():
+        chave_cache = coordination.chave_resposta(model_name, prompt, instrucao_sistema, max_tokens=max_tokens, temperature=temperature,
+                                                  top_p=top_p, top_k=top_k, **extras)
+        guardada = coordination.obter(chave_cache)
+        if guardada is not None:
+            yield guardada
+            return
+
+    generation_config = _generation_config(max_tokens, temperature, top_p, top_k, **extras)
+    chave = text_type or 'geral'
+    if hedge is None:
+        hedge = config.ler_bool('GERAI_HEDGE', False)
+    prioridade = usage.verificar_orcamento(usuario, prioridade)
+    registrar_uso = _registrador_de_uso(model_name, usuario, text_type, tom)
+    partes = []
+
+    try:
+        with admission.vaga(prioridade, usuario, cancelamento):
+            if cancelamento is not None:
+                cancelamento.verificar()
+            coordination.consumir_ficha(admission.espera_maxima(prioridade), cancelamento)
+            metrics.incrementar('gemini.chamadas')
+            inicio = time.monotonic()
+            prazo = transport.prazo(prioridade) if prazo is None else prazo
+            limite = inicio + prazo if prazo else None
+            chamada = lambda: _stream_gemini(model_name, prompt, generation_config, registrar_uso, instrucao_sistema, limite)
+
+            guarda = output_guard.para_tipo(text_type)
+
+            if hedge:
+                _orcamento().registrar_chamada()
+                for pedaco in _limitar(_stream_com_hedge(chamada, chave), guarda):
+                    if cancelamento is not None:
+                        cancelamento.verificar()
+                    partes.append(pedaco)
+                    yield pedaco
+            else:
+                primeiro = True
+                for pedaco in _limitar(chamada(), guarda):
+                    if primeiro:
+                        # Alimenta o histórico de latência mesmo sem hedging, para ter limiares prontos
+                        metrics.observar(f'ttft.{chave}', time.monotonic() - inicio)
+                        primeiro = False
+                    if cancelamento is not None:
+                        cancelamento.verificar()
+                    partes.append(pedaco)
+                    yield pedaco
+            metrics.observar('gemini.duracao', time.monotonic() - inicio)
+            if guarda is not None:
+                guarda.registrar(time.monotonic() - inicio, sum(len(parte) for parte in partes))
+        if chave_cache is not None and partes:
+            coordination.guardar(chave_cache, ''.join(partes)) # Só respostas completas vão para o cache
+    except cancellation.ChamadaCancelada:
+        cancellation.registrar(cancelamento.motivo)
+        raise
+    except GeneratorExit:
+        # Quem consumia o stream parou no meio (rerun ou sessão encerrada no Streamlit)
+        cancellation.registrar('abandonada')
+        raise
+    except KeyboardInterrupt:
+        cancellation.registrar('ctrl_c')
+        raise
+
+
+def gerar_texto(model_name, prompt, max_tokens, temperature, top_p=0.9, top_k=0, text_type=None, hedge=None,
+                prioridade=admission.INTERATIVA, usuario=None, tom=None, instrucao_sistema=None, cancelamento=None,
+                prazo=None, **extras):
+    """Envia o prompt ao Gemini e retorna o texto completo. Levanta exceção em caso de erro."""
+    fluxo = stream_texto(model_name, prompt, max_tokens, temperature, top_p, top_k, text_type, hedge,
+                         prioridade=prioridade, usuario=usuario, tom=tom, instrucao_sistema=instrucao_sistema,
+                         cancelamento=cancelamento, prazo=prazo, **extras)
+    with contextlib.closing(fluxo): # Se algo interromper a junção (ex.: Ctrl+C), a vaga é liberada na hora
+        return ''.join(fluxo)
+
+
+def gerar_candidatos(model_name, prompt, max_tokens, temperature, top_p=0.9, top_k=0, candidate_count=1, text_type=None,
+                     prioridade=admission.INTERATIVA, usuario=None, tom=None, instrucao_sistema=None, cancelamento=None,
+                     prazo=None):
+    """Pede `candidate_count` versões do mesmo prompt numa única chamada e retorna a lista de textos.
+
+    A chamada não é em streaming: cada versão passa pelo limite de saída do tipo de texto (output_guard)
+    depois de recebida, e não há hedging.
+    """
+    if candidate_count <= 1:
+        return [gerar_texto(model_name, prompt, max_tokens, temperature, top_p, top_k, text_type=text_type,
+                            prioridade=prioridade, usuario=usuario, tom=tom, instrucao_sistema=instrucao_sistema,
+                            cancelamento=cancelamento, prazo=prazo)]
+
+    generation_config = _generation_config(max_tokens, temperature, top_p, top_k, candidate_count=candidate_count)
+    prioridade = usage.verificar_orcamento(usuario, prioridade)
+    try:
+        with admission.vaga(prioridade, usuario, cancelamento):
+            if cancelamento is not None:
+                cancelamento.verificar() # Substituída enquanto esperava na fila: nem chega a chamar o modelo
+            coordination.consumir_ficha(admission.espera_maxima(prioridade), cancelamento)
+            metrics.incrementar('gemini.chamadas')
+            inicio = time.monotonic()
+            prazo = transport.prazo(prioridade) if prazo is None else prazo
+            limite = inicio + prazo if prazo else None
+            model, prompt = _modelo_e_prompt(model_name, prompt, instrucao_sistema)
+            with transport.traduzir_prazo():
+                response = model.generate_content(prompt, generation_config=generation_config,
+                                                  request_options=transport.opcoes_pedido(limite))
+            duracao = time.monotonic() - inicio
+            metrics.observar('gemini.duracao', duracao)
+    except cancellation.ChamadaCancelada:
+        cancellation.registrar(cancelamento.motivo)
+        raise
+    uso = usage.ler_uso(response)
+    if uso:
+        _registrador_de_uso(model_name, usuario, text_type, tom)(uso)
+
+    textos = [
+        ''.join(part.text for part in candidato.content.parts)
+        for candidato in response.candidates
+        if candidato.content.parts
+    ]
+    if not textos:
+        # Mesma exceção da chamada simples quando a resposta foi bloqueada
+        textos = [response.text]
+    return [_limitar_texto(texto, output_guard.para_tipo(text_type), duracao) for texto in textos]
+
+
+def _limitar_texto(texto, guarda, duracao):
+    """Aplica a um texto já completo o limite de saída do tipo (o mesmo corte que o stream teria)."""
+    if guarda is None:
+        return texto
+    texto = guarda.filtrar(texto) + guarda.finalizar()
+    guarda.registrar(duracao, len(texto))
+    return texto
@@ -0,0 +1,48 @@
+# Acesso compartilhado ao banco SQLite do GerAI (gerai_history.db)
+# O app.py mostra o histórico (tabela interactions); os outros módulos (fila de tarefas, caches...)
+# usam este arquivo para abrir conexões no mesmo banco, gravar interações e criar suas próprias tabelas.
+
+import sqlite3
+from datetime import datetime
+
+DATABASE_NAME = 'gerai_history.db'
+
+
+def conectar():
+    """Abre uma conexão com o banco de histórico, esperando até 10s se outro processo estiver escrevendo."""
+    return sqlite3.connect(DATABASE_NAME, timeout=10)
+
+
+def init_interactions(conn):
+    """Cria a tabela de histórico se não existir."""
+    if conn.execute('PRAGMA page_count').fetchone()[0] == 0:
+        # Banco novo: já nasce com o auto-vacuum incremental (depois, ligá-lo exige um VACUUM completo)
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS interactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            operation_type TEXT, -- 'gerar' ou 'corrigir'
+            model_used TEXT,
+            input_text TEXT, -- Tema para gerar, Texto original para corrigir
+            output_text TEXT, -- Texto gerado/revisado
+            text_type TEXT, -- Tipo de texto (Artigo, Email, etc.) - para gerar
+            tone TEXT, -- Tom (Formal, Amigável, etc.)
+            latency_ms REAL -- Duração da chamada ao modelo (para os percentis de latência)
+            -- Poderiam adicionar mais colunas conforme necessário (ex: max_tokens, temperature)
+        )
+    ''')
+    # Bancos criados antes da coluna de latência
+    colunas = [linha[1] for linha in conn.execute('PRAGMA table_info(interactions)')]
+    if 'latency_ms' not in colunas:
+        conn.execute('ALTER TABLE interactions ADD COLUMN latency_ms REAL')
+
+
+def inserir_interacao(conn, operation_type, model_used, input_text, output_text, text_type=None, tone=None, latency_ms=None):
+    """Insere uma interação no histórico usando a conexão informada (sem commit). Retorna o id criado."""
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S') # Formato YYYY-MM-DD HH:MM:SS
+    cursor = conn.execute('''
+        INSERT INTO interactions (timestamp, operation_type, model_used, input_text, output_text, text_type, tone, latency_ms)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (timestamp, operation_type, model_used, input_text, output_text, text_type, tone, latency_ms))
+    return cursor.lastrowid
@@ -0,0 +1,302 @@
+# Correção incremental por parágrafo
+# Quando o usuário ajusta algumas frases e clica "Corrigir Texto" de novo, só os parágrafos novos ou
+# alterados vão para o modelo. Cada parágrafo recebe uma "impressão digital" (hash do texto + tom +
+# modelo) e as correções ficam num cache da sessão (e, opcionalmente, no gerai_history.db), junto com
+# as sugestões de cada parágrafo: a seção "Sugestões" continua cobrindo o texto inteiro.
+# Assim, latência e tokens ficam proporcionais ao tamanho da edição, não do documento.
+# Documentos enviados como arquivo passam pelo mesmo caminho, grupo a grupo (corrigir_documento).
+
+import hashlib
+import json
+import re
+from datetime import datetime
+
+import config
+import edit_correction
+import gemini_client
+import history_db
+import metrics
+import prompts
+
+# Máximo de parágrafos guardados no cache da sessão (os usados há mais tempo saem primeiro)
+MAX_PARAGRAFOS_SESSAO = 2000
+# Caracteres de parágrafos por chamada, para a resposta caber no limite de saída do modelo
+MAX_CARACTERES_POR_CHAMADA = 12000
+LIMITE_TOKENS_SAIDA = 8192
+
+
+def dividir_paragrafos(texto):
+    """Divide o texto em parágrafos (separados por linha em branco). Retorna (paragrafos, separadores)."""
+    partes = re.split(r'(\n[ \t]*\n\s*)', texto)
+    return partes[0::2], partes[1::2] # Guardamos os separadores originais para remontar o texto igual
+
+
+def impressao_digital(paragrafo, tom, model_name):
+    """Hash que identifica a correção de um parágrafo (mesmo texto, tom e modelo = mesma correção)."""
+    return hashlib.sha256(f"{model_name}\x00{tom}\x00{paragrafo.strip()}".encode('utf-8')).hexdigest()
+
+
+# --- Cache persistente (opcional) no banco de histórico ---
+
+def _init_tabela(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS paragraph_corrections (
+            fingerprint TEXT PRIMARY KEY, -- impressao_digital do parágrafo original
+            corrected_text TEXT,
+            created_at TEXT,
+            suggestions TEXT -- Sugestões do parágrafo (lista em JSON)
+        )
+    ''')
+    # Tabelas criadas antes das sugestões por parágrafo
+    colunas = [linha[1] for linha in conn.execute('PRAGMA table_info(paragraph_corrections)')]
+    if 'suggestions' not in colunas:
+        conn.execute('ALTER TABLE paragraph_corrections ADD COLUMN suggestions TEXT')
+
+
+def _ler_persistente(digitais):
+    """Busca no banco as correções já conhecidas ({impressão digital: (texto corrigido, sugestões)})."""
+    if not digitais:
+        return {}
+    conn = history_db.conectar()
+    try:
+        _init_tabela(conn)
+        encontrados = {}
+        digitais = list(digitais)
+        for inicio in range(0, len(digitais), 500): # Limite de parâmetros por consulta do SQLite
+            lote = digitais[inicio:inicio + 500]
+            marcadores = ','.join('?' * len(lote))
+            cursor = conn.execute(f'SELECT fingerprint, corrected_text, suggestions FROM paragraph_corrections '
+                                  f'WHERE fingerprint IN ({marcadores})', lote)
+            for digital, texto, sugestoes in cursor:
+                encontrados[digital] = (texto, tuple(json.loads(sugestoes)) if sugestoes else ())
+        return encontrados
+    finally:
+        conn.close()
+
+
+def _salvar_persistente(correcoes):
+    """Grava no banco as correções novas ({impressão digital: (texto corrigido, sugestões)})."""
+    if not correcoes:
+        return
+    conn = history_db.conectar()
+    try:
+        _init_tabela(conn)
+        agora = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        conn.executemany(
+            'INSERT OR REPLACE INTO paragraph_corrections (fingerprint, corrected_text, created_at, suggestions) VALUES (?, ?, ?, ?)',
+            [(digital, texto, agora, json.dumps(list(sugestoes), ensure_ascii=False)) for digital, (texto, sugestoes) in correcoes.items()]
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# --- Cache da sessão ---
+# Cada entrada é {impressão digital: (texto corrigido, sugestões do parágrafo)}.
+
+def _marcar_usados(cache_sessao, digitais):
+    """Leva as correções reaproveitadas para o fim do dicionário (ordem de uso, para _limitar_cache)."""
+    for digital in digitais:
+        if digital in cache_sessao:
+            cache_sessao[digital] = cache_sessao.pop(digital)
+
+
+def _a_enviar(paragrafos, digitais, faltando):
+    """Parágrafos que vão ao modelo: os que faltam no cache, cada um uma única vez (mesmo se aparecer repetido)."""
+    enviar, enviadas = [], set()
+    for paragrafo, digital in zip(paragrafos, digitais):
+        if digital in faltando and digital not in enviadas:
+            enviadas.add(digital)
+            enviar.append(paragrafo)
+    return enviar
+
+
+def _sugestoes(cache_sessao, digitais):
+    """Sugestões guardadas dos parágrafos, na ordem do texto (parágrafos repetidos contam uma vez)."""
+    sugestoes, vistas = [], set()
+    for digital in digitais:
+        if digital in cache_sessao and digital not in vistas:
+            vistas.add(digital)
+            sugestoes.extend(cache_sessao[digital][1])
+    return sugestoes
+
+
+def _limitar_cache(cache_sessao):
+    """Tira do cache da sessão as correções usadas há mais tempo, até caber em MAX_PARAGRAFOS_SESSAO."""
+    while len(cache_sessao) > MAX_PARAGRAFOS_SESSAO:
+        del cache_sessao[next(iter(cache_sessao))] # Dicionários mantêm a ordem de inserção: sai o usado há mais tempo
+
+
+# --- Correção dos parágrafos alterados ---
+
+def montar_prompt_paragrafos(paragrafos, tom):
+    """Monta o prompt que corrige apenas os parágrafos numerados, com resposta em JSON."""
+    lista = '\n\n'.join(f"[{numero}]\n{paragrafo}" for numero, paragrafo in enumerate(paragrafos, start=1))
+    return prompts.montar('paragrafos', tom=tom, paragrafos=lista)
+
+
+def _grupos_por_tamanho(paragrafos):
+    """Agrupa os parágrafos em chamadas de até MAX_CARACTERES_POR_CHAMADA caracteres."""
+    grupo, tamanho = [], 0
+    for paragrafo in paragrafos:
+        if grupo and tamanho + len(paragrafo) > MAX_CARACTERES_POR_CHAMADA:
+            yield grupo
+            grupo, tamanho = [], 0
+        grupo.append(paragrafo)
+        tamanho += len(paragrafo)
+    if grupo:
+        yield grupo
+
+
+def _corrigir_paragrafos(model_name, paragrafos, tom, usuario=None, cancelamento=None):
+    """Envia os parágrafos ao modelo. Retorna (corrigidos, sugestões de cada um), na mesma ordem, ou levanta ValueError.
+
+    Sugestões soltas (fora dos parágrafos) ficam com o primeiro parágrafo do grupo.
+    """
+    corrigidos, sugestoes = [], []
+    for grupo in _grupos_por_tamanho(paragrafos):
+        # ~1 token a cada 3 caracteres, com folga para o JSON e as sugestões
+        max_tokens = min(LIMITE_TOKENS_SAIDA, int(sum(len(p) for p in grupo) / 3 * 1.3) + 400)
+        resposta = gemini_client.gerar_texto(
+            model_name, montar_prompt_paragrafos(grupo, tom), max_tokens, 0.5, 0.9, 0,
+            text_type='corrigir:paragrafos', response_mime_type='application/json', usuario=usuario, tom=tom,
+            cancelamento=cancelamento
+        )
+        dados = gemini_client.ler_json_resposta(resposta)
+        if not isinstance(dados, dict) or not isinstance(dados.get('paragrafos'), list):
+            raise ValueError("Resposta sem a lista de parágrafos.")
+
+        por_id = {}
+        for item in dados['paragrafos']:
+            if isinstance(item, dict) and isinstance(item.get('texto'), str):
+                try:
+                    por_id[int(item.get('id'))] = (item['texto'].strip(), _lista_sugestoes(item.get('sugestoes')))
+                except (TypeError, ValueError):
+                    continue
+        if any(numero not in por_id for numero in range(1, len(grupo) + 1)):
+            raise ValueError("O modelo não devolveu todos os parágrafos.")
+
+        soltas = _lista_sugestoes(dados.get('sugestoes'))
+        for numero in range(1, len(grupo) + 1):
+            texto, sugestoes_paragrafo = por_id[numero]
+            corrigidos.append(texto)
+            sugestoes.append(soltas + sugestoes_paragrafo if numero == 1 else sugestoes_paragrafo)
+    return corrigidos, sugestoes
+
+
+def _lista_sugestoes(valor):
+    """Sugestões não vazias de uma lista da resposta, como tupla de textos."""
+    if not isinstance(valor, list):
+        return ()
+    return tuple(str(s) for s in valor if str(s).strip())
+
+
+def corrigir_incremental(model_name, texto_original, tom, cache_sessao, correcao_completa, persistente=None, usuario=None,
+                         cancelamento=None):
+    """Corrige só os parágrafos novos/alterados e remonta o texto com os demais vindos do cache.
+
+    `cache_sessao` é um dicionário guardado pelo chamador (ex.: em st.session_state) entre execuções; ele é atualizado aqui.
+    Se a resposta do modelo vier incompleta, usa `correcao_completa()`. Com `cancelamento`, a chamada pode ser cancelada.
+    As sugestões do resultado cobrem todos os parágrafos (as dos reaproveitados vêm do cache).
+    Retorna um dicionário com 'resultado', 'total', 'reaproveitados', 'enviados' e 'modo'.
+    """
+    if persistente is None:
+        persistente = config.ler_bool('GERAI_CACHE_PARAGRAFOS_PERSISTENTE', False)
+    paragrafos, separadores = dividir_paragrafos(texto_original)
+    digitais = [impressao_digital(p, tom, model_name) if p.strip() else None for p in paragrafos]
+
+    faltando = {d for d in digitais if d and d not in cache_sessao}
+    _marcar_usados(cache_sessao, digitais)
+    if persistente and faltando:
+        for digital, correcao in _ler_persistente(faltando).items():
+            cache_sessao[digital] = correcao
+        faltando -= set(cache_sessao)
+
+    enviar = _a_enviar(paragrafos, digitais, faltando)
+    if enviar:
+        try:
+            corrigidos, sugestoes = _corrigir_paragrafos(model_name, enviar, tom, usuario, cancelamento)
+        except ValueError:
+            metrics.incrementar('correcao_incremental.fallback')
+            return {'resultado': correcao_completa(), 'total': len(paragrafos), 'reaproveitados': 0,
+                    'enviados': len(paragrafos), 'modo': 'completo'}
+        novos = {impressao_digital(p, tom, model_name): correcao for p, correcao in zip(enviar, zip(corrigidos, sugestoes))}
+        cache_sessao.update(novos)
+        if persistente:
+            _salvar_persistente(novos)
+
+    # Remonta o texto: parágrafos corrigidos (do cache) com os separadores originais
+    partes = []
+    for indice, (paragrafo, digital) in enumerate(zip(paragrafos, digitais)):
+        partes.append(cache_sessao[digital][0] if digital else paragrafo)
+        if indice < len(separadores):
+            partes.append(separadores[indice])
+    sugestoes = _sugestoes(cache_sessao, digitais)
+
+    _limitar_cache(cache_sessao)
+
+    total = sum(1 for d in digitais if d)
+    reaproveitados = total - sum(1 for d in digitais if d in faltando)
+    metrics.incrementar('correcao_incremental.paragrafos_reaproveitados', reaproveitados)
+    metrics.incrementar('correcao_incremental.paragrafos_enviados', len(enviar))
+    metrics.incrementar('correcao_incremental.caracteres_enviados', sum(len(p) for p in enviar))
+    metrics.incrementar('correcao_incremental.caracteres_totais', len(texto_original))
+
+    return {
+        'resultado': edit_correction.formatar_resultado(''.join(partes), sugestoes),
+        'total': total,
+        'reaproveitados': reaproveitados,
+        'enviados': len(enviar),
+        'modo': 'incremental',
+    }
+
+
+# --- Correção de documentos em fluxo (arquivos enviados) ---
+
+def corrigir_documento(model_name, paragrafos, tom, cache_sessao, persistente=None, usuario=None, cancelamento=None):
+    """Corrige um documento que chega como fluxo de parágrafos (ex.: ingestion.ler_paragrafos), grupo a grupo.
+
+    Consome o fluxo aos poucos (só um grupo de parágrafos fica na memória) e gera, para cada grupo,
+    um dicionário com 'paragrafos' (corrigidos, na ordem), 'sugestoes' (também as dos parágrafos
+    reaproveitados), 'enviados', 'reaproveitados' e 'falhou' (True se a resposta do modelo veio incompleta e o grupo ficou como estava).
+    Parágrafos já corrigidos antes (cache da sessão ou do banco) não vão de novo ao modelo.
+    Com `cancelamento`, as chamadas podem ser canceladas (cancellation.ChamadaCancelada).
+    """
+    if persistente is None:
+        persistente = config.ler_bool('GERAI_CACHE_PARAGRAFOS_PERSISTENTE', False)
+    normalizados = (prompts.normalizar_texto(paragrafo) for paragrafo in paragrafos)
+    for grupo in _grupos_por_tamanho(p for p in normalizados if p):
+        digitais = [impressao_digital(p, tom, model_name) for p in grupo]
+        faltando = {d for d in digitais if d not in cache_sessao}
+        _marcar_usados(cache_sessao, digitais)
+        if persistente and faltando:
+            for digital, correcao in _ler_persistente(faltando).items():
+                cache_sessao[digital] = correcao
+            faltando -= set(cache_sessao)
+
+        enviar = _a_enviar(grupo, digitais, faltando)
+        falhou = False
+        if enviar:
+            try:
+                corrigidos, sugestoes = _corrigir_paragrafos(model_name, enviar, tom, usuario, cancelamento)
+                novos = {impressao_digital(p, tom, model_name): correcao for p, correcao in zip(enviar, zip(corrigidos, sugestoes))}
+                cache_sessao.update(novos)
+                if persistente:
+                    _salvar_persistente(novos)
+            except ValueError:
+                metrics.incrementar('correcao_documento.grupos_sem_correcao')
+                falhou = True
+
+        # O grupo é montado antes de limitar o cache: uma correção que sair agora ainda vale para ele
+        corrigidos = [cache_sessao[digital][0] if digital in cache_sessao else paragrafo for paragrafo, digital in zip(grupo, digitais)]
+        sugestoes = _sugestoes(cache_sessao, digitais)
+        _limitar_cache(cache_sessao)
+
+        metrics.incrementar('correcao_documento.paragrafos', len(grupo))
+        yield {
+            'paragrafos': corrigidos,
+            'sugestoes': sugestoes,
+            'enviados': len(enviar),
+            'reaproveitados': len(grupo) - sum(1 for d in digitais if d in faltando),
+            'falhou': falhou,
+        }
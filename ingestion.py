@@ -0,0 +1,149 @@
+# Leitura de documentos (.txt e .docx) para a correção
+# Em vez de colar o texto (lento em documentos grandes e sem os parágrafos no main2.py), o usuário
+# envia o arquivo. O conteúdo é lido como um fluxo de parágrafos, um de cada vez: o .txt linha a
+# linha e o .docx direto do XML compactado (iterparse), sem montar o documento inteiro na memória.
+# Um limite de tamanho protege o processo de arquivos enormes, e parágrafos gigantes são divididos
+# para caber nas chamadas de correção.
+
+import codecs
+import io
+import zipfile
+from pathlib import Path
+from xml.etree import ElementTree
+
+import config
+import metrics
+
+MAX_MB_PADRAO = 20 # Texto máximo (MB) lido de um documento
+MAX_CARACTERES_PARAGRAFO = 4000 # Parágrafos maiores são divididos (em espaços) em partes deste tamanho
+EXTENSOES = ('.txt', '.docx')
+
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}' # Namespace do WordprocessingML
+
+
+class DocumentoInvalido(ValueError):
+    """O arquivo não pôde ser lido como documento de texto (formato não suportado, corrompido ou grande demais)."""
+
+
+def _limite_caracteres():
+    return int(config.ler_float('GERAI_DOCUMENTO_MAX_MB', MAX_MB_PADRAO) * 1024 * 1024)
+
+
+def _dividir(paragrafo):
+    """Divide um parágrafo gigante em partes de até MAX_CARACTERES_PARAGRAFO, de preferência em espaços."""
+    while len(paragrafo) > MAX_CARACTERES_PARAGRAFO:
+        corte = paragrafo.rfind(' ', 0, MAX_CARACTERES_PARAGRAFO)
+        if corte <= 0:
+            corte = MAX_CARACTERES_PARAGRAFO
+        yield paragrafo[:corte]
+        paragrafo = paragrafo[corte:].lstrip()
+    if paragrafo:
+        yield paragrafo
+
+
+class _Contador:
+    """Soma os caracteres lidos e interrompe a leitura acima do limite."""
+
+    def __init__(self):
+        self.limite = _limite_caracteres()
+        self.lidos = 0
+
+    def somar(self, quantidade):
+        self.lidos += quantidade
+        if self.lidos > self.limite:
+            metrics.incrementar('documentos.recusados')
+            raise DocumentoInvalido(f"Documento grande demais (limite de {self.limite // (1024 * 1024)} MB de texto).")
+
+
+# --- .txt ---
+
+def _codificacao(arquivo):
+    """UTF-8 (com ou sem BOM) se o começo do arquivo for UTF-8 válido; senão, cp1252 (comum no Windows)."""
+    inicio = arquivo.tell()
+    amostra = arquivo.read(64 * 1024)
+    arquivo.seek(inicio)
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(amostra) # Aceita um caractere cortado no fim da amostra
+        return 'utf-8-sig'
+    except UnicodeDecodeError:
+        return 'cp1252'
+
+
+def _paragrafos_txt(arquivo, contador):
+    texto = io.TextIOWrapper(arquivo, encoding=_codificacao(arquivo), errors='replace', newline=None)
+    try:
+        partes = [] # Texto do parágrafo atual
+        tamanho = 0
+        inicio_de_linha = True
+        # readline com limite: nem uma linha enorme sem quebras é lida inteira de uma vez
+        for pedaco in iter(lambda: texto.readline(MAX_CARACTERES_PARAGRAFO), ''):
+            contador.somar(len(pedaco))
+            linha_completa = pedaco.endswith('\n')
+            pedaco = pedaco.rstrip('\n')
+            if inicio_de_linha and linha_completa and not pedaco.strip():
+                # Linha em branco: fim do parágrafo
+                if partes:
+                    yield from _dividir(''.join(partes))
+                    partes, tamanho = [], 0
+                continue
+            if inicio_de_linha and partes:
+                partes.append('\n')
+            partes.append(pedaco)
+            tamanho += len(pedaco)
+            inicio_de_linha = linha_completa
+            if tamanho >= MAX_CARACTERES_PARAGRAFO:
+                # Parágrafo gigante: entrega as partes completas e continua a partir da última
+                divididos = list(_dividir(''.join(partes)))
+                yield from divididos[:-1]
+                partes, tamanho = divididos[-1:], len(divididos[-1])
+        if partes:
+            yield from _dividir(''.join(partes))
+    finally:
+        texto.detach() # Não fecha o arquivo de quem chamou
+
+
+# --- .docx ---
+
+def _paragrafos_docx(arquivo, contador):
+    try:
+        pacote = zipfile.ZipFile(arquivo)
+        xml = pacote.open('word/document.xml')
+    except (zipfile.BadZipFile, KeyError):
+        raise DocumentoInvalido("Arquivo .docx inválido ou corrompido.")
+    with pacote, xml:
+        partes = []
+        try:
+            for _, elemento in ElementTree.iterparse(xml, events=('end',)):
+                if elemento.tag == _W + 't':
+                    partes.append(elemento.text or '')
+                    contador.somar(len(elemento.text or ''))
+                elif elemento.tag == _W + 'tab':
+                    partes.append('\t')
+                elif elemento.tag in (_W + 'br', _W + 'cr'):
+                    partes.append('\n')
+                elif elemento.tag == _W + 'p':
+                    paragrafo = ''.join(partes)
+                    partes = []
+                    elemento.clear() # Libera o XML do parágrafo já lido
+                    if paragrafo.strip():
+                        yield from _dividir(paragrafo)
+        except ElementTree.ParseError:
+            raise DocumentoInvalido("Arquivo .docx inválido ou corrompido.")
+
+
+def ler_paragrafos(arquivo, nome):
+    """Gera os parágrafos não vazios de um documento .txt ou .docx, um de cada vez.
+
+    `arquivo` é um arquivo binário aberto (ou o UploadedFile do Streamlit) e `nome` define o formato
+    pela extensão. Levanta DocumentoInvalido para formatos não suportados, arquivos corrompidos ou
+    acima de GERAI_DOCUMENTO_MAX_MB.
+    """
+    extensao = Path(nome).suffix.lower()
+    if extensao not in EXTENSOES:
+        raise DocumentoInvalido(f"Formato não suportado: use {' ou '.join(EXTENSOES)}.")
+    metrics.incrementar(f'documentos.lidos{extensao}')
+    contador = _Contador()
+    leitor = _paragrafos_txt if extensao == '.txt' else _paragrafos_docx
+    for paragrafo in leitor(arquivo, contador):
+        metrics.incrementar('documentos.paragrafos')
+        yield paragrafo
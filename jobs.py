@@ -0,0 +1,245 @@
+# Fila persistente de tarefas (jobs) para gerações e correções longas
+# Em vez de rodar a chamada dentro do script do Streamlit (que se perde se o usuário trocar de aba,
+# recarregar ou a conexão cair), o pedido vira uma linha na tabela `jobs` do gerai_history.db
+# (queued -> running -> done/failed). Um pool de workers por processo pega as tarefas da fila,
+# chama o Gemini e grava o resultado (e a interação no histórico). A interface só consulta o status.
+#
+# Segurança em reinícios: cada worker renova um "batimento" (heartbeat) das tarefas que está rodando.
+# Tarefas em 'running' sem batimento recente (processo que morreu) voltam para a fila.
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import admission
+import config
+import gemini_client
+import history_db
+import metrics
+
+# Status possíveis de uma tarefa
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+INTERVALO_BUSCA = 1.0 # Segundos entre buscas na fila quando ela está vazia
+MAX_TENTATIVAS = 3 # Vezes que uma tarefa abandonada (processo morreu) volta para a fila
+
+# Identifica os workers deste processo (único mesmo se o PID for reaproveitado após reinício)
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+_workers = []
+_workers_lock = threading.Lock()
+
+
+def _agora():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _lease():
+    """Segundos sem batimento até uma tarefa em execução ser considerada abandonada."""
+    return config.ler_float('GERAI_JOBS_LEASE', 60)
+
+
+def init_tabela(conn):
+    """Cria a tabela de tarefas se não existir."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at TEXT,
+            updated_at TEXT,
+            status TEXT, -- 'queued', 'running', 'done' ou 'failed'
+            operation_type TEXT, -- 'gerar' ou 'corrigir'
+            model_used TEXT,
+            params TEXT, -- JSON com prompt e parâmetros de geração
+            input_text TEXT, -- Como será salvo no histórico
+            text_type TEXT,
+            tone TEXT,
+            result TEXT,
+            error TEXT,
+            worker_id TEXT,
+            heartbeat REAL, -- time.time() do último batimento do worker
+            attempts INTEGER DEFAULT 0,
+            interaction_id INTEGER -- Linha criada em interactions quando concluída
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, id)')
+
+
+def enfileirar(operation_type, model_used, prompt, max_tokens, temperature, top_p=0.9, top_k=0,
+               text_type=None, input_text=None, tone=None, instrucao_sistema=None):
+    """Coloca um pedido de geração/correção na fila. Retorna o id da tarefa."""
+    params = {
+        'prompt': prompt,
+        'instrucao_sistema': instrucao_sistema,
+        'max_tokens': max_tokens,
+        'temperature': temperature,
+        'top_p': top_p,
+        'top_k': top_k,
+    }
+    conn = history_db.conectar()
+    try:
+        init_tabela(conn)
+        agora = _agora()
+        cursor = conn.execute('''
+            INSERT INTO jobs (created_at, updated_at, status, operation_type, model_used, params, input_text, text_type, tone)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (agora, agora, QUEUED, operation_type, model_used, json.dumps(params, ensure_ascii=False), input_text, text_type, tone))
+        conn.commit()
+        metrics.incrementar('jobs.enfileiradas')
+        return cursor.lastrowid
+    finally:
+        conn.close()
+
+
+def consultar(ids):
+    """Retorna o estado das tarefas informadas como dicionários (na ordem dos ids)."""
+    if not ids:
+        return []
+    conn = history_db.conectar()
+    conn.row_factory = sqlite3.Row
+    try:
+        init_tabela(conn)
+        marcadores = ','.join('?' * len(ids))
+        linhas = conn.execute(f'''
+            SELECT id, created_at, updated_at, status, operation_type, input_text, text_type, tone, result, error, attempts
+            FROM jobs WHERE id IN ({marcadores})
+        ''', list(ids)).fetchall()
+    finally:
+        conn.close()
+    por_id = {linha['id']: dict(linha) for linha in linhas}
+    return [por_id[job_id] for job_id in ids if job_id in por_id]
+
+
+def tamanho_fila():
+    """Quantidade de tarefas aguardando ou em execução."""
+    conn = history_db.conectar()
+    try:
+        init_tabela(conn)
+        return conn.execute('SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)', (QUEUED, RUNNING)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+# --- Lado do worker ---
+
+def _reivindicar(conn):
+    """Pega a próxima tarefa da fila de forma atômica (só um worker, de qualquer processo, fica com ela)."""
+    conn.execute('BEGIN IMMEDIATE') # Trava de escrita: dois workers não pegam a mesma tarefa
+    try:
+        linha = conn.execute('SELECT id, operation_type, model_used, params, input_text, text_type, tone FROM jobs '
+                             'WHERE status = ? ORDER BY id LIMIT 1', (QUEUED,)).fetchone()
+        if linha:
+            conn.execute('UPDATE jobs SET status = ?, worker_id = ?, heartbeat = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?',
+                         (RUNNING, WORKER_ID, time.time(), _agora(), linha[0]))
+        conn.execute('COMMIT')
+        return linha
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def _recuperar_abandonadas(conn):
+    """Devolve para a fila as tarefas cujo worker parou de dar sinal (ex.: processo reiniciado)."""
+    limite = time.time() - _lease()
+    agora = _agora()
+    conn.execute('UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE status = ? AND heartbeat < ? AND attempts >= ?',
+                 (FAILED, 'Tarefa abandonada várias vezes (o processo foi interrompido).', agora, RUNNING, limite, MAX_TENTATIVAS))
+    cursor = conn.execute('UPDATE jobs SET status = ?, worker_id = NULL, updated_at = ? WHERE status = ? AND heartbeat < ?',
+                          (QUEUED, agora, RUNNING, limite))
+    conn.commit()
+    if cursor.rowcount:
+        metrics.incrementar('jobs.recuperadas', cursor.rowcount)
+
+
+def _executar(conn, linha):
+    """Roda a chamada ao Gemini da tarefa e grava o resultado (sem transação aberta durante a chamada)."""
+    job_id, operation_type, model_used, params, input_text, text_type, tone = linha
+    params = json.loads(params)
+    inicio = time.monotonic()
+    try:
+        resultado = gemini_client.gerar_texto(
+            model_used, params['prompt'], params['max_tokens'], params['temperature'],
+            params['top_p'], params['top_k'], text_type=text_type or operation_type, tom=tone,
+            instrucao_sistema=params.get('instrucao_sistema'), # Tarefas antigas não têm este campo
+            prioridade=admission.FUNDO # Tarefas em segundo plano só usam vagas que sobrarem
+        )
+        erro = None
+    except Exception as e:
+        resultado, erro = None, str(e)
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        # Só grava se a tarefa ainda for nossa (não foi dada como abandonada e reenfileirada)
+        cursor = conn.execute('UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ? AND status = ? AND worker_id = ?',
+                              (FAILED if erro else DONE, resultado, erro, _agora(), job_id, RUNNING, WORKER_ID))
+        if cursor.rowcount and not erro:
+            # Resultado e histórico gravados juntos: ou os dois ficam salvos, ou nenhum
+            interaction_id = history_db.inserir_interacao(conn, operation_type, model_used, input_text, resultado, text_type, tone,
+                                                          latency_ms=(time.monotonic() - inicio) * 1000)
+            conn.execute('UPDATE jobs SET interaction_id = ? WHERE id = ?', (interaction_id, job_id))
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+    metrics.incrementar('jobs.falhas' if erro else 'jobs.concluidas')
+    metrics.observar('jobs.duracao', time.monotonic() - inicio)
+
+
+def _loop_worker(parar):
+    conn = history_db.conectar()
+    conn.isolation_level = None # Controlamos as transações manualmente (BEGIN IMMEDIATE)
+    init_tabela(conn)
+    history_db.init_interactions(conn)
+    ultima_recuperacao = 0
+    while not parar.is_set():
+        try:
+            if time.time() - ultima_recuperacao > _lease() / 2:
+                conn.execute('BEGIN IMMEDIATE')
+                _recuperar_abandonadas(conn)
+                ultima_recuperacao = time.time()
+            linha = _reivindicar(conn)
+            if linha is None:
+                parar.wait(INTERVALO_BUSCA)
+                continue
+            _executar(conn, linha)
+        except Exception:
+            # Banco ocupado ou erro inesperado: tenta de novo no próximo ciclo
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            metrics.incrementar('jobs.erros_worker')
+            parar.wait(INTERVALO_BUSCA)
+    conn.close()
+
+
+def _loop_batimento(parar):
+    """Renova o batimento das tarefas em execução neste processo."""
+    while not parar.wait(_lease() / 3):
+        try:
+            conn = history_db.conectar()
+            conn.execute('UPDATE jobs SET heartbeat = ? WHERE status = ? AND worker_id = ?', (time.time(), RUNNING, WORKER_ID))
+            conn.commit()
+            conn.close()
+        except Exception:
+            metrics.incrementar('jobs.erros_batimento')
+
+
+def iniciar_workers(quantidade=None):
+    """Inicia (uma única vez por processo) o pool de workers da fila. Chamadas seguintes não fazem nada."""
+    with _workers_lock:
+        if _workers:
+            return
+        if quantidade is None:
+            quantidade = config.ler_int('GERAI_JOBS_WORKERS', 2)
+        parar = threading.Event()
+        for numero in range(quantidade):
+            thread = threading.Thread(target=_loop_worker, args=(parar,), name=f'gerai-job-{numero}', daemon=True)
+            thread.start()
+            _workers.append(thread)
+        batimento = threading.Thread(target=_loop_batimento, args=(parar,), name='gerai-job-batimento', daemon=True)
+        batimento.start()
+        _workers.append(batimento)
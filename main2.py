@@ -1,10 +1,39 @@
 # Início do Arquivo
 
-import google.generativeai as genai
+import argparse
+import contextlib
+import io
 import os
+import sys
+import time
+import unicodedata
 from dotenv import load_dotenv
 import docx # Importa a biblioteca python-docx
 from docx import Document # Importa a classe Document
+import gemini_client # Chamada ao Gemini compartilhada entre os scripts
+import prompts # Modelos de prompt compartilhados (sem indentação)
+import ingestion # Leitura de arquivos .txt/.docx em fluxo de parágrafos
+import incremental_correction # Correção de documentos por grupos de parágrafos
+import edit_correction # Formatação do resultado (texto revisado + sugestões)
+import admission # ServidorOcupado (fila de chamadas cheia)
+import cancellation # ChamadaCancelada
+import usage # OrcamentoEsgotado (orçamento diário de tokens)
+import export # Exportação em massa do histórico (.zip)
+import transport # Transporte (gRPC/REST), keepalive e prazo das chamadas ao Gemini
+import precheck # Pré-verificação local da correção (evita ou reduz chamadas)
+from datetime import datetime, timedelta
+
+# Códigos de saída (modo filtro: `main2.py correct|generate`). Seguem o sysexits.h onde existe um equivalente.
+SAIDA_OK = 0
+SAIDA_ERRO_MODELO = 1 # Erro na chamada ao modelo (rede, chave inválida, resposta bloqueada...)
+SAIDA_USO = 2 # Argumentos inválidos (mesmo código do argparse)
+SAIDA_ENTRADA = 65 # EX_DATAERR: entrada vazia ou documento inválido
+SAIDA_ARQUIVO = 66 # EX_NOINPUT: arquivo de entrada não pôde ser aberto
+SAIDA_GRAVACAO = 73 # EX_CANTCREAT: arquivo de saída (--out) não pôde ser gravado
+SAIDA_OCUPADO = 75 # EX_TEMPFAIL: servidor ocupado, orçamento esgotado ou prazo esgotado (tentar de novo mais tarde)
+SAIDA_CONFIG = 78 # EX_CONFIG: GOOGLE_API_KEY ausente
+SAIDA_INTERROMPIDO = 130 # Ctrl+C (128 + SIGINT)
+SAIDA_PIPE_FECHADO = 141 # Quem lia a saída fechou o pipe (128 + SIGPIPE), ex.: `| head`
 
 # 1. Carregar a chave de API do arquivo .env e configurar Google AI
 load_dotenv()
@@ -12,12 +41,13 @@ GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
 
 # Verifica se a chave foi encontrada
 if not GOOGLE_API_KEY:
-    print("Erro: Chave de API do Google não encontrada no arquivo .env.")
-    print("Por favor, adicione GOOGLE_API_KEY='sua_chave_aqui' ao seu arquivo .env")
-    exit()
+    # Mensagens em stderr: no modo filtro, stdout é só o texto do modelo
+    print("Erro: Chave de API do Google não encontrada no arquivo .env.", file=sys.stderr)
+    print("Por favor, adicione GOOGLE_API_KEY='sua_chave_aqui' ao seu arquivo .env", file=sys.stderr)
+    sys.exit(SAIDA_CONFIG)
 
-# Configura a ferramenta do Google Gemini com a sua chave
-genai.configure(api_key=GOOGLE_API_KEY)
+# Configura a ferramenta do Google Gemini com a sua chave (transporte e conexão vêm do .env)
+transport.configurar(GOOGLE_API_KEY)
 
 # --- NOTA: O nome do modelo foi substituído por 'models/gemini-1.5-flash'
 # Certifique-se que este nome está na lista de modelos que sua chave suporta!
@@ -26,6 +56,26 @@ genai.configure(api_key=GOOGLE_API_KEY)
 # Nome do modelo padrão para usar - AGORA DEFINIDO COMO 'models/gemini-1.5-flash'!
 default_model_name = 'models/gemini-1.5-flash' # <--- Nome do modelo definido aqui
 
+# Opções de tipo de texto e de tom (menu interativo e argumentos --type/--tone do modo filtro)
+tipos_texto_gerar = {
+    '1': 'Artigo/Texto Acadêmico',
+    '2': 'E-mail Profissional',
+    '3': 'Post para Redes Sociais (Ideias e Sugestões)', # <-- ATUALIZADO
+    '4': 'Conteúdo de Marketing Digital (Ideias, sugestões, descrição de Produto)', # <-- ATUALIZADO
+    '5': 'Roteiro Simples (Viagens entre outros)', # <-- ATUALIZADO
+    '6': 'Descrição de Produto'
+}
+
+# Opções de tom para gerar e corrigir
+tons_disponiveis = {
+    '1': 'Formal',
+    '2': 'Amigável',
+    '3': 'Persuasivo',
+    '4': 'Técnico',
+    '5': 'Criativo',
+    '6': 'Neutro'
+}
+
 
 # Função auxiliar para salvar texto
 def salvar_texto(texto_conteudo, tipo_texto):
@@ -84,32 +134,65 @@ def salvar_texto(texto_conteudo, tipo_texto):
 
 # 2. Função para interagir com o modelo Gemini (geral para geração e correção)
 # Agora esta função recebe o prompt completo
-def interagir_com_gemini(prompt, max_tokens, temperature, top_p=0.9, top_k=0):
-    """Envia um prompt para o modelo Gemini e retorna a resposta."""
+def interagir_com_gemini(prompt, max_tokens, temperature, top_p=0.9, top_k=0, text_type=None, tone=None, instrucao_sistema=None):
+    """Envia um prompt para o modelo Gemini e retorna a resposta (None se cancelada com Ctrl+C)."""
     try:
-        model = genai.GenerativeModel(default_model_name)
-
-        # Configuração da geração com parâmetros ajustados
-        generation_config = genai.GenerationConfig(
-            max_output_tokens=max_tokens,
-            temperature=temperature,
-            top_p=top_p, # Adicionado para controlar foco
-            top_k=top_k  # Adicionado para controlar foco
-            # Nota: presence_penalty e frequency_penalty não são suportados para generate_content neste método
-        )
-
-        response = model.generate_content(
-            prompt,
-            generation_config=generation_config
-        )
-
+        # A chamada (e o modo hedging opcional) fica em gemini_client, compartilhado com os outros scripts.
+        # Nota: presence_penalty e frequency_penalty não são suportados para generate_content neste método
         # Retorna o texto gerado/processado pela IA
-        return response.text
+        return gemini_client.gerar_texto(default_model_name, prompt, max_tokens, temperature, top_p, top_k, text_type=text_type, tom=tone,
+                                         instrucao_sistema=instrucao_sistema)
 
+    except KeyboardInterrupt:
+        # Ctrl+C durante a geração cancela só a chamada (a vaga é liberada) e volta ao menu
+        print("\nGeração cancelada (Ctrl+C). Voltando ao menu.")
+        return None
     except Exception as e:
         # Mensagem de erro mais detalhada
         return f"Ocorreu um erro na interação com o modelo '{default_model_name}': {e}\nVerifique o nome do modelo, sua chave de API e conexão com a internet."
 
+# Correção de um arquivo .txt/.docx, lido em fluxo de parágrafos (não precisa colar o texto)
+def corrigir_arquivo(caminho, tom):
+    """Corrige o arquivo por grupos de parágrafos, mostrando cada trecho assim que fica pronto.
+
+    Retorna o texto revisado com as sugestões, ou None se não foi possível (erro ou Ctrl+C).
+    """
+    corrigidos, sugestoes = [], []
+    cache_paragrafos = {} # Parágrafos repetidos no arquivo são corrigidos uma vez só
+    try:
+        with open(caminho, 'rb') as arquivo:
+            paragrafos = ingestion.ler_paragrafos(arquivo, caminho)
+            print("\n--- Texto Revisado ---")
+            for grupo in incremental_correction.corrigir_documento(default_model_name, paragrafos, tom, cache_paragrafos):
+                for paragrafo in grupo['paragrafos']:
+                    print(paragrafo + "\n")
+                corrigidos.extend(grupo['paragrafos'])
+                sugestoes.extend(grupo['sugestoes'])
+                if grupo['falhou']:
+                    print("(Este trecho não pôde ser corrigido e ficou como no original.)\n")
+    except KeyboardInterrupt:
+        print("\nCorreção cancelada (Ctrl+C). Voltando ao menu.")
+        return None
+    except OSError as e:
+        print(f"Não foi possível abrir o arquivo: {e}")
+        return None
+    except ingestion.DocumentoInvalido as e:
+        print(e)
+        return None
+    except Exception as e:
+        print(f"Ocorreu um erro na interação com o modelo '{default_model_name}': {e}")
+        return None
+    if not corrigidos:
+        print("O arquivo não tem texto para corrigir.")
+        return None
+    if sugestoes:
+        print("Sugestões:")
+        for numero, sugestao in enumerate(sugestoes, start=1):
+            print(f"{numero}. {sugestao}")
+    print("-----------------------------------\n")
+    return edit_correction.formatar_resultado('\n\n'.join(corrigidos), sugestoes)
+
+
 # 3. Lógica principal e Interface (CLI)
 def main():
     # --- MUDANÇA AQUI: Nova mensagem de boas-vindas ---
@@ -117,27 +200,6 @@ def main():
     # --- FIM DA MUDANÇA ---
     # --- REMOVIDO: print(f"Usando o modelo: {default_model_name}") ---
 
-    # Opções de tipo de texto para gerar (atualizadas com texto adicional)
-    tipos_texto_gerar = {
-        '1': 'Artigo/Texto Acadêmico',
-        '2': 'E-mail Profissional',
-        '3': 'Post para Redes Sociais (Ideias e Sugestões)', # <-- ATUALIZADO
-        '4': 'Conteúdo de Marketing Digital (Ideias, sugestões, descrição de Produto)', # <-- ATUALIZADO
-        '5': 'Roteiro Simples (Viagens entre outros)', # <-- ATUALIZADO
-        '6': 'Descrição de Produto'
-    }
-
-    # Opções de tom para gerar e corrigir
-    tons_disponiveis = {
-        '1': 'Formal',
-        '2': 'Amigável',
-        '3': 'Persuasivo',
-        '4': 'Técnico',
-        '5': 'Criativo',
-        '6': 'Neutro'
-    }
-
-
     while True:
         # --- Nova mensagem do menu ---
         print("\nO que gostaria de fazer?")
@@ -193,62 +255,19 @@ def main():
                 continue
 
             # --- Construção do prompt de geração dinâmica ---
-            prompt_geracao = f"""Crie um texto completo e bem estruturado do tipo "{tipo_selecionado}" sobre o tema/assunto: "{tema}"
-            Use um tom "{tom_selecionado}".
-            Não use gírias, palavrões ou termos complexos demais a menos que o tema ou o tom técnico exijam e sejam explicados.
-            Responda em formato Markdown.
-            """
-            # Ajustes de parâmetros padrão para geração
-            temp = 0.7
-            max_tok = 1000 # Limite padrão para geração
-            top_p_val = 0.9
-            top_k_val = 0
-
-            # Adiciona instruções e ajusta parâmetros específicos baseados no tipo de texto
-            if tipo_selecionado == 'Artigo/Texto Acadêmico':
-                 prompt_geracao += "\nInclua introdução, desenvolvimento com argumentos e exemplos relevantes, e conclusão. Mantenha a formalidade e objetividade."
-                 temp = 0.6
-                 max_tok = 1800
-                 top_p_val = 0.95
-                 top_k_val = 50
-            elif tipo_selecionado == 'E-mail Profissional':
-                 prompt_geracao += "\nFormate a resposta como um e-mail profissional pronto para envio, com linhas para Assunto: e Corpo:."
-                 temp = 0.5
-                 max_tok = 800
-                 top_p_val = 0.9
-                 top_k_val = 0
-            elif 'Post para Redes Sociais' in tipo_selecionado: # Verifica se contém a frase
-                 prompt_geracao += "\nSeja conciso (máximo 280 caracteres se for Twitter, ajuste para outras redes), use linguagem engajadora e inclua hashtags relevantes ao tema."
-                 temp = 0.8
-                 max_tok = 400
-                 top_p_val = 0.9
-                 top_k_val = 0
-            elif 'Marketing Digital' in tipo_selecionado: # Verifica se contém a frase
-                 prompt_geracao += "\nFoque nos benefícios, crie urgência ou desejo e inclua uma chamada para ação (call to action) clara relevante ao tema/produto/serviço."
-                 temp = 0.9
-                 max_tok = 1000
-                 top_p_val = 0.9
-                 top_k_val = 0
-            elif 'Roteiro Simples' in tipo_selecionado: # Verifica se contém a frase
-                 prompt_geracao += "\nFormate como um roteiro básico, com indicação de cenas, diálogos e ações."
-                 temp = 0.8
-                 max_tok = 1200
-                 top_p_val = 0.95
-                 top_k_val = 50
-            elif tipo_selecionado == 'Descrição de Produto':
-                 prompt_geracao += "\nDescreva as características e benefícios do produto de forma atraente para um público comprador."
-                 temp = 0.7
-                 max_tok = 600
-                 top_p_val = 0.9
-                 top_k_val = 0
-            # Note: Os parâmetros top_p e top_k definidos inicialmente
-            # são usados como padrão se não forem sobrescritos aqui.
+            # O prompt leva só o que muda a cada pedido; as instruções fixas do tipo vão como instrução de sistema
+            # (modelos e parâmetros por tipo de texto ficam em prompts.py, compartilhado com os apps Streamlit)
+            prompt_geracao, max_tok, temp, top_p_val, top_k_val = prompts.montar_prompt_geracao(tipo_selecionado, tom_selecionado, tema)
+            instrucao_sistema = prompts.instrucao_geracao(tipo_selecionado)
 
 
             print("\nGerando texto...") # Pequeno ajuste aqui para "Gerando texto..."
             # Chama a função genérica de interação com Gemini
             # Passa o prompt construído e os parâmetros de geração (ou defaults)
-            texto_novo = interagir_com_gemini(prompt_geracao, max_tok, temp, top_p_val, top_k_val)
+            texto_novo = interagir_com_gemini(prompt_geracao, max_tok, temp, top_p_val, top_k_val, text_type=tipo_selecionado, tone=tom_selecionado,
+                                              instrucao_sistema=instrucao_sistema)
+            if texto_novo is None: # Cancelada com Ctrl+C
+                continue
 
             print("\n--- Texto Gerado ---")
             print(texto_novo) # Imprime o texto gerado
@@ -260,24 +279,41 @@ def main():
 
 
         elif escolha_operacao == '2': # Corrigir texto
+            # Arquivos grandes não precisam ser colados: são lidos direto do disco, mantendo os parágrafos
+            caminho_arquivo = input("Digite o caminho de um arquivo .txt ou .docx, ou pressione Enter para colar o texto: ").strip().strip('"')
+            if caminho_arquivo:
+                print(f"\nEscolha o tom para a revisão/sugestões: ")
+                print() # Espaço
+                for key, value in tons_disponiveis.items():
+                    print(f"{key}. {value}")
+                print() # Espaço
+                tom_arquivo = tons_disponiveis.get(input("Digite o número do tom: "), 'Formal') # Default para Formal
+
+                print("\nCorrigindo o arquivo...")
+                texto_revisado_arquivo = corrigir_arquivo(caminho_arquivo, tom_arquivo)
+                if texto_revisado_arquivo is not None:
+                    salvar_texto(texto_revisado_arquivo, "texto revisado")
+                continue
+
             print("Por favor, cole o texto que você quer corrigir.")
             # --- Mensagem de instrução de finalização ---
-            print("Para finalizar a entrada, pressione Enter duas vezes.")
+            print("Para finalizar a entrada, deixe duas linhas em branco seguidas (ou use Ctrl+D / Ctrl+Z).")
             # --- FIM DA MUDANÇA ---
             linhas_texto = []
-            # Lógica de leitura de várias linhas. Espera uma linha vazia.
-            # Pressionar Enter duas vezes *cria* a linha vazia.
+            # Lógica de leitura de várias linhas. Uma linha em branco separa parágrafos;
+            # duas seguidas encerram a entrada.
             while True:
                 try:
                     linha = input()
-                    if not linha: # Uma linha vazia quebra o loop
+                    if not linha.strip() and linhas_texto and not linhas_texto[-1].strip():
                         break
-                    # Adiciona a linha lida, removendo espaços em branco do início/fim
-                    linhas_texto.append(linha.strip())
+                    # A linha vai como foi colada (recuo incluído); a normalização fica com prompts.normalizar_texto
+                    linhas_texto.append(linha)
                 except EOFError: # Permite finalizar com Ctrl+D ou Ctrl+Z
                      break
 
-            texto_original = "\n".join(linhas_texto) # Junta as linhas em um único texto
+            # Junta as linhas mantendo parágrafos e recuo (só os espaços repetidos e as sobras nas pontas saem)
+            texto_original = prompts.normalizar_texto("\n".join(linhas_texto))
 
             if not texto_original.strip(): # Verifica se algum texto foi realmente inserido
                 print("Nenhum texto foi inserido para correção.")
@@ -294,28 +330,36 @@ def main():
             tom_selecionado_correcao = tons_disponiveis.get(escolha_tom_correcao, 'Formal') # Default para Formal
 
             # --- Construção do prompt de correção ---
-            prompt_correcao = f"""Por favor, revise e aprimore o seguinte texto.
-            Use um tom {tom_selecionado_correcao} na revisão e nas sugestões.
-            Corrija erros de ortografia, gramática, pontuação e dê sugestões para melhorar a clareza, a coesão e a fluidez. Mantenha o significado original do texto.
-            Não use gírias, palavrões ou termos complexos demais a menos que o texto original já os contenha e seja necessário revisá-los.
-            Forneça o texto revisado e, em uma seção separada marcada como "Sugestões:", liste as sugestões de melhoria em tópicos numerados.
-            Responda em formato Markdown.
-
-            Texto a revisar:
-            {texto_original}
-
-            Texto revisado:
-            """
-            # Parâmetros para correção (geralmente menos criativo)
-            temp = 0.5
-            max_tok = 1500 # Limite um pouco maior para o texto revisado + sugestões
-            top_p_val = 0.9
-            top_k_val = 0
+            # As instruções fixas vão em prompts.instrucao_correcao(); aqui só o que muda a cada pedido
+            prompt_correcao = prompts.montar_prompt_correcao(tom_selecionado_correcao, texto_original)
+            # Parâmetros para correção (geralmente menos criativo, com limite maior para o texto revisado + sugestões)
+            max_tok, temp, top_p_val, top_k_val = prompts.PARAMETROS_CORRECAO
 
 
             print("\nCorrigindo e aprimoramento texto...") # Pequeno ajuste para "aprimoramento"
-            # Chama a função genérica de interação com Gemini
-            texto_revisado_completo = interagir_com_gemini(prompt_correcao, max_tok, temp, top_p_val, top_k_val)
+            correcao_previa = None
+            if precheck.ativo():
+                # Verificação local: sem nada suspeito, nem chama a IA; com poucos trechos, só eles vão
+                try:
+                    correcao_previa = precheck.corrigir(default_model_name, texto_original, tom_selecionado_correcao)
+                except KeyboardInterrupt:
+                    print("\nCorreção cancelada (Ctrl+C). Voltando ao menu.")
+                    continue
+                except Exception as e:
+                    print(f"Ocorreu um erro na interação com o modelo '{default_model_name}': {e}")
+                    continue
+            if correcao_previa is not None:
+                texto_revisado_completo = correcao_previa['resultado']
+                if correcao_previa['local']:
+                    print("Verificação local: nenhum problema que precise da IA; o texto não foi enviado e o tom escolhido não foi aplicado.")
+                else:
+                    print(f"Verificação local: só {correcao_previa['trechos_enviados']} trecho(s) suspeito(s) enviado(s) à IA.")
+            else:
+                # Chama a função genérica de interação com Gemini
+                texto_revisado_completo = interagir_com_gemini(prompt_correcao, max_tok, temp, top_p_val, top_k_val, text_type='corrigir', tone=tom_selecionado_correcao,
+                                                               instrucao_sistema=prompts.instrucao_correcao())
+            if texto_revisado_completo is None: # Cancelada com Ctrl+C
+                continue
 
             print("\n--- Texto Revisado e Sugestões ---")
             print(texto_revisado_completo) # Imprime o resultado completo (revisão + sugestões)
@@ -337,7 +381,245 @@ def main():
             print("Opção inválida. Por favor, tente novamente.")
             # --- FIM DA MUDANÇA ---
 
+# 4. Modo filtro (Unix): `main2.py correct|generate` lê a entrada padrão e escreve só o texto na saída padrão
+# Ex.: python main2.py correct --tone Formal < entrada.txt > revisado.md
+#      python main2.py generate --type E-mail --tone Amigável --theme "Atraso na entrega"
+# O texto do modelo vai para stdout assim que chega (pedaço a pedaço); avisos, erros e o resumo vão
+# para stderr, e o código de saída diz o que aconteceu (SAIDA_*), então dá para encadear em scripts.
+
+def _sem_acentos(texto):
+    return ''.join(c for c in unicodedata.normalize('NFD', texto.casefold()) if unicodedata.category(c) != 'Mn')
+
+
+def _escolher_opcao(opcoes, valor):
+    """Opção pelo número do menu ou pelo começo do nome (sem diferenciar maiúsculas e acentos). None se não for única."""
+    if valor in opcoes:
+        return opcoes[valor]
+    procurado = _sem_acentos(valor.strip())
+    encontradas = [nome for nome in opcoes.values() if procurado and _sem_acentos(nome).startswith(procurado)]
+    return encontradas[0] if len(encontradas) == 1 else None
+
+
+def _argumento_opcao(opcoes, descricao):
+    """Conversor do argparse que aceita o número ou o nome de uma das `opcoes`."""
+    def converter(valor):
+        escolhida = _escolher_opcao(opcoes, valor)
+        if escolhida is None:
+            validas = '; '.join(f"{chave}. {nome}" for chave, nome in opcoes.items())
+            raise argparse.ArgumentTypeError(f"{descricao} inválido: {valor!r}. Opções: {validas}")
+        return escolhida
+    return converter
+
+
+def _argumento_data(valor):
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d')
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Data inválida: {valor!r} (use AAAA-MM-DD).")
+
+
+def _criar_parser():
+    parser = argparse.ArgumentParser(
+        prog='main2.py',
+        description="GerAI no terminal. Sem argumentos, abre o menu interativo; com um comando, funciona como filtro "
+                    "(lê a entrada padrão e escreve o texto na saída padrão).",
+    )
+    parser.add_argument('-q', '--quiet', action='store_true', help="Não mostra o resumo final em stderr (erros continuam aparecendo).")
+    comandos = parser.add_subparsers(dest='comando', required=True, metavar='{correct,generate,export}')
+
+    correct = comandos.add_parser('correct', help="Corrige o texto da entrada padrão (ou de --file).")
+    correct.add_argument('--tone', type=_argumento_opcao(tons_disponiveis, "Tom"), default='Formal',
+                         help="Tom da revisão: número ou nome (padrão: Formal).")
+    correct.add_argument('--file', help="Arquivo .txt ou .docx a corrigir em vez da entrada padrão.")
+    correct.add_argument('--by-paragraph', action='store_true',
+                         help="Corrige por grupos de parágrafos (automático para .docx e --file), escrevendo cada grupo assim que fica pronto.")
+
+    generate = comandos.add_parser('generate', help="Gera um texto sobre o tema de --theme (ou da entrada padrão).")
+    generate.add_argument('--type', required=True, type=_argumento_opcao(tipos_texto_gerar, "Tipo de texto"),
+                          help="Tipo de texto: número ou começo do nome (ex.: 2 ou E-mail).")
+    generate.add_argument('--tone', type=_argumento_opcao(tons_disponiveis, "Tom"), default='Formal',
+                          help="Tom do texto: número ou nome (padrão: Formal).")
+    generate.add_argument('--theme', help="Tema/assunto do texto. Sem ele, o tema é lido da entrada padrão.")
+
+    exportar = comandos.add_parser('export', help="Exporta o histórico (gerai_history.db) para um .zip na saída padrão ou em --out.")
+    exportar.add_argument('--format', choices=export.FORMATOS, default='docx', help="Formato dos arquivos no .zip (padrão: docx).")
+    exportar.add_argument('--since', type=_argumento_data, help="Primeiro dia do recorte (AAAA-MM-DD).")
+    exportar.add_argument('--until', type=_argumento_data, help="Último dia do recorte, inclusive (AAAA-MM-DD).")
+    exportar.add_argument('--operation', choices=('gerar', 'corrigir'), help="Só interações desta operação.")
+    exportar.add_argument('--out', help="Caminho do .zip (sem ele, o .zip vai para a saída padrão).")
+    return parser
+
+
+class _ErroFiltro(Exception):
+    """Falha no modo filtro, com a mensagem para stderr e o código de saída."""
+
+    def __init__(self, mensagem, codigo):
+        super().__init__(mensagem)
+        self.codigo = codigo
+
+
+def _decodificar(dados):
+    """Texto da entrada: UTF-8 (com ou sem BOM) ou, se não for UTF-8 válido, cp1252 (comum no Windows)."""
+    try:
+        return dados.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        return dados.decode('cp1252', errors='replace')
+
+
+def _escrever(texto):
+    sys.stdout.write(texto)
+    sys.stdout.flush() # Quem está do outro lado do pipe recebe cada pedaço na hora
+
+
+def _transmitir(prompt, parametros, text_type, tom, instrucao_sistema):
+    """Manda o stream do modelo para stdout. Retorna quantos caracteres foram escritos."""
+    max_tok, temp, top_p_val, top_k_val = parametros
+    escritos = 0
+    ultimo = ''
+    stream = gemini_client.stream_texto(default_model_name, prompt, max_tok, temp, top_p_val, top_k_val, text_type=text_type, tom=tom,
+                                        instrucao_sistema=instrucao_sistema, usuario='cli')
+    # closing: se a escrita falhar (pipe fechado) ou vier Ctrl+C, o stream é fechado e a vaga de chamada liberada
+    with contextlib.closing(stream):
+        for pedaco in stream:
+            if pedaco:
+                _escrever(pedaco)
+                escritos += len(pedaco)
+                ultimo = pedaco
+    if escritos and not ultimo.endswith('\n'):
+        _escrever('\n')
+    return escritos
+
+
+def _corrigir_por_paragrafos(arquivo, nome, tom):
+    """Corrige um documento grupo a grupo, escrevendo cada grupo em stdout e as sugestões no fim."""
+    sugestoes = []
+    escritos = 0
+    falhas = 0
+    primeiro = True
+    paragrafos = ingestion.ler_paragrafos(arquivo, nome)
+    for grupo in incremental_correction.corrigir_documento(default_model_name, paragrafos, tom, {}, usuario='cli'):
+        for paragrafo in grupo['paragrafos']:
+            _escrever(paragrafo + '\n' if primeiro else '\n' + paragrafo + '\n')
+            escritos += len(paragrafo)
+            primeiro = False
+        sugestoes.extend(grupo['sugestoes'])
+        if grupo['falhou']:
+            falhas += 1
+    if primeiro:
+        raise _ErroFiltro("A entrada não tem texto para corrigir.", SAIDA_ENTRADA)
+    if sugestoes:
+        # Mesmo formato da correção completa; o último parágrafo já terminou com uma quebra de linha
+        _escrever(edit_correction.formatar_resultado('', sugestoes)[1:] + '\n')
+    if falhas:
+        print(f"Aviso: {falhas} trecho(s) não puderam ser corrigidos e ficaram como no original.", file=sys.stderr)
+    return escritos
+
+
+def _ler_entrada():
+    """Bytes da entrada padrão (lida inteira: o pipe não volta atrás para detectar o formato e a codificação)."""
+    if sys.stdin is None or sys.stdin.isatty():
+        print("Lendo o texto da entrada padrão (finalize com Ctrl+D, ou Ctrl+Z e Enter no Windows)...", file=sys.stderr)
+    return sys.stdin.buffer.read()
+
+
+def _comando_correct(args):
+    if args.file:
+        # O arquivo vai aberto para a leitura em fluxo: só um grupo de parágrafos fica na memória,
+        # e o limite de GERAI_DOCUMENTO_MAX_MB vale antes de o texto inteiro ser lido
+        try:
+            arquivo = open(args.file, 'rb')
+        except OSError as e:
+            raise _ErroFiltro(f"Não foi possível abrir o arquivo: {e}", SAIDA_ARQUIVO)
+        with arquivo:
+            try:
+                return _corrigir_por_paragrafos(arquivo, args.file, args.tone)
+            except ingestion.DocumentoInvalido as e:
+                raise _ErroFiltro(str(e), SAIDA_ENTRADA)
+    dados = _ler_entrada()
+    nome = 'entrada.docx' if dados.startswith(b'PK\x03\x04') else 'entrada.txt' # .docx redirecionado pela entrada padrão
+    if args.by_paragraph or nome == 'entrada.docx':
+        try:
+            return _corrigir_por_paragrafos(io.BytesIO(dados), nome, args.tone)
+        except ingestion.DocumentoInvalido as e:
+            raise _ErroFiltro(str(e), SAIDA_ENTRADA)
+    # Normalizado como nas outras telas: a lista de edições do precheck cita trechos do texto como ele vai ao modelo
+    texto_original = prompts.normalizar_texto(_decodificar(dados))
+    if not texto_original.strip():
+        raise _ErroFiltro("A entrada não tem texto para corrigir.", SAIDA_ENTRADA)
+    if precheck.ativo():
+        # Sem nada suspeito (ou só com os trechos suspeitos corrigidos pela IA), o resultado sai inteiro de uma vez
+        correcao_previa = precheck.corrigir(default_model_name, texto_original, args.tone, usuario='cli')
+        if correcao_previa is not None:
+            _escrever(correcao_previa['resultado'].rstrip('\n') + '\n')
+            return len(correcao_previa['resultado'])
+    prompt_correcao = prompts.montar_prompt_correcao(args.tone, texto_original)
+    return _transmitir(prompt_correcao, prompts.PARAMETROS_CORRECAO, 'corrigir', args.tone, prompts.instrucao_correcao())
+
+
+def _comando_generate(args):
+    tema = args.theme if args.theme is not None else _decodificar(_ler_entrada())
+    if not tema.strip():
+        raise _ErroFiltro("Informe o tema com --theme ou pela entrada padrão.", SAIDA_ENTRADA)
+    prompt_geracao, *parametros = prompts.montar_prompt_geracao(args.type, args.tone, tema)
+    return _transmitir(prompt_geracao, parametros, args.type, args.tone, prompts.instrucao_geracao(args.type))
+
+
+def _comando_export(args):
+    filtros = {
+        'desde': args.since.strftime('%Y-%m-%d') if args.since else None,
+        'ate': (args.until + timedelta(days=1)).strftime('%Y-%m-%d') if args.until else None, # --until é inclusivo
+        'operation_type': args.operation,
+    }
+    if args.out:
+        try:
+            return export.exportar(args.out, args.format, **filtros)
+        except OSError as e:
+            raise _ErroFiltro(f"Não foi possível gravar o arquivo: {e}", SAIDA_GRAVACAO)
+    if sys.stdout.isatty():
+        raise _ErroFiltro("Redirecione a saída para um arquivo (> historico.zip) ou use --out.", SAIDA_USO)
+    return export.exportar(sys.stdout.buffer, args.format, **filtros) # O .zip sai em fluxo, sem ficar na memória
+
+
+COMANDOS = {
+    'correct': (_comando_correct, 'caracteres'),
+    'generate': (_comando_generate, 'caracteres'),
+    'export': (_comando_export, 'interação(ões) exportada(s)'),
+}
+
+
+def executar_comando(argv):
+    """Executa um comando do modo filtro e retorna o código de saída (SAIDA_*)."""
+    args = _criar_parser().parse_args(argv) # Argumentos inválidos: o argparse sai com SAIDA_USO
+    if hasattr(sys.stdout, 'reconfigure'):
+        sys.stdout.reconfigure(encoding='utf-8') # No Windows, pipes usariam cp1252 e perderiam caracteres
+    inicio = time.monotonic()
+    try:
+        comando, unidade = COMANDOS[args.comando]
+        escritos = comando(args)
+    except _ErroFiltro as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return e.codigo
+    except (admission.ServidorOcupado, usage.OrcamentoEsgotado, transport.PrazoEsgotado) as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return SAIDA_OCUPADO
+    except BrokenPipeError:
+        # Quem lia a saída fechou o pipe (ex.: `| head`). Aponta stdout para o devnull para a saída do
+        # Python não tentar descarregar o buffer de novo no pipe fechado.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return SAIDA_PIPE_FECHADO
+    except (KeyboardInterrupt, cancellation.ChamadaCancelada):
+        print("\nGeração cancelada (Ctrl+C).", file=sys.stderr)
+        return SAIDA_INTERROMPIDO
+    except Exception as e:
+        print(f"Erro na interação com o modelo '{default_model_name}': {e}", file=sys.stderr)
+        return SAIDA_ERRO_MODELO
+    if not args.quiet:
+        print(f"GerAI: {escritos} {unidade} em {time.monotonic() - inicio:.1f} s.", file=sys.stderr)
+    return SAIDA_OK
+
 # Esta parte garante que a função main() seja chamada apenas quando você
 # executar este arquivo diretamente.
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(executar_comando(sys.argv[1:])) # Modo filtro: main2.py correct|generate ...
     main()
\ No newline at end of file
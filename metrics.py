@@ -0,0 +1,74 @@
+# Métricas simples em memória (por processo) para acompanhar o desempenho do GerAI
+# Contadores somam eventos (ex.: chamadas, duplicatas), observações guardam amostras recentes
+# (ex.: latências) para calcular percentis, e medidores guardam o valor atual de algo (ex.: tamanho de fila).
+
+import threading
+from collections import defaultdict, deque
+
+MAX_AMOSTRAS = 1000 # Quantidade de amostras recentes mantidas por observação
+
+_lock = threading.Lock()
+_contadores = defaultdict(float)
+_observacoes = defaultdict(lambda: deque(maxlen=MAX_AMOSTRAS))
+_medidores = {}
+
+
+def incrementar(nome, valor=1):
+    """Soma `valor` ao contador `nome`."""
+    with _lock:
+        _contadores[nome] += valor
+
+
+def observar(nome, valor):
+    """Registra uma amostra (ex.: latência em segundos) na observação `nome`."""
+    with _lock:
+        _observacoes[nome].append(valor)
+
+
+def definir(nome, valor):
+    """Define o valor atual do medidor `nome`."""
+    with _lock:
+        _medidores[nome] = valor
+
+
+def contador(nome):
+    """Retorna o valor atual de um contador (0 se nunca foi incrementado)."""
+    with _lock:
+        return _contadores.get(nome, 0)
+
+
+def quantidade(nome):
+    """Retorna quantas amostras recentes existem para a observação `nome`."""
+    with _lock:
+        return len(_observacoes.get(nome, ()))
+
+
+def percentil(nome, p):
+    """Calcula o percentil `p` (0-100) das amostras de `nome`. Retorna None se não houver amostras."""
+    with _lock:
+        amostras = sorted(_observacoes.get(nome, ()))
+    if not amostras:
+        return None
+    # Método do "vizinho mais próximo" - suficiente para painéis e limiares
+    indice = min(len(amostras) - 1, max(0, int(round(p / 100 * len(amostras))) - 1))
+    return amostras[indice]
+
+
+def resumo():
+    """Retorna um dicionário com todos os contadores, medidores e p50/p95/p99 das observações."""
+    with _lock:
+        nomes_observacoes = list(_observacoes.keys())
+        dados = {
+            'contadores': dict(_contadores),
+            'medidores': dict(_medidores),
+        }
+    dados['observacoes'] = {
+        nome: {
+            'amostras': quantidade(nome),
+            'p50': percentil(nome, 50),
+            'p95': percentil(nome, 95),
+            'p99': percentil(nome, 99),
+        }
+        for nome in nomes_observacoes
+    }
+    return dados
@@ -0,0 +1,212 @@
+# Limites de tamanho da saída por tipo de texto, aplicados durante o streaming
+# O post para redes sociais pede "máximo 280 caracteres", mas reserva 400 tokens, e outros tipos
+# curtos costumam se estender além do necessário (observações do modelo depois do e-mail ou do
+# post). Cada token a mais é pago e esperado. Aqui cada tipo curto tem limites de caracteres, de
+# parágrafos e marcas de parada (ex.: o e-mail termina na assinatura depois do "Atenciosamente").
+# Quando um limite é atingido, o stream é fechado (a chamada é cancelada e o modelo para de gerar)
+# e o texto termina no último fim de frase ou parágrafo antes do limite. As interrupções ficam nas
+# métricas, junto com a duração e o tamanho das respostas de cada tipo, para comparar com e sem limites.
+
+import re
+
+import config
+import metrics
+
+# Observações do modelo depois do texto pedido (ex.: "**Observação:** personalize o nome...")
+_NOTAS_FINAIS = ('\n**Observaç', '\nObservaç', '\n*Observaç', '\n**Nota:', '\nNota:')
+
+# Limites de cada tipo de texto. A chave é o começo do nome do tipo, como em prompts.TIPOS_TEXTO.
+# max_caracteres/max_paragrafos: None = sem limite; paradas: o texto termina antes da marca;
+# assinatura: depois da linha de encerramento, quantas linhas (nome, cargo, contato) ainda entram.
+LIMITES = {
+    'E-mail Profissional': {
+        'max_caracteres': 3000,
+        'max_paragrafos': 15,
+        'paradas': _NOTAS_FINAIS,
+        'assinatura': 3,
+    },
+    'Post para Redes Sociais': {
+        'max_caracteres': 800,
+        'max_paragrafos': 6,
+        'paradas': _NOTAS_FINAIS,
+        'assinatura': None,
+    },
+    'Descrição de Produto': {
+        'max_caracteres': 2000,
+        'max_paragrafos': 8,
+        'paradas': _NOTAS_FINAIS,
+        'assinatura': None,
+    },
+}
+
+# Linha de encerramento do e-mail (pode vir em negrito ou itálico)
+_ENCERRAMENTO = re.compile(r'^[ \t*_>]*(atenciosamente|cordialmente|respeitosamente|saudações|abraços|um abraço|att\.)[^\n]*\n',
+                           re.IGNORECASE | re.MULTILINE)
+_INICIO_PARAGRAFO = re.compile(r'\n[ \t]*\n\s*(?=\S)') # Linha em branco seguida do começo de outro parágrafo
+_FIM_DE_FRASE = re.compile(r'[.!?…](?=\s)|\n')
+_RESERVA_FRASE = 300 # Perto do limite de caracteres, o texto só sai até o último fim de frase
+
+
+def ativo():
+    """Os limites de saída valem a menos que desligados (GERAI_LIMITES_SAIDA=0)."""
+    return config.ler_bool('GERAI_LIMITES_SAIDA', True)
+
+
+def _limites_do_tipo(tipo):
+    for prefixo, limites in LIMITES.items():
+        if tipo and tipo.startswith(prefixo):
+            return prefixo, limites
+    return None, None
+
+
+def para_tipo(tipo):
+    """Limite de saída do tipo de texto, ou None se o tipo não tiver limites (ou se estiverem desligados)."""
+    prefixo, limites = _limites_do_tipo(tipo)
+    if limites is None or not ativo():
+        return None
+    return LimiteSaida(prefixo, **limites)
+
+
+# --- Aplicação durante o streaming ---
+
+def _fim_de_frase(texto, ate, minimo, espacos=True):
+    """Último ponto de corte limpo em texto[minimo:ate]: fim de frase ou de linha; sem eles, um espaço (se `espacos`) ou `minimo`."""
+    fim = None
+    for ocorrencia in _FIM_DE_FRASE.finditer(texto[:ate + 1], minimo, ate + 1):
+        if ocorrencia.end() <= ate:
+            fim = ocorrencia.start() if ocorrencia.group() == '\n' else ocorrencia.end()
+    if fim is None and not espacos:
+        return minimo
+    if fim is None:
+        espaco = max(texto.rfind(' ', minimo, ate), texto.rfind('\n', minimo, ate))
+        fim = espaco if espaco > minimo else minimo
+    return fim
+
+
+class LimiteSaida:
+    """Aplica os limites de um tipo de texto aos pedaços de um stream.
+
+    filtrar() recebe cada pedaço e devolve a parte que pode ser mostrada; parte do fim pode ficar
+    retida até o próximo pedaço (espaços finais, o começo de uma marca de parada, a frase em
+    andamento perto do limite). Depois de `motivo` ser definido, o stream deve ser fechado;
+    se o stream terminar antes, finalizar() devolve o que ficou retido.
+    """
+
+    def __init__(self, tipo, max_caracteres=None, max_paragrafos=None, paradas=(), assinatura=None):
+        self.tipo = tipo
+        self.max_caracteres = max_caracteres
+        self.max_paragrafos = max_paragrafos
+        self.paradas = paradas
+        self.assinatura = assinatura
+        self.motivo = None # 'caracteres', 'paragrafos', 'parada' ou 'assinatura' quando o limite foi atingido
+        self._texto = ''
+        self._emitido = 0 # Caracteres de _texto já devolvidos
+
+    def _corte(self):
+        """Primeira posição em que o texto deve terminar e o motivo, ou (None, None)."""
+        texto = self._texto
+        cortes = []
+        for marca in self.paradas:
+            posicao = texto.find(marca)
+            if posicao >= 0:
+                cortes.append((posicao, 'parada'))
+        if self.max_paragrafos:
+            for numero, inicio in enumerate(_INICIO_PARAGRAFO.finditer(texto), start=2):
+                if numero > self.max_paragrafos:
+                    cortes.append((inicio.start(), 'paragrafos'))
+                    break
+        if self.assinatura is not None:
+            encerramento = _ENCERRAMENTO.search(texto)
+            if encerramento:
+                corte = self._fim_da_assinatura(encerramento.end())
+                if corte is not None:
+                    cortes.append((corte, 'assinatura'))
+        if self.max_caracteres and len(texto) > self.max_caracteres:
+            # Se a reserva já segurava o texto, o que saiu termina num fim de frase: sem outro até o limite, o corte é ali
+            espacos = self._emitido < self.max_caracteres - _RESERVA_FRASE
+            cortes.append((_fim_de_frase(texto, self.max_caracteres, self._emitido, espacos), 'caracteres'))
+        if not cortes:
+            return None, None
+        posicao, motivo = min(cortes)
+        return max(posicao, self._emitido), motivo
+
+    def _fim_da_assinatura(self, inicio):
+        """Fim do bloco de assinatura (linhas seguidas depois do encerramento), se já começou outra coisa depois dele."""
+        linhas = 0
+        posicao = fim = inicio
+        separou = False # Houve linha em branco depois de alguma linha da assinatura
+        for linha in self._texto[inicio:].split('\n'):
+            if linha.strip():
+                if linhas == self.assinatura or (linhas and separou):
+                    return fim # Termina no fim da última linha da assinatura
+                linhas += 1
+                fim = posicao + len(linha)
+            elif linhas:
+                separou = True
+            posicao += len(linha) + 1
+        return None
+
+    def _seguro(self):
+        """Até onde o texto pode sair sem risco de ter que ser cortado antes depois."""
+        texto = self._texto
+        seguro = len(texto.rstrip())
+        for marca in self.paradas:
+            for tamanho in range(min(len(marca) - 1, len(texto)), 0, -1):
+                if texto.endswith(marca[:tamanho]):
+                    seguro = min(seguro, len(texto) - tamanho)
+                    break
+        if self.max_caracteres and len(texto) > self.max_caracteres - _RESERVA_FRASE:
+            seguro = min(seguro, _fim_de_frase(texto, len(texto), self._emitido, espacos=False))
+        return max(seguro, self._emitido)
+
+    def filtrar(self, pedaco):
+        """Recebe um pedaço do stream e devolve o texto que pode ser mostrado agora ('' se nada)."""
+        if self.motivo is not None:
+            return ''
+        self._texto += pedaco
+        corte, motivo = self._corte()
+        if corte is not None:
+            self.motivo = motivo
+            fim = corte
+        else:
+            fim = self._seguro()
+        saida = self._texto[self._emitido:fim]
+        self._emitido = fim
+        return saida
+
+    def finalizar(self):
+        """O stream terminou sem atingir o limite: devolve o texto retido."""
+        if self.motivo is not None:
+            return ''
+        saida = self._texto[self._emitido:]
+        self._emitido = len(self._texto)
+        return saida
+
+    def registrar(self, duracao, caracteres):
+        """Registra a resposta (duração e tamanho por tipo) e, se houve, a interrupção pelo limite."""
+        metrics.incrementar(f'saida.respostas.{self.tipo}')
+        metrics.incrementar(f'saida.caracteres.{self.tipo}', caracteres)
+        metrics.observar(f'saida.duracao.{self.tipo}', duracao)
+        if self.motivo is not None:
+            metrics.incrementar(f'saida.interrompidas.{self.tipo}')
+            metrics.incrementar(f'saida.interrompidas_por.{self.motivo}')
+
+
+def relatorio():
+    """Por tipo com limites: respostas, interrupções, tamanho médio e duração (p50/p95) das respostas."""
+    relatorio = {}
+    for tipo in LIMITES:
+        respostas = metrics.contador(f'saida.respostas.{tipo}')
+        if not respostas:
+            continue
+        relatorio[tipo] = {
+            'respostas': int(respostas),
+            'interrompidas': int(metrics.contador(f'saida.interrompidas.{tipo}')),
+            'caracteres_medio': round(metrics.contador(f'saida.caracteres.{tipo}') / respostas),
+            'duracao_p50': metrics.percentil(f'saida.duracao.{tipo}', 50),
+            'duracao_p95': metrics.percentil(f'saida.duracao.{tipo}', 95),
+        }
+    if relatorio:
+        relatorio['interrompidas_por'] = {motivo: int(metrics.contador(f'saida.interrompidas_por.{motivo}'))
+                                          for motivo in ('caracteres', 'paragrafos', 'parada', 'assinatura')}
+    return relatorio
@@ -0,0 +1,99 @@
+# Geração em lote com "empacotamento" de temas
+# Para textos curtos (posts, descrições de produto) o custo fixo de cada chamada e o limite de
+# requisições dominam. Aqui vários temas vão num único prompt, pedimos a resposta como um array
+# JSON e separamos de volta um texto por tema. Itens que não vierem válidos são refeitos sozinhos.
+
+import admission
+import cancellation
+import config
+import gemini_client
+import metrics
+import prompts
+
+# Limite de tokens de saída por chamada do modelo (gemini-1.5-flash)
+LIMITE_TOKENS_SAIDA = 8192
+# Folga para a estrutura JSON ("id", "texto", aspas escapadas...) em volta de cada texto
+FOLGA_JSON = 1.15
+
+
+def itens_por_pacote(max_tokens_item):
+    """Quantos temas cabem num pacote sem estourar o limite de saída do modelo."""
+    maximo = config.ler_int('GERAI_LOTE_ITENS_POR_PACOTE', 20)
+    cabem = int(LIMITE_TOKENS_SAIDA / (max_tokens_item * FOLGA_JSON))
+    return max(1, min(maximo, cabem))
+
+
+def montar_prompt_pacote(tipo, tom, instrucao, temas):
+    """Monta um prompt pedindo um texto para cada tema, com resposta em array JSON."""
+    lista_temas = "\n".join(f"{numero}. {tema}" for numero, tema in enumerate(temas, start=1))
+    return prompts.montar('lote', quantidade=len(temas), tipo=tipo, tom=tom, instrucao=instrucao, temas=lista_temas)
+
+
+def separar_resposta(texto, quantidade):
+    """Valida a resposta JSON de um pacote e retorna {número do tema: texto} só com os itens válidos."""
+    try:
+        dados = gemini_client.ler_json_resposta(texto)
+    except ValueError:
+        return {}
+    if isinstance(dados, dict): # Alguns modelos embrulham a lista num objeto
+        dados = dados.get('itens') or dados.get('items') or []
+    if not isinstance(dados, list):
+        return {}
+
+    itens = {}
+    for posicao, item in enumerate(dados, start=1):
+        if not isinstance(item, dict):
+            continue
+        try:
+            numero = int(item.get('id', posicao))
+        except (TypeError, ValueError):
+            continue
+        texto_item = item.get('texto')
+        if 1 <= numero <= quantidade and numero not in itens and isinstance(texto_item, str) and texto_item.strip():
+            itens[numero] = texto_item.strip()
+    return itens
+
+
+def gerar_em_lote(model_name, temas, tipo, tom, instrucao, max_tokens_item, temperature, top_p, top_k, gerar_individual, usuario=None,
+                  cancelamento=None):
+    """Gera um texto por tema, empacotando vários temas por chamada. Devolve (tema, texto, erro) na ordem dos temas.
+
+    `gerar_individual(tema)` refaz sozinho cada item que faltou ou veio inválido no pacote.
+    Com `cancelamento`, o lote para na chamada cancelada (cancellation.ChamadaCancelada).
+    """
+    tamanho = itens_por_pacote(max_tokens_item)
+    for inicio in range(0, len(temas), tamanho):
+        pacote = temas[inicio:inicio + tamanho]
+        prompt = montar_prompt_pacote(tipo, tom, instrucao, pacote)
+        max_tokens_pacote = min(LIMITE_TOKENS_SAIDA, int(max_tokens_item * len(pacote) * FOLGA_JSON))
+        metrics.incrementar('lote.pacotes')
+
+        try:
+            resposta = gemini_client.gerar_texto(
+                model_name, prompt, max_tokens_pacote, temperature, top_p, top_k,
+                text_type=f'lote:{tipo}', # Latência de pacote não deve influenciar limiares de chamadas simples
+                response_mime_type='application/json',
+                prioridade=admission.LOTE, usuario=usuario, tom=tom, # Lote não passa na frente de quem está usando a tela
+                cancelamento=cancelamento
+            )
+            itens = separar_resposta(resposta, len(pacote))
+        except cancellation.ChamadaCancelada:
+            raise
+        except Exception:
+            # O pacote inteiro falhou: cada item será refeito individualmente abaixo
+            metrics.incrementar('lote.pacotes_falhos')
+            itens = {}
+
+        for numero, tema in enumerate(pacote, start=1):
+            if numero in itens:
+                metrics.incrementar('lote.itens_empacotados')
+                yield tema, itens[numero], None
+                continue
+
+            metrics.incrementar('lote.itens_individuais')
+            try:
+                yield tema, gerar_individual(tema), None
+            except cancellation.ChamadaCancelada:
+                raise
+            except Exception as e:
+                yield tema, None, e
@@ -0,0 +1,345 @@
+# Pré-verificação local (offline) da correção
+# Todo clique em "Corrigir Texto" ia para o modelo, mesmo com um texto de duas linhas já correto ou
+# com erros só de espaçamento. Com GERAI_PRECHECK=1, o texto colado passa antes por uma verificação
+# local, sem chamar a API:
+# - regras corrigem sozinhas os problemas triviais: espaço antes da pontuação, falta de espaço
+#   depois de vírgula, ponto e vírgula e dois-pontos, vírgulas repetidas, palavras funcionais
+#   repetidas ("de de") e maiúscula no início das frases (só depois de ponto final);
+# - cada palavra é conferida numa lista de palavras do português (palavras_pt.txt, offline);
+# - as palavras da lista não pegam acento e concordância ("eu esta", "nos vai"): pronome seguido
+#   de verbo comum é conferido numa tabela pequena;
+# - fronteira de frase nunca é decidida só aqui: frase que ganhou maiúscula, ponto colado na
+#   palavra seguinte ("ovos.ele") e minúscula depois de ? ou ! ("Você vem? perguntou ele.") vão
+#   para o modelo junto com as suspeitas;
+# - sem nada suspeito, o resultado volta na hora, sem chamada ao modelo (e sem aplicar o tom);
+# - com poucas frases suspeitas, só essas frases e as vizinhas vão para o modelo, no formato de
+#   lista de edições, aplicadas depois no texto inteiro;
+# - com muitas frases suspeitas, a correção segue o caminho normal.
+# As chamadas e os tokens evitados (estimados) ficam nas métricas.
+
+import functools
+import re
+from pathlib import Path
+
+import config
+import edit_correction
+import gemini_client
+import metrics
+import prompts
+
+ARQUIVO_PALAVRAS = Path(__file__).with_name('palavras_pt.txt')
+MAX_FRACAO_PADRAO = 0.5 # Acima desta fração do texto em trechos suspeitos, vai o texto inteiro
+FRASES_DE_CONTEXTO = 1 # Frases vizinhas enviadas junto com cada frase suspeita
+SEPARADOR_TRECHOS = '\n\n[...]\n\n'
+
+# Palavras que, repetidas em sequência, são sempre erro de digitação ("de de", "que que")
+REPETICOES_TRIVIAIS = {
+    'a', 'o', 'as', 'os', 'um', 'uma', 'uns', 'umas', 'de', 'da', 'do', 'das', 'dos', 'em', 'na', 'no', 'nas', 'nos',
+    'para', 'por', 'pela', 'pelo', 'pelas', 'pelos', 'com', 'sem', 'e', 'ou', 'mas', 'que', 'se', 'ao', 'aos', 'à', 'às',
+}
+# Abreviações seguidas de ponto que não terminam a frase
+ABREVIATURAS = {
+    'sr', 'sra', 'srta', 'dr', 'dra', 'prof', 'profa', 'etc', 'ex', 'p', 'pág', 'págs', 'av', 'obs', 'aprox', 'vs',
+    'n', 'nº', 'art', 'cap', 'fig', 'tel', 'min', 'máx', 'séc', 'vol', 'ed', 'cia', 'ltda',
+}
+# Pessoa dos pronomes sujeito e das formas de presente dos verbos mais comuns, para a concordância
+PRONOMES_SUJEITO = {
+    'eu': '1s', 'tu': '2s', 'ele': '3s', 'ela': '3s', 'você': '3s',
+    'nós': '1p', 'nos': '1p', 'eles': '3p', 'elas': '3p', 'vocês': '3p',
+}
+FORMAS_VERBAIS = {
+    'sou': '1s', 'és': '2s', 'é': '3s', 'somos': '1p', 'são': '3p',
+    'estou': '1s', 'estás': '2s', 'está': '3s', 'esta': '3s', 'estamos': '1p', 'estão': '3p',
+    'tenho': '1s', 'tens': '2s', 'tem': '3s', 'temos': '1p', 'têm': '3p',
+    'vou': '1s', 'vais': '2s', 'vai': '3s', 'vamos': '1p', 'vão': '3p',
+    'posso': '1s', 'podes': '2s', 'pode': '3s', 'podemos': '1p', 'podem': '3p',
+    'faço': '1s', 'fazes': '2s', 'faz': '3s', 'fazemos': '1p', 'fazem': '3p',
+    'venho': '1s', 'vens': '2s', 'vem': '3s', 'vimos': '1p', 'vêm': '3p',
+}
+# Formas que existem sem acento (e passam pela lista de palavras), mas depois de um pronome sujeito são verbo
+SEM_ACENTO = {'esta': 'está', 'nos': 'nós'}
+# Pronomes átonos depois do hífen (ênclise: "fazê-lo", "entregou-se")
+PRONOMES_ATONOS = {'me', 'te', 'se', 'nos', 'vos', 'lhe', 'lhes', 'o', 'a', 'os', 'as', 'lo', 'la', 'los', 'las', 'no', 'na', 'nas'}
+
+_LETRA = r'[^\W\d_]'
+_PALAVRA = re.compile(rf"{_LETRA}+(?:-{_LETRA}+)*")
+_ENDERECO = re.compile(r'\S+@\S+|\b(?:https?://|www\.)\S+', re.IGNORECASE) # E-mails e links ficam de fora das regras
+_FRASE = re.compile(r'\S.*?(?:[.!?…]+(?=\s|$)|(?=\n)|$)')
+_REPETIDA = re.compile(rf'\b({_LETRA}+)([ \t]+)(\1)\b', re.IGNORECASE)
+_PONTO_COLADO = re.compile(rf'{_LETRA}{{2}}[.!?]{_LETRA}') # "ovos.ele", "Oi!tudo": fim de frase ou abreviação? O modelo decide
+
+_REGRAS = (
+    # (padrão, substituição, motivo)
+    (re.compile(rf'({_LETRA}+)[ \t]+([,.;:!?])(?!\d)'), r'\1\2', "Espaço antes da pontuação"),
+    (re.compile(rf'({_LETRA}+)([,;:])(?={_LETRA})'), r'\1\2 ', "Falta de espaço depois da pontuação"),
+    (re.compile(r',{2,}'), ',', "Vírgula repetida"),
+)
+
+
+def ativo():
+    """A pré-verificação só é usada quando ativada na configuração."""
+    return config.ler_bool('GERAI_PRECHECK', False)
+
+
+@functools.lru_cache(maxsize=1)
+def palavras():
+    """Conjunto de palavras conhecidas (minúsculas), lido uma vez por processo."""
+    with open(ARQUIVO_PALAVRAS, encoding='utf-8') as arquivo:
+        return frozenset(linha.strip() for linha in arquivo if linha.strip())
+
+
+# --- Correções triviais ---
+
+def _aplicar_regra(texto, padrao, substituicao, motivo, correcoes):
+    def substituir(ocorrencia):
+        novo = ocorrencia.expand(substituicao)
+        correcoes.append({'trecho': ocorrencia.group(0), 'substituicao': novo, 'motivo': motivo})
+        return novo
+    return padrao.sub(substituir, texto)
+
+
+def _corrigir_repeticoes(texto, correcoes):
+    def substituir(ocorrencia):
+        if ocorrencia.group(1).lower() not in REPETICOES_TRIVIAIS or ocorrencia.group(1) != ocorrencia.group(3):
+            return ocorrencia.group(0) # Repetição que pode ser intencional ("muito muito"): fica para o modelo
+        correcoes.append({'trecho': ocorrencia.group(0), 'substituicao': ocorrencia.group(1), 'motivo': "Palavra repetida"})
+        return ocorrencia.group(1)
+    return _REPETIDA.sub(substituir, texto)
+
+
+def _corrigir_maiusculas(texto, correcoes, fronteiras):
+    """Maiúscula no começo do texto e de cada frase (depois de ponto final, exceto reticências e abreviações).
+
+    Depois de ? e ! a minúscula pode ser de diálogo ("Você vem? perguntou ele.") e fica como está.
+    As posições corrigidas no meio do texto vão para `fronteiras`.
+    """
+    partes = []
+    cursor = 0
+    for ocorrencia in re.finditer(r'(?:^|(?<=\.)\s+)([a-zà-ÿ])', texto):
+        posicao = ocorrencia.start(1)
+        if _ENDERECO.match(texto, posicao):
+            continue # Link ou e-mail no começo da frase
+        if posicao:
+            anterior = re.search(rf'(\S*?)({_LETRA}*)([.!?]+)\s*$', texto[max(0, posicao - 20):posicao])
+            if anterior and (anterior.group(3) != anterior.group(3)[0] or anterior.group(2).lower() in ABREVIATURAS):
+                continue
+            fronteiras.append(posicao)
+        partes.append(texto[cursor:posicao])
+        partes.append(texto[posicao].upper())
+        cursor = posicao + 1
+        inicio_palavra = _PALAVRA.match(texto, posicao)
+        palavra = inicio_palavra.group(0) if inicio_palavra else texto[posicao]
+        correcoes.append({'trecho': palavra, 'substituicao': palavra[0].upper() + palavra[1:], 'motivo': "Maiúscula no início da frase"})
+    partes.append(texto[cursor:])
+    return ''.join(partes)
+
+
+def corrigir_triviais(texto, fronteiras=None):
+    """Aplica as regras locais. Retorna (texto corrigido, lista de correções no formato das edições).
+
+    Em `fronteiras` (lista) ficam as posições, no texto corrigido, das maiúsculas postas no meio do texto.
+    """
+    correcoes = []
+    fronteiras = [] if fronteiras is None else fronteiras
+    partes = []
+    cursor = 0
+    # Links e e-mails não passam pelas regras de pontuação
+    for endereco in _ENDERECO.finditer(texto):
+        partes.append(_corrigir_trecho(texto[cursor:endereco.start()], correcoes))
+        partes.append(endereco.group(0))
+        cursor = endereco.end()
+    partes.append(_corrigir_trecho(texto[cursor:], correcoes))
+    return _corrigir_maiusculas(''.join(partes), correcoes, fronteiras), correcoes
+
+
+def _corrigir_trecho(texto, correcoes):
+    for padrao, substituicao, motivo in _REGRAS:
+        texto = _aplicar_regra(texto, padrao, substituicao, motivo, correcoes)
+    return _corrigir_repeticoes(texto, correcoes)
+
+
+# --- Frases suspeitas ---
+
+def _conhecida(palavra):
+    palavra = palavra.lower()
+    if palavra in palavras():
+        return True
+    if '-' not in palavra:
+        return False
+    verbo, *resto = palavra.split('-')
+    if all(parte in PRONOMES_ATONOS for parte in resto):
+        # "fazê-lo" -> fazer, "amá-la" -> amar, "parti-lo" -> partir
+        infinitivo = verbo[:-1] + {'á': 'ar', 'â': 'ar', 'ê': 'er', 'é': 'er', 'í': 'ir', 'ô': 'or'}.get(verbo[-1], verbo[-1] + 'r')
+        return verbo in palavras() or infinitivo in palavras()
+    return all(parte in palavras() for parte in palavra.split('-'))
+
+
+def _concordancia(anterior, palavra):
+    """Motivo de "pronome sujeito + verbo" precisar do modelo (acento ou concordância), ou None."""
+    pessoa = PRONOMES_SUJEITO.get(anterior.lower())
+    if pessoa is None or palavra.lower() not in FORMAS_VERBAIS:
+        return None
+    if anterior.lower() in SEM_ACENTO or palavra.lower() in SEM_ACENTO:
+        return f"acento: {anterior} {palavra}" # "nos vai": nós? "ele esta": está?
+    if FORMAS_VERBAIS[palavra.lower()] != pessoa:
+        return f"concordância: {anterior} {palavra}"
+    return None
+
+
+def _suspeita(frase):
+    """Motivo de a frase precisar do modelo (palavra desconhecida, repetida ou sem concordância, ponto colado), ou None."""
+    sem_enderecos = _ENDERECO.sub(' ', frase)
+    if _PONTO_COLADO.search(sem_enderecos):
+        return "falta de espaço entre frases"
+    anterior = ''
+    for numero, ocorrencia in enumerate(_PALAVRA.finditer(sem_enderecos)):
+        palavra = ocorrencia.group(0)
+        motivo = _concordancia(anterior, palavra)
+        if motivo:
+            return motivo
+        anterior = palavra
+        if len(palavra) == 1:
+            continue # Letra solta ou ordinal (1º, 2ª)
+        if palavra.isupper():
+            continue # Sigla
+        if numero and palavra[0].isupper():
+            continue # Nome próprio no meio da frase
+        if not _conhecida(palavra):
+            return f"palavra desconhecida: {palavra}"
+    if _REPETIDA.search(sem_enderecos):
+        return "palavra repetida"
+    return None
+
+
+def frases(texto):
+    """Posições (início, fim) das frases do texto."""
+    return [(ocorrencia.start(), ocorrencia.end()) for ocorrencia in _FRASE.finditer(texto)]
+
+
+def _fronteira_ambigua(texto, posicoes, i):
+    """A frase começa com minúscula logo depois de ? ou !: diálogo ("perguntou ele") ou maiúscula esquecida?"""
+    if not i or not texto[posicoes[i][0]].islower():
+        return False
+    inicio, fim = posicoes[i - 1]
+    return texto[inicio:fim].rstrip()[-1:] in ('?', '!')
+
+
+def trechos_suspeitos(texto, contexto=FRASES_DE_CONTEXTO, fronteiras=()):
+    """Trechos (início, fim) com as frases suspeitas e `contexto` frases vizinhas, já unidos quando se tocam.
+
+    Também são suspeitas as frases com fronteira ambígua e as que contêm uma das posições de `fronteiras`
+    (maiúsculas postas pelas regras locais).
+    """
+    posicoes = frases(texto)
+    suspeitas = [
+        i for i, (inicio, fim) in enumerate(posicoes)
+        if _suspeita(texto[inicio:fim]) or _fronteira_ambigua(texto, posicoes, i)
+        or any(inicio <= posicao < fim for posicao in fronteiras)
+    ]
+    trechos = []
+    for i in suspeitas:
+        inicio = posicoes[max(0, i - contexto)][0]
+        fim = posicoes[min(len(posicoes) - 1, i + contexto)][1]
+        if trechos and inicio <= trechos[-1][1] + 1:
+            trechos[-1] = (trechos[-1][0], fim)
+        else:
+            trechos.append((inicio, fim))
+    return trechos
+
+
+def _aplicar_nos_trechos(texto, trechos, edicoes):
+    """Aplica as edições em ordem, cada uma dentro de um dos trechos enviados. None se alguma não se encaixar."""
+    partes = []
+    cursor = 0
+    atual = 0
+    for edicao in edicoes:
+        while atual < len(trechos):
+            inicio, fim = trechos[atual]
+            posicao = texto.find(edicao['trecho'], max(cursor, inicio), fim)
+            if posicao >= 0:
+                break
+            atual += 1
+        else:
+            return None
+        partes.append(texto[cursor:posicao])
+        partes.append(edicao['substituicao'])
+        cursor = posicao + len(edicao['trecho'])
+    partes.append(texto[cursor:])
+    return ''.join(partes)
+
+
+# --- Correção com a pré-verificação ---
+
+def _custo_correcao_completa(texto):
+    """Tokens estimados da correção completa: instruções + texto na entrada e o texto revisado na saída."""
+    return (prompts.estimar_tokens(prompts.MODELOS['correcao:sistema']) + prompts.estimar_tokens(prompts.MODELOS['correcao'])
+            + 2 * prompts.estimar_tokens(texto))
+
+
+def corrigir(model_name, texto, tom, usuario=None, cancelamento=None):
+    """Tenta corrigir o texto sem o modelo, ou mandando só os trechos suspeitos.
+
+    Retorna None quando o texto deve seguir o caminho normal (muitos trechos suspeitos ou edições que
+    não se encaixaram). Senão, um dicionário no formato de edit_correction.corrigir_com_edicoes()
+    ('modo' = 'edicoes'), com 'local' (True se o modelo nem foi chamado; aí o `tom` não é aplicado) e
+    'trechos_enviados'.
+    """
+    metrics.incrementar('precheck.verificacoes')
+    fronteiras = []
+    corrigido, correcoes = corrigir_triviais(texto, fronteiras)
+    trechos = trechos_suspeitos(corrigido, fronteiras=fronteiras)
+    custo_completo = _custo_correcao_completa(texto)
+    edicoes, sugestoes = [], []
+
+    if trechos:
+        enviados = sum(fim - inicio for inicio, fim in trechos)
+        if enviados > config.ler_float('GERAI_PRECHECK_MAX_FRACAO', MAX_FRACAO_PADRAO) * len(corrigido):
+            metrics.incrementar('precheck.texto_inteiro')
+            return None
+        trecho_texto = SEPARADOR_TRECHOS.join(corrigido[inicio:fim] for inicio, fim in trechos)
+        prompt = edit_correction.montar_prompt_edicoes(trecho_texto, tom)
+        try:
+            resposta = gemini_client.gerar_texto(
+                model_name, prompt, prompts.PARAMETROS_CORRECAO[0], 0.3, 0.9, 0, # Temperatura baixa: os trechos precisam ser citados exatamente
+                text_type='corrigir:trechos', response_mime_type='application/json', usuario=usuario, tom=tom,
+                cancelamento=cancelamento
+            )
+            edicoes, sugestoes = edit_correction.ler_edicoes(resposta)
+        except ValueError:
+            edicoes = None
+        revisado = _aplicar_nos_trechos(corrigido, trechos, edicoes) if edicoes is not None else None
+        if revisado is None:
+            metrics.incrementar('precheck.trechos_fallback')
+            return None
+        metrics.incrementar('precheck.chamadas_reduzidas')
+        metrics.incrementar('precheck.tokens_evitados', max(0, custo_completo - prompts.estimar_tokens(prompt) - prompts.estimar_tokens(resposta)))
+    else:
+        revisado = corrigido
+        metrics.incrementar('precheck.chamadas_evitadas')
+        metrics.incrementar('precheck.tokens_evitados', custo_completo)
+    metrics.incrementar('precheck.correcoes_locais', len(correcoes))
+
+    return {
+        'modo': 'edicoes',
+        'resultado': edit_correction.formatar_resultado(revisado, sugestoes),
+        'diff': edit_correction.diff_em_linha(texto, revisado),
+        'edicoes': correcoes + edicoes,
+        'sugestoes': sugestoes,
+        'local': not trechos,
+        'trechos_enviados': len(trechos),
+    }
+
+
+def relatorio():
+    """Chamadas e tokens (estimados) evitados pela pré-verificação local (neste processo)."""
+    verificacoes = metrics.contador('precheck.verificacoes')
+    evitadas = metrics.contador('precheck.chamadas_evitadas')
+    return {
+        'verificacoes': int(verificacoes),
+        'chamadas_evitadas': int(evitadas),
+        'chamadas_so_com_trechos': int(metrics.contador('precheck.chamadas_reduzidas')),
+        'texto_inteiro_para_o_modelo': int(metrics.contador('precheck.texto_inteiro') + metrics.contador('precheck.trechos_fallback')),
+        'tokens_evitados_estimados': int(metrics.contador('precheck.tokens_evitados')),
+        'correcoes_locais': int(metrics.contador('precheck.correcoes_locais')),
+        'taxa_evitadas': round(evitadas / verificacoes, 3) if verificacoes else None,
+    }
@@ -0,0 +1,208 @@
+# Geração especulativa (prefetch) enquanto o usuário ainda decide
+# O tipo, o tom e o tema costumam estar definidos alguns segundos antes do clique em "Gerar Texto".
+# Com GERAI_PREFETCH=1, quando os campos ficam iguais por um intervalo curto (debounce), a geração
+# começa em segundo plano. Se o clique vier com os mesmos campos, o texto já pronto (ou ainda
+# chegando) aparece na hora; se os campos mudarem, a geração é cancelada ou, se já tinha terminado,
+# vai para o cache semântico. Para não gastar a cota à toa:
+# - a especulação só começa com vaga livre no escalonador (nunca atrasa o pedido de ninguém);
+# - cada usuário tem um limite de gerações especulativas por hora;
+# - as métricas mostram quantas foram aproveitadas, o desperdício e a latência economizada.
+
+import threading
+import time
+from collections import defaultdict, deque
+
+import admission
+import cancellation
+import config
+import gemini_client
+import metrics
+import prompts
+import semantic_cache
+
+DEBOUNCE_PADRAO = 1.5 # Segundos com os campos iguais antes de começar
+MAX_POR_HORA_PADRAO = 20 # Gerações especulativas por usuário por hora (por processo)
+
+
+def ativo():
+    """A geração especulativa só é usada quando ativada na configuração."""
+    return config.ler_bool('GERAI_PREFETCH', False)
+
+
+# --- Limite por usuário ---
+
+_inicios = defaultdict(deque) # usuário -> time.monotonic() das especulações da última hora
+_inicios_lock = threading.Lock()
+
+
+def _reservar(usuario):
+    """Conta uma especulação do usuário, se ele ainda estiver dentro do limite por hora."""
+    limite = config.ler_int('GERAI_PREFETCH_MAX_POR_HORA', MAX_POR_HORA_PADRAO)
+    agora = time.monotonic()
+    with _inicios_lock:
+        inicios = _inicios[usuario]
+        while inicios and agora - inicios[0] > 3600:
+            inicios.popleft()
+        if len(inicios) >= limite:
+            return False
+        inicios.append(agora)
+        return True
+
+
+# --- Especulação ---
+
+class Especulacao:
+    """Geração especulativa de um (tipo, tom, tema), rodando numa thread própria."""
+
+    def __init__(self, model_name, usuario, tipo, tom, tema):
+        self.model_name = model_name
+        self.usuario = usuario
+        self.chave = (tipo, tom, tema.strip())
+        self.cancelamento = cancellation.Cancelamento()
+        self.partes = []
+        self.erro = None
+        self.chamou = False # Passou do debounce e chamou o modelo
+        self.inicio = None # time.monotonic() do início da chamada
+        self.fim = None # time.monotonic() do fim (ou de quando desistiu)
+        self.aproveitada = False
+        self._condicao = threading.Condition()
+        threading.Thread(target=self._executar, name='gerai-prefetch', daemon=True).start()
+
+    @property
+    def estado(self):
+        """'aguardando' (debounce), 'gerando', 'pronta', 'falhou' ou 'descartada' (não chegou a chamar o modelo)."""
+        if not self.chamou:
+            return 'aguardando' if self.fim is None else 'descartada'
+        if self.fim is None:
+            return 'gerando'
+        return 'falhou' if self.erro is not None or not self.partes else 'pronta'
+
+    def _terminar(self, erro=None):
+        with self._condicao:
+            self.erro = erro
+            self.fim = time.monotonic()
+            self._condicao.notify_all()
+
+    def _executar(self):
+        tipo, tom, tema = self.chave
+        if self.cancelamento.esperar(config.ler_float('GERAI_PREFETCH_DEBOUNCE', DEBOUNCE_PADRAO)):
+            metrics.incrementar('prefetch.canceladas_no_debounce') # Os campos mudaram antes: nada foi gasto
+            return self._terminar()
+        if not admission.escalonador().tem_vaga_livre():
+            metrics.incrementar('prefetch.puladas_ocupado')
+            return self._terminar()
+        if not _reservar(self.usuario):
+            metrics.incrementar('prefetch.puladas_limite')
+            return self._terminar()
+
+        self.chamou = True
+        self.inicio = time.monotonic()
+        metrics.incrementar('prefetch.chamadas')
+        prompt, max_tok, temp, top_p_val, top_k_val = prompts.montar_prompt_geracao(tipo, tom, tema)
+        try:
+            for pedaco in gemini_client.stream_texto(self.model_name, prompt, max_tok, temp, top_p_val, top_k_val, text_type=tipo,
+                                                     usuario=self.usuario, tom=tom, instrucao_sistema=prompts.instrucao_geracao(tipo),
+                                                     cancelamento=self.cancelamento):
+                with self._condicao:
+                    self.partes.append(pedaco)
+                    self._condicao.notify_all()
+        except Exception as e: # Inclui ChamadaCancelada; quem aproveitar a especulação recebe o erro
+            return self._terminar(e)
+        self._terminar()
+
+    def acompanhar(self):
+        """Gera os pedaços de texto: os já recebidos de uma vez e depois os que ainda chegarem.
+
+        Levanta o erro da geração, se houver. Fechado antes do fim (ex.: o Streamlit interrompeu o
+        script), cancela a geração, como acontece com uma chamada normal.
+        """
+        enviados = 0
+        terminou = False
+        try:
+            while not terminou:
+                with self._condicao:
+                    while enviados == len(self.partes) and self.fim is None:
+                        self._condicao.wait()
+                    novos = self.partes[enviados:]
+                    enviados = len(self.partes)
+                    terminou = self.fim is not None and enviados == len(self.partes)
+                if novos:
+                    yield ''.join(novos)
+        finally:
+            if not terminou:
+                self.cancelamento.cancelar('abandonada')
+        if self.erro is not None:
+            raise self.erro
+
+    def texto(self):
+        with self._condicao:
+            return ''.join(self.partes)
+
+
+def agendar(anterior, model_name, usuario, tipo, tom, tema):
+    """Chamado a cada execução da página: retorna a especulação dos campos atuais.
+
+    Com os mesmos campos, devolve `anterior` (mesmo que já aproveitada: não especula duas vezes o
+    mesmo pedido). Com campos diferentes, descarta `anterior` e começa outra; a thread espera o
+    debounce antes de chamar o modelo, então mudanças rápidas nos campos não custam nada.
+    """
+    chave = (tipo, tom, tema.strip())
+    if anterior is not None and anterior.chave == chave:
+        return anterior
+    descartar(anterior)
+    if not chave[2]:
+        return None
+    return Especulacao(model_name, usuario, tipo, tom, tema)
+
+
+def aproveitar(especulacao, tipo, tom, tema):
+    """No clique: retorna a especulação se for dos mesmos campos e estiver gerando ou pronta; senão None.
+
+    Especulações que ainda não chamaram o modelo ou que falharam são descartadas e o pedido segue
+    pelo caminho normal.
+    """
+    if especulacao is None or especulacao.aproveitada:
+        return None
+    if especulacao.chave != (tipo, tom, tema.strip()) or especulacao.estado not in ('gerando', 'pronta'):
+        descartar(especulacao)
+        return None
+    especulacao.aproveitada = True
+    economizado = (especulacao.fim or time.monotonic()) - especulacao.inicio
+    metrics.incrementar('prefetch.aproveitadas')
+    metrics.incrementar('prefetch.segundos_economizados', economizado)
+    metrics.observar('prefetch.latencia_economizada', economizado)
+    return especulacao
+
+
+def descartar(especulacao):
+    """Cancela uma especulação não aproveitada. Se já tinha terminado, guarda o texto no cache semântico."""
+    if especulacao is None or especulacao.aproveitada:
+        return
+    if especulacao.estado == 'pronta':
+        tipo, tom, tema = especulacao.chave
+        texto = especulacao.texto()
+        if semantic_cache.ativo():
+            semantic_cache.guardar(especulacao.model_name, tipo, tom, tema, texto)
+            metrics.incrementar('prefetch.guardadas_no_cache')
+        metrics.incrementar('prefetch.caracteres_desperdicados', len(texto))
+    elif especulacao.estado == 'gerando':
+        metrics.incrementar('prefetch.caracteres_desperdicados', len(especulacao.texto()))
+    especulacao.cancelamento.cancelar('especulacao_descartada')
+
+
+def relatorio():
+    """Aproveitamento das gerações especulativas (neste processo): desperdício e latência economizada."""
+    chamadas = metrics.contador('prefetch.chamadas')
+    aproveitadas = metrics.contador('prefetch.aproveitadas')
+    return {
+        'chamadas': chamadas,
+        'aproveitadas': aproveitadas,
+        'nao_aproveitadas': chamadas - aproveitadas,
+        'taxa_desperdicio': round((chamadas - aproveitadas) / chamadas, 3) if chamadas else None,
+        'caracteres_desperdicados': metrics.contador('prefetch.caracteres_desperdicados'),
+        'canceladas_no_debounce': metrics.contador('prefetch.canceladas_no_debounce'),
+        'puladas_servidor_ocupado': metrics.contador('prefetch.puladas_ocupado'),
+        'puladas_limite_usuario': metrics.contador('prefetch.puladas_limite'),
+        'segundos_economizados': round(metrics.contador('prefetch.segundos_economizados'), 1),
+        'economia_p50_s': metrics.percentil('prefetch.latencia_economizada', 50),
+    }
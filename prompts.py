@@ -0,0 +1,220 @@
+# Modelos de prompt compartilhados por app.py, streamlit_app.py e main2.py
+# Os prompts eram f-strings com três aspas dentro de blocos indentados, então cada linha ia para o
+# modelo com 12 a 16 espaços na frente (tokens pagos e sem efeito). Aqui ficam os modelos canônicos,
+# sem indentação (também os da geração em lote, da lista de edições e da correção por parágrafos),
+# as instruções e parâmetros de cada tipo de texto e a normalização do texto colado pelo usuário.
+# A economia de tokens por tipo de pedido fica registrada nas métricas.
+
+import math
+import re
+
+import metrics
+
+# Indentação com que os prompts eram montados nos scripts (base da comparação no relatório de economia)
+INDENTACAO_ANTERIOR = 12
+# Modelos que nunca foram indentados: a economia deles vem só da normalização do texto do usuário
+SEM_INDENTACAO_ANTERIOR = {'lote', 'edicoes', 'paragrafos'}
+
+# Regras de linguagem repetidas nos modelos
+_REGRA_GERACAO = 'Não use gírias, palavrões ou termos complexos demais a menos que o tema ou o tom técnico exijam e sejam explicados.'
+_REGRA_CORRECAO = ('Não use gírias, palavrões ou termos complexos demais a menos que o texto original já os contenha '
+                   'e seja necessário revisá-los.')
+
+# --- Modelos de prompt ---
+# Partes fixas (":sistema") vão como instrução de sistema; as demais levam só o que muda a cada pedido.
+MODELOS = {
+    'geracao:sistema': (
+        'Crie textos completos e bem estruturados, do tipo e no tom pedidos, sobre o tema/assunto informado.\n'
+        f'{_REGRA_GERACAO}\n'
+        'Responda em formato Markdown.'
+    ),
+    'geracao': (
+        'Crie um texto do tipo "{tipo}" sobre o tema/assunto: "{tema}"\n'
+        'Use um tom "{tom}".'
+    ),
+    'correcao:sistema': (
+        'Por favor, revise e aprimore o texto enviado, usando o tom indicado na revisão e nas sugestões.\n'
+        'Corrija erros de ortografia, gramática, pontuação e dê sugestões para melhorar a clareza, a coesão e a fluidez. '
+        'Mantenha o significado original do texto.\n'
+        f'{_REGRA_CORRECAO}\n'
+        'Forneça o texto revisado e, em uma seção separada marcada como "Sugestões:", liste as sugestões de melhoria em tópicos numerados.\n'
+        'Responda em formato Markdown.'
+    ),
+    'correcao': (
+        'Use um tom {tom} na revisão e nas sugestões.\n'
+        '\n'
+        'Texto a revisar:\n'
+        '{texto}\n'
+        '\n'
+        'Texto revisado:'
+    ),
+    # Geração em lote (packing): vários temas numa chamada, resposta em array JSON
+    'lote': (
+        'Crie {quantidade} textos independentes do tipo "{tipo}", um para cada tema/assunto da lista abaixo.\n'
+        'Use um tom "{tom}" em todos eles.\n'
+        f'{_REGRA_GERACAO}\n'
+        '{instrucao}\n'
+        'Cada texto deve estar em formato Markdown.\n'
+        'Responda SOMENTE com um array JSON de {quantidade} objetos, na mesma ordem da lista, no formato:\n'
+        '[{{"id": <número do tema>, "texto": "<texto em Markdown>"}}]\n'
+        '\n'
+        'Temas:\n'
+        '{temas}'
+    ),
+    # Correção por lista de edições (edit_correction e os trechos do precheck)
+    'edicoes': (
+        'Por favor, revise o texto abaixo.\n'
+        'Use um tom {tom} nas correções e nas sugestões.\n'
+        'Corrija erros de ortografia, gramática e pontuação e melhore a clareza, a coesão e a fluidez quando necessário. '
+        'Mantenha o significado original do texto.\n'
+        f'{_REGRA_CORRECAO}\n'
+        'NÃO reescreva o texto inteiro. Responda SOMENTE com um objeto JSON no formato:\n'
+        '{{"edicoes": [{{"trecho": "<trecho exato do texto original>", "substituicao": "<novo trecho>", "motivo": "<motivo curto>"}}],\n'
+        ' "sugestoes": ["<sugestão de melhoria>"]}}\n'
+        'Regras: cada "trecho" deve ser copiado exatamente como está no texto original (com acentos e pontuação), ser curto,\n'
+        'mas longo o bastante para aparecer uma única vez, e as edições devem seguir a ordem em que aparecem no texto.\n'
+        'Se o texto não tiver nada a corrigir, devolva "edicoes" vazia.\n'
+        '\n'
+        'Texto a revisar:\n'
+        '{texto}'
+    ),
+    # Correção só dos parágrafos alterados (incremental_correction), resposta em JSON
+    'paragrafos': (
+        'Por favor, revise e aprimore os parágrafos numerados abaixo. Eles fazem parte de um texto maior.\n'
+        'Use um tom {tom} na revisão e nas sugestões.\n'
+        'Corrija erros de ortografia, gramática, pontuação e melhore a clareza, a coesão e a fluidez. Mantenha o significado original.\n'
+        f'{_REGRA_CORRECAO}\n'
+        'Não junte nem divida parágrafos: devolva exatamente um parágrafo revisado para cada número, com as sugestões de melhoria dele.\n'
+        'Responda SOMENTE com um objeto JSON no formato:\n'
+        '{{"paragrafos": [{{"id": <número>, "texto": "<parágrafo revisado>", "sugestoes": ["<sugestão de melhoria>"]}}]}}\n'
+        '\n'
+        'Parágrafos:\n'
+        '{paragrafos}'
+    ),
+}
+
+# Parâmetros da correção completa: max_tok, temp, top_p, top_k
+PARAMETROS_CORRECAO = (1500, 0.5, 0.9, 0)
+
+# Parâmetros padrão de geração: max_tok, temp, top_p, top_k
+PARAMETROS_GERACAO_PADRAO = (1000, 0.7, 0.9, 0)
+
+# Instrução extra e parâmetros de cada tipo de texto. A chave é o começo do nome do tipo, pois os
+# scripts usam rótulos com complementos (ex.: "Post para Redes Sociais (Ideias e Sugestões)").
+TIPOS_TEXTO = {
+    'Artigo/Texto Acadêmico': (
+        "Inclua introdução, desenvolvimento com argumentos e exemplos relevantes, e conclusão. Mantenha a formalidade e objetividade.",
+        (1800, 0.6, 0.95, 50)
+    ),
+    'E-mail Profissional': (
+        "Formate a resposta como um e-mail profissional pronto para envio, com linhas para Assunto: e Corpo:.",
+        (800, 0.5, 0.9, 0)
+    ),
+    'Post para Redes Sociais': (
+        "Seja conciso (máximo 280 caracteres se for Twitter, ajuste para outras redes), use linguagem engajadora e inclua hashtags relevantes ao tema.",
+        (400, 0.8, 0.9, 0)
+    ),
+    'Conteúdo de Marketing Digital': (
+        "Foque nos benefícios, crie urgência ou desejo e inclua uma chamada para ação (call to action) clara relevante ao tema/produto/serviço.",
+        (1000, 0.9, 0.9, 0)
+    ),
+    'Roteiro Simples': (
+        "Formate como um roteiro básico, com indicação de cenas, diálogos e ações.",
+        (1200, 0.8, 0.95, 50)
+    ),
+    'Descrição de Produto': (
+        "Descreva as características e benefícios do produto de forma atraente para um público comprador.",
+        (600, 0.7, 0.9, 0)
+    ),
+}
+
+
+# --- Normalização ---
+
+_RECUO = re.compile(r'[ \t\u00a0]*')
+_ESPACOS = re.compile(r'[ \t\u00a0]+')
+
+def normalizar_texto(texto):
+    """Normaliza o texto colado pelo usuário mantendo os parágrafos.
+
+    Junta sequências de espaços/tabulações dentro das linhas, tira os espaços do fim delas e deixa no
+    máximo uma linha em branco entre parágrafos. O recuo no começo das linhas (listas aninhadas,
+    código) fica como está.
+    """
+    linhas = []
+    for linha in texto.replace('\r\n', '\n').split('\n'):
+        recuo = _RECUO.match(linha).group(0)
+        linhas.append((recuo + _ESPACOS.sub(' ', linha[len(recuo):])).rstrip())
+    return re.sub(r'\n{3,}', '\n\n', '\n'.join(linhas)).strip('\n')
+
+
+def estimar_tokens(texto):
+    """Estimativa simples de tokens (~4 caracteres por token), sem chamar a API de contagem."""
+    return math.ceil(len(texto) / 4)
+
+
+def _registrar_economia(nome, campos_originais, prompt):
+    """Compara com o prompt que seria enviado antes (linhas do modelo indentadas, texto do usuário sem normalizar)."""
+    recuo = 0 if nome in SEM_INDENTACAO_ANTERIOR else INDENTACAO_ANTERIOR
+    indentado = '\n'.join(' ' * recuo + linha if linha else linha for linha in MODELOS[nome].split('\n'))
+    anterior = indentado.format(**campos_originais)
+    metrics.incrementar(f'prompt.pedidos.{nome}')
+    metrics.incrementar(f'prompt.tokens_economizados.{nome}', max(0, estimar_tokens(anterior) - estimar_tokens(prompt)))
+
+
+def montar(nome, **campos):
+    """Monta o prompt `nome` do registro com os campos informados (texto do usuário já normalizado)."""
+    normalizados = {chave: normalizar_texto(str(valor)) for chave, valor in campos.items()}
+    prompt = MODELOS[nome].format(**normalizados)
+    _registrar_economia(nome, campos, prompt)
+    return prompt
+
+
+# --- Geração e correção ---
+
+def parametros_geracao(tipo):
+    """Retorna a instrução extra e os parâmetros (max_tok, temp, top_p, top_k) ajustados para o tipo de texto."""
+    for prefixo, (instrucao, parametros) in TIPOS_TEXTO.items():
+        if tipo.startswith(prefixo):
+            return (instrucao, *parametros)
+    return ('', *PARAMETROS_GERACAO_PADRAO)
+
+
+def instrucao_geracao(tipo):
+    """Instruções fixas de geração para o tipo de texto (iguais em todo pedido; vão como instrução de sistema)."""
+    instrucao = parametros_geracao(tipo)[0]
+    _registrar_economia('geracao:sistema', {}, MODELOS['geracao:sistema'])
+    return f"{MODELOS['geracao:sistema']}\n{instrucao}" if instrucao else MODELOS['geracao:sistema']
+
+
+def instrucao_correcao():
+    """Instruções fixas da correção completa (iguais em todo pedido; vão como instrução de sistema)."""
+    _registrar_economia('correcao:sistema', {}, MODELOS['correcao:sistema'])
+    return MODELOS['correcao:sistema']
+
+
+def montar_prompt_geracao(tipo, tom, tema):
+    """Monta a parte variável do prompt de geração e retorna junto com os parâmetros do tipo de texto."""
+    _, max_tok, temp, top_p_val, top_k_val = parametros_geracao(tipo)
+    return montar('geracao', tipo=tipo, tom=tom, tema=tema), max_tok, temp, top_p_val, top_k_val
+
+
+def montar_prompt_correcao(tom, texto):
+    """Monta a parte variável do prompt de correção completa (as regras ficam em instrucao_correcao())."""
+    return montar('correcao', tom=tom, texto=texto)
+
+
+def relatorio_economia():
+    """Tokens economizados (estimados) por tipo de pedido com os prompts compactos."""
+    relatorio = {}
+    for nome in MODELOS:
+        pedidos = metrics.contador(f'prompt.pedidos.{nome}')
+        if not pedidos:
+            continue
+        economizados = metrics.contador(f'prompt.tokens_economizados.{nome}')
+        relatorio[nome] = {
+            'pedidos': pedidos,
+            'tokens_economizados': economizados,
+            'media_por_pedido': round(economizados / pedidos, 1),
+        }
+    return relatorio
@@ -0,0 +1,295 @@
+# Política de retenção do histórico (gerai_history.db)
+# Sem retenção, a tabela `interactions` cresce para sempre (cada geração guarda o texto completo).
+# Aqui as interações que passam dos limites configurados (idade, quantidade de linhas ou tamanho
+# total, por operation_type) são apagadas por uma thread em segundo plano, em lotes pequenos com
+# pausas entre eles: cada lote trava o banco por poucos milissegundos e o save_interaction dos
+# usuários passa entre um lote e outro.
+#
+# O espaço das linhas apagadas volta para o sistema com o auto-vacuum incremental do SQLite
+# (PRAGMA incremental_vacuum, também em passos pequenos), sem um VACUUM completo a cada execução.
+# Um banco criado sem auto-vacuum só muda com um VACUUM completo, que trava o banco durante toda a
+# reescrita: essa conversão nunca roda sozinha, só quando pedida (botão no app ou
+# `python retention.py --converter`). Até lá as linhas são apagadas e o espaço é reaproveitado pelo
+# próprio SQLite, mas o arquivo não diminui.
+# O relatório da última execução (linhas apagadas, espaço recuperado, duração) fica na tabela
+# `maintenance`, visível para todos os processos.
+
+import argparse
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+import config
+import history_db
+import metrics
+
+LOTE = 500 # Linhas apagadas por transação
+PAUSA = 0.05 # Segundos entre lotes (deixa outras escritas passarem)
+PAGINAS_POR_PASSO = 256 # Páginas devolvidas por passo do incremental_vacuum
+INTERVALO_PADRAO = 3600 # Segundos entre execuções (somando todos os processos)
+OPERACOES = ('gerar', 'corrigir')
+
+_thread = None
+_thread_lock = threading.Lock()
+
+
+def _limite(nome, operacao, conversor):
+    """Limite da operação (GERAI_RETENCAO_<NOME>_<OPERACAO>) ou o geral (GERAI_RETENCAO_<NOME>). 0 = sem limite."""
+    geral = conversor(f'GERAI_RETENCAO_{nome}', 0)
+    return conversor(f'GERAI_RETENCAO_{nome}_{operacao.upper()}', geral)
+
+
+def limites(operacao):
+    """Limites de retenção configurados para a operação: dias, linhas e megabytes (0 = sem limite)."""
+    return {
+        'dias': _limite('DIAS', operacao, config.ler_int),
+        'linhas': _limite('MAX_LINHAS', operacao, config.ler_int),
+        'mb': _limite('MAX_MB', operacao, config.ler_float),
+    }
+
+
+def ativa():
+    return any(valor for operacao in OPERACOES for valor in limites(operacao).values())
+
+
+def init_tabela(conn):
+    """Cria a tabela de controle das tarefas de manutenção se não existir."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS maintenance (
+            nome TEXT PRIMARY KEY,
+            ultima_execucao REAL, -- time.time() do início da última execução
+            relatorio TEXT -- JSON com o resultado da última execução
+        )
+    ''')
+
+
+# --- Exclusão em lotes ---
+
+def _apagar_lote(conn, sql_ids, parametros):
+    """Apaga um lote (ids escolhidos por `sql_ids`) numa transação curta. Retorna quantas linhas saíram."""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        cursor = conn.execute(f'DELETE FROM interactions WHERE id IN ({sql_ids})', parametros)
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    time.sleep(PAUSA)
+    return cursor.rowcount
+
+
+def _por_idade(conn, operacao, dias):
+    corte = (datetime.now() - timedelta(days=dias)).strftime('%Y-%m-%d %H:%M:%S')
+    apagadas = 0
+    while True:
+        quantidade = _apagar_lote(conn, 'SELECT id FROM interactions WHERE operation_type = ? AND timestamp < ? ORDER BY id LIMIT ?',
+                                  (operacao, corte, LOTE))
+        apagadas += quantidade
+        if quantidade < LOTE:
+            return apagadas
+
+
+def _por_quantidade(conn, operacao, maximo):
+    excesso = conn.execute('SELECT COUNT(*) FROM interactions WHERE operation_type = ?', (operacao,)).fetchone()[0] - maximo
+    apagadas = 0
+    while excesso > 0:
+        quantidade = _apagar_lote(conn, 'SELECT id FROM interactions WHERE operation_type = ? ORDER BY id LIMIT ?',
+                                  (operacao, min(LOTE, excesso)))
+        if not quantidade:
+            break
+        apagadas += quantidade
+        excesso -= quantidade
+    return apagadas
+
+
+def _por_tamanho(conn, operacao, megabytes):
+    """Apaga as interações mais antigas até o texto guardado da operação caber no limite."""
+    tamanho = "COALESCE(LENGTH(input_text), 0) + COALESCE(LENGTH(output_text), 0)"
+    excesso = conn.execute(f'SELECT COALESCE(SUM({tamanho}), 0) FROM interactions WHERE operation_type = ?',
+                           (operacao,)).fetchone()[0] - megabytes * 1024 * 1024
+    apagadas = 0
+    while excesso > 0:
+        linhas = conn.execute(f'SELECT id, {tamanho} FROM interactions WHERE operation_type = ? ORDER BY id LIMIT ?',
+                              (operacao, LOTE)).fetchall()
+        if not linhas:
+            break
+        ids = []
+        for id_, bytes_linha in linhas:
+            ids.append(id_)
+            excesso -= bytes_linha
+            if excesso <= 0:
+                break
+        apagadas += _apagar_lote(conn, ','.join('?' * len(ids)), ids)
+    return apagadas
+
+
+# --- Auto-vacuum incremental ---
+
+def _tamanho_arquivo(conn):
+    return conn.execute('PRAGMA page_count').fetchone()[0] * conn.execute('PRAGMA page_size').fetchone()[0]
+
+
+def _vacuum_incremental_ligado(conn):
+    return conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2 # 2 = INCREMENTAL
+
+
+def vacuum_incremental_ligado():
+    """True se o banco já usa o auto-vacuum incremental (criado com ele ou já convertido)."""
+    conn = history_db.conectar()
+    try:
+        return _vacuum_incremental_ligado(conn)
+    finally:
+        conn.close()
+
+
+def converter_vacuum():
+    """Liga o auto-vacuum incremental num banco criado sem ele (VACUUM completo, uma única vez).
+
+    O VACUUM trava o banco até reescrevê-lo inteiro: as gravações esperam (e podem falhar) enquanto
+    isso. Deve ser pedido pelo operador, num horário de pouco uso. Retorna o relatório, ou None se
+    o banco já estava convertido.
+    """
+    conn = history_db.conectar()
+    conn.isolation_level = None
+    try:
+        if _vacuum_incremental_ligado(conn):
+            return None
+        inicio = time.monotonic()
+        tamanho_antes = _tamanho_arquivo(conn)
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('VACUUM')
+        relatorio = {
+            'bytes_recuperados': max(0, tamanho_antes - _tamanho_arquivo(conn)),
+            'tamanho_final': _tamanho_arquivo(conn),
+            'duracao_s': round(time.monotonic() - inicio, 3),
+        }
+    finally:
+        conn.close()
+    metrics.incrementar('retencao.conversoes_vacuum')
+    return relatorio
+
+
+def _vacuum_incremental(conn):
+    """Devolve as páginas livres ao sistema em passos curtos."""
+    livres = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    while livres:
+        # executescript roda o PRAGMA até o fim (pelo cursor, cada passo libera uma página só)
+        conn.executescript(f'PRAGMA incremental_vacuum({PAGINAS_POR_PASSO});')
+        restantes = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        if restantes >= livres: # Nada mais a liberar agora (ex.: leitura em andamento no modo WAL)
+            break
+        livres = restantes
+        time.sleep(PAUSA)
+
+
+# --- Execução ---
+
+def _reivindicar(conn, intervalo):
+    """Marca o início da execução se a última (de qualquer processo) foi há mais de `intervalo` segundos."""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        linha = conn.execute("SELECT ultima_execucao FROM maintenance WHERE nome = 'retencao'").fetchone()
+        agora = time.time()
+        livre = linha is None or linha[0] is None or agora - linha[0] >= intervalo
+        if livre:
+            conn.execute("INSERT INTO maintenance (nome, ultima_execucao) VALUES ('retencao', ?) "
+                         "ON CONFLICT(nome) DO UPDATE SET ultima_execucao = excluded.ultima_execucao", (agora,))
+        conn.execute('COMMIT')
+        return livre
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def executar(intervalo=0):
+    """Aplica a retenção e recupera o espaço. Retorna o relatório, ou None se outro processo rodou há pouco."""
+    conn = history_db.conectar()
+    conn.isolation_level = None # Controlamos as transações manualmente (BEGIN IMMEDIATE)
+    try:
+        history_db.init_interactions(conn)
+        init_tabela(conn)
+        if not _reivindicar(conn, intervalo):
+            return None
+        inicio = time.monotonic()
+        vacuum = _vacuum_incremental_ligado(conn)
+        tamanho_antes = _tamanho_arquivo(conn)
+        apagadas = {}
+        for operacao in OPERACOES:
+            limite = limites(operacao)
+            total = 0
+            if limite['dias']:
+                total += _por_idade(conn, operacao, limite['dias'])
+            if limite['linhas']:
+                total += _por_quantidade(conn, operacao, limite['linhas'])
+            if limite['mb']:
+                total += _por_tamanho(conn, operacao, limite['mb'])
+            apagadas[operacao] = total
+        if vacuum:
+            _vacuum_incremental(conn)
+        relatorio = {
+            'executado_em': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'linhas_apagadas': apagadas,
+            'vacuum_incremental': vacuum, # False: falta converter o banco (converter_vacuum)
+            'bytes_recuperados': max(0, tamanho_antes - _tamanho_arquivo(conn)),
+            'tamanho_final': _tamanho_arquivo(conn),
+            'duracao_s': round(time.monotonic() - inicio, 3),
+        }
+        conn.execute("UPDATE maintenance SET relatorio = ? WHERE nome = 'retencao'", (json.dumps(relatorio),))
+    finally:
+        conn.close()
+    metrics.incrementar('retencao.linhas_apagadas', sum(apagadas.values()))
+    metrics.incrementar('retencao.bytes_recuperados', relatorio['bytes_recuperados'])
+    metrics.observar('retencao.duracao', relatorio['duracao_s'])
+    return relatorio
+
+
+def ultimo_relatorio():
+    """Relatório da última execução (de qualquer processo), ou None se ainda não rodou."""
+    conn = history_db.conectar()
+    try:
+        init_tabela(conn)
+        linha = conn.execute("SELECT relatorio FROM maintenance WHERE nome = 'retencao'").fetchone()
+    finally:
+        conn.close()
+    return json.loads(linha[0]) if linha and linha[0] else None
+
+
+def _loop(intervalo):
+    while True:
+        try:
+            executar(intervalo)
+        except Exception:
+            # Banco ocupado por muito tempo ou erro inesperado: tenta de novo na próxima rodada
+            metrics.incrementar('retencao.erros')
+        time.sleep(intervalo)
+
+
+def iniciar():
+    """Inicia (uma única vez por processo) a thread de retenção, se algum limite estiver configurado."""
+    global _thread
+    with _thread_lock:
+        if _thread is not None or not ativa():
+            return
+        intervalo = config.ler_int('GERAI_RETENCAO_INTERVALO', INTERVALO_PADRAO)
+        _thread = threading.Thread(target=_loop, args=(intervalo,), name='gerai-retencao', daemon=True)
+        _thread.start()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manutenção do gerai_history.db.")
+    parser.add_argument('--converter', action='store_true',
+                        help="Liga o auto-vacuum incremental (VACUUM completo: trava o banco durante a conversão).")
+    args = parser.parse_args(argv)
+    if not args.converter:
+        parser.print_help()
+        return
+    resultado = converter_vacuum()
+    if resultado is None:
+        print("O banco já usa o auto-vacuum incremental.")
+    else:
+        print(f"Banco convertido em {resultado['duracao_s']} s; {resultado['bytes_recuperados'] / (1024 * 1024):.1f} MB recuperados.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+# Cache semântico (opcional) de gerações
+# Pedidos repetidos quase nunca vêm com o mesmo texto: "e-mail de cobrança educado" e
+# "email educado de cobrança" são o mesmo tema. Aqui cada tema vira um vetor de n-gramas de
+# caracteres (com hashing, sem modelo de embeddings) e, para cada (modelo, tipo de texto, tom),
+# mantemos uma matriz NumPy com os vetores já gerados. Um pedido cuja similaridade de cosseno com
+# algum tema anterior passa do limiar recebe o texto guardado, sem chamar o modelo.
+# Ativado com GERAI_CACHE_SEMANTICO=1.
+
+import re
+import threading
+import unicodedata
+import zlib
+
+import numpy as np
+
+import config
+import metrics
+
+DIMENSAO = 4096 # Tamanho dos vetores de n-gramas (colisões de hash ficam raras para temas curtos)
+TAMANHO_NGRAMA = 3
+LIMIAR_PADRAO = 0.85
+MAX_ENTRADAS_PADRAO = 5000 # Por combinação de modelo, tipo e tom
+FAIXAS = 10 # Faixas de 0.1 no histograma de similaridade
+
+
+def ativo():
+    """O cache semântico só é usado quando ativado na configuração."""
+    return config.ler_bool('GERAI_CACHE_SEMANTICO', False)
+
+
+def normalizar_tema(tema):
+    """Minúsculas, sem acentos, sem pontuação nem hífens ("E-mail" = "email"), espaços simples."""
+    tema = unicodedata.normalize('NFKD', tema.lower())
+    tema = ''.join(c for c in tema if not unicodedata.combining(c))
+    tema = tema.replace('-', '')
+    tema = re.sub(r'[^\w\s]', ' ', tema)
+    return ' '.join(tema.split())
+
+
+def vetorizar(tema):
+    """Vetor normalizado (norma 1) dos n-gramas de caracteres de cada palavra do tema.
+
+    Os n-gramas são tirados palavra a palavra, então a ordem das palavras não muda o vetor.
+    """
+    vetor = np.zeros(DIMENSAO, dtype=np.float32)
+    for palavra in normalizar_tema(tema).split():
+        palavra = f" {palavra} " # Marca início e fim: "de" não se confunde com o meio de "cidade"
+        for inicio in range(max(1, len(palavra) - TAMANHO_NGRAMA + 1)):
+            ngrama = palavra[inicio:inicio + TAMANHO_NGRAMA]
+            vetor[zlib.crc32(ngrama.encode('utf-8')) % DIMENSAO] += 1.0
+    norma = np.linalg.norm(vetor)
+    return vetor / norma if norma else vetor
+
+
+class _Indice:
+    """Vetores e textos de uma combinação (modelo, tipo, tom). A matriz cresce dobrando de tamanho."""
+
+    def __init__(self):
+        self.vetores = np.zeros((16, DIMENSAO), dtype=np.float32)
+        self.temas = []
+        self.textos = []
+
+    def buscar(self, vetor):
+        """Retorna (similaridade, posição) do tema mais parecido, ou (0.0, None) se o índice estiver vazio."""
+        if not self.textos:
+            return 0.0, None
+        similaridades = self.vetores[:len(self.textos)] @ vetor # Vetores normalizados: produto = cosseno
+        posicao = int(np.argmax(similaridades))
+        return float(similaridades[posicao]), posicao
+
+    def adicionar(self, vetor, tema, texto, max_entradas):
+        if len(self.textos) >= max_entradas:
+            # Cheio: descarta a metade mais antiga de uma vez (evita mover a matriz a cada inserção)
+            metade = len(self.textos) // 2
+            restantes = len(self.textos) - metade
+            self.vetores[:restantes] = self.vetores[metade:len(self.textos)]
+            del self.temas[:metade], self.textos[:metade]
+        if len(self.textos) == len(self.vetores):
+            maior = np.zeros((len(self.vetores) * 2, DIMENSAO), dtype=np.float32)
+            maior[:len(self.vetores)] = self.vetores
+            self.vetores = maior
+        self.vetores[len(self.textos)] = vetor
+        self.temas.append(tema)
+        self.textos.append(texto)
+
+
+_indices = {}
+_lock = threading.Lock()
+
+
+def buscar(model_name, tipo, tom, tema):
+    """Procura um texto já gerado para um tema parecido. Retorna o texto ou None."""
+    vetor = vetorizar(tema)
+    with _lock:
+        indice = _indices.get((model_name, tipo, tom))
+        similaridade, posicao = indice.buscar(vetor) if indice else (0.0, None)
+        texto = indice.textos[posicao] if posicao is not None else None
+
+    metrics.incrementar('cache_semantico.consultas')
+    if posicao is not None:
+        # Distribuição da melhor similaridade de cada consulta, para ajustar o limiar
+        metrics.observar('cache_semantico.similaridade', similaridade)
+        metrics.incrementar(f'cache_semantico.faixa.{min(int(similaridade * FAIXAS), FAIXAS - 1)}')
+    if posicao is not None and similaridade >= config.ler_float('GERAI_CACHE_SEMANTICO_LIMIAR', LIMIAR_PADRAO):
+        metrics.incrementar('cache_semantico.acertos')
+        return texto
+    return None
+
+
+def guardar(model_name, tipo, tom, tema, texto):
+    """Adiciona o texto gerado ao índice (incremental: só o vetor novo é calculado)."""
+    vetor = vetorizar(tema)
+    if not vetor.any():
+        return # Tema vazio/sem letras: nada para comparar depois
+    max_entradas = config.ler_int('GERAI_CACHE_SEMANTICO_MAX', MAX_ENTRADAS_PADRAO)
+    with _lock:
+        _indices.setdefault((model_name, tipo, tom), _Indice()).adicionar(vetor, tema, texto, max_entradas)
+
+
+def relatorio():
+    """Taxa de acerto e distribuição das similaridades, para calibrar GERAI_CACHE_SEMANTICO_LIMIAR."""
+    consultas = metrics.contador('cache_semantico.consultas')
+    acertos = metrics.contador('cache_semantico.acertos')
+    relatorio = {
+        'consultas': consultas,
+        'acertos': acertos,
+        'taxa_acerto_pct': round(100 * acertos / consultas, 1) if consultas else 0.0,
+        'limiar': config.ler_float('GERAI_CACHE_SEMANTICO_LIMIAR', LIMIAR_PADRAO),
+    }
+    for p in (10, 50, 90, 99):
+        relatorio[f'similaridade_p{p}'] = metrics.percentil('cache_semantico.similaridade', p)
+    relatorio['histograma'] = {
+        f'{faixa / FAIXAS:.1f}-{(faixa + 1) / FAIXAS:.1f}': metrics.contador(f'cache_semantico.faixa.{faixa}')
+        for faixa in range(FAIXAS)
+    }
+    return relatorio
+
+
+def gerar_com_cache(model_name, tipo, tom, tema, gerar):
+    """Usa o cache semântico (se ativo) em volta de `gerar()`. Retorna (texto, veio_do_cache)."""
+    if not ativo():
+        return gerar(), False
+    texto = buscar(model_name, tipo, tom, tema)
+    if texto is not None:
+        return texto, True
+    texto = gerar()
+    if texto:
+        guardar(model_name, tipo, tom, tema, texto)
+    return texto, False
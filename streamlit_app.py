@@ -1,13 +1,27 @@
 # Início do Arquivo streamlit_app.py - Com Histórico da Sessão
 
 import streamlit as st
-import google.generativeai as genai
 import os
+import contextlib
 from dotenv import load_dotenv
 import docx
 from docx import Document
 import io
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import datetime # <-- Adicionado: Import para usar data e hora
+import gemini_client # Chamada ao Gemini compartilhada entre os scripts
+import edit_correction # Correção por lista de edições (diff em linha)
+import incremental_correction # Correção só dos parágrafos alterados
+import admission # Fila de prioridade das chamadas ao Gemini
+import usage # Contagem de tokens e orçamentos de uso
+import semantic_cache # Reaproveita gerações de temas parecidos (opcional)
+import prompts # Modelos de prompt compartilhados (sem indentação)
+import uuid # Identificador anônimo da sessão
+import cancellation # Cancelamento de chamadas substituídas ou abandonadas
+import transport # Transporte (gRPC/REST), keepalive e prazo das chamadas ao Gemini
+import ingestion # Leitura de arquivos .txt/.docx em fluxo de parágrafos
+import prefetch # Geração especulativa enquanto o usuário ainda escolhe (opcional)
+import precheck # Pré-verificação local da correção (evita ou reduz chamadas)
 
 # --- Configuração e Funções ---
 
@@ -20,11 +34,15 @@ if not GOOGLE_API_KEY:
     st.error("Por favor, adicione GOOGLE_API_KEY='sua_chave_aqui' ao seu arquivo .env")
     st.stop()
 
-genai.configure(api_key=GOOGLE_API_KEY)
+transport.configurar(GOOGLE_API_KEY) # Transporte e conexão vêm do .env; o cliente é reaproveitado entre reruns
 
 # Nome do modelo padrão para usar - **VERIFIQUE SE ESTÁ CORRETO PARA SUA CHAVE!**
 default_model_name = 'models/gemini-1.5-flash' # <--- Nome do modelo definido aqui
 
+# Identificador anônimo da sessão, usado para dividir as vagas de chamada de forma justa entre usuários
+if 'usuario_id' not in st.session_state:
+    st.session_state.usuario_id = uuid.uuid4().hex
+
 
 # Função auxiliar para salvar texto (retorna dados para download)
 def to_txt(text_content):
@@ -42,30 +60,107 @@ def to_docx(text_content):
     return buffer.getvalue()
 
 
-# Função para interagir com o modelo Gemini (geral para geração e correção)
-def interagir_com_gemini(prompt, max_tokens, temperature, top_p=0.9, top_k=0):
-    """Envia um prompt para o modelo Gemini e retorna a resposta."""
+# Chamadas sem prévia do texto (lista de edições, parágrafos, arquivo, verificação local)
+@contextlib.contextmanager
+def chamada_da_sessao():
+    """Cancela a chamada anterior da sessão e entrega o Cancelamento da nova.
+
+    A cada pedaço recebido, um aviso na página é atualizado: é nesse ponto que o Streamlit consegue
+    interromper o script (novo clique, troca de aba), como a prévia faz em interagir_com_gemini.
+    """
+    aviso = st.empty()
+    cancelamento = cancellation.substituir(st.session_state.get('chamada_em_andamento'),
+                                           ao_verificar=lambda: aviso.caption("Recebendo a resposta da IA..."))
+    st.session_state.chamada_em_andamento = cancelamento
     try:
-        model = genai.GenerativeModel(default_model_name)
+        yield cancelamento
+    finally:
+        aviso.empty()
 
-        generation_config = genai.GenerationConfig(
-            max_output_tokens=max_tokens,
-            temperature=temperature,
-            top_p=top_p,
-            top_k=top_k
-        )
 
-        response = model.generate_content(
-            prompt,
-            generation_config=generation_config
-        )
+# Função para interagir com o modelo Gemini (geral para geração e correção)
+def interagir_com_gemini(prompt, max_tokens, temperature, top_p=0.9, top_k=0, text_type=None, tone=None, instrucao_sistema=None,
+                         especulacao=None, cancelamento=None):
+    """Envia um prompt para o modelo Gemini e retorna a resposta.
+
+    Com `especulacao` (prefetch.aproveitar), mostra a geração especulativa já começada em vez de chamar o modelo.
+    Com `cancelamento` (de chamada_da_sessao), a chamada faz parte de uma operação maior e usa o cancelamento dela.
+    """
+    # Cada sessão guarda a chamada em andamento: uma chamada nova cancela a anterior que ainda estiver rodando
+    if cancelamento is None:
+        cancelamento = cancellation.substituir(st.session_state.get('chamada_em_andamento'))
+    if especulacao is not None:
+        cancelamento = especulacao.cancelamento
+    st.session_state.chamada_em_andamento = cancelamento
+    try:
+        # A chamada (e o modo hedging opcional) fica em gemini_client, compartilhado com os outros scripts.
+        # O texto aparece enquanto chega; cada atualização da prévia é um ponto em que o Streamlit interrompe
+        # o script (novo clique, troca de aba, página fechada), fechando o stream e liberando a vaga.
+        previa = st.empty()
+        partes = []
+        if especulacao is not None:
+            fluxo = especulacao.acompanhar()
+        else:
+            fluxo = gemini_client.stream_texto(default_model_name, prompt, max_tokens, temperature, top_p, top_k, text_type=text_type,
+                                               usuario=st.session_state.usuario_id, tom=tone, instrucao_sistema=instrucao_sistema,
+                                               cancelamento=cancelamento)
+        try:
+            for pedaco in fluxo:
+                partes.append(pedaco)
+                previa.markdown(''.join(partes) + '▌')
+        finally:
+            fluxo.close()
+        previa.empty()
+        return ''.join(partes)
+
+    except (admission.ServidorOcupado, usage.OrcamentoEsgotado, transport.PrazoEsgotado) as e: # Sobrecarga, limite de uso ou prazo: avisa na hora
+        st.warning(str(e))
+        return None
+    except cancellation.ChamadaCancelada: # Substituída por um pedido mais novo desta sessão
+        st.info("Chamada cancelada: um pedido mais novo tomou o lugar desta.")
+        return None
+    except Exception as e:
+        st.error(f"Ocorreu um erro na interação com o modelo '{default_model_name}': {e}")
+        st.warning("Verifique o nome do modelo no código, sua chave de API e conexão com a internet.")
+        return None
 
-        return response.text
 
+# Correção de arquivos enviados (.txt/.docx)
+def corrigir_arquivo(arquivo, tom, cancelamento=None):
+    """Corrige um documento enviado, lido em fluxo de parágrafos, mostrando o progresso. Retorna None em caso de erro."""
+    progresso = st.empty()
+    corrigidos, sugestoes = [], []
+    enviados = reaproveitados = grupos_com_falha = 0
+    try:
+        paragrafos = ingestion.ler_paragrafos(arquivo, arquivo.name)
+        for grupo in incremental_correction.corrigir_documento(default_model_name, paragrafos, tom,
+                                                               st.session_state.setdefault('cache_paragrafos', {}),
+                                                               usuario=st.session_state.usuario_id, cancelamento=cancelamento):
+            corrigidos.extend(grupo['paragrafos'])
+            sugestoes.extend(grupo['sugestoes'])
+            enviados += grupo['enviados']
+            reaproveitados += grupo['reaproveitados']
+            grupos_com_falha += grupo['falhou']
+            progresso.caption(f"{len(corrigidos)} parágrafo(s) corrigido(s)...")
+    except ingestion.DocumentoInvalido as e:
+        st.error(str(e))
+        return None
+    except (admission.ServidorOcupado, usage.OrcamentoEsgotado, transport.PrazoEsgotado) as e: # Sobrecarga, limite de uso ou prazo: avisa na hora
+        st.warning(str(e))
+        return None
+    except cancellation.ChamadaCancelada: # Substituída por um pedido mais novo desta sessão
+        st.info("Correção cancelada: um pedido mais novo tomou o lugar desta.")
+        return None
     except Exception as e:
         st.error(f"Ocorreu um erro na interação com o modelo '{default_model_name}': {e}")
-        st.warning("Verifique o nome do modelo no código, sua chave de API e conexão com a internet.")
         return None
+    if not corrigidos:
+        st.warning("O arquivo não tem texto para corrigir.")
+        return None
+    progresso.caption(f"{len(corrigidos)} parágrafo(s) no arquivo: {enviados} enviado(s) à IA, {reaproveitados} reaproveitado(s) de correções anteriores.")
+    if grupos_com_falha:
+        st.warning("Alguns trechos não puderam ser corrigidos e ficaram como no original.")
+    return edit_correction.formatar_resultado('\n\n'.join(corrigidos), sugestoes)
 
 
 # Dicionários de opções
@@ -87,6 +182,19 @@ tons_disponiveis = {
     'Neutro': 'Neutro'
 }
 
+# Limite de variantes disparadas ao mesmo tempo no modo comparação
+MAX_VARIANTES_COMPARACAO = 9
+
+
+def gerar_variante(tipo, tom, tema, versoes=1, usuario=None, cancelamento=None):
+    """Gera as versões de uma combinação tipo + tom (modo comparação). Roda numa thread, por isso não usa st.*"""
+    prompt_geracao, max_tok, temp, top_p_val, top_k_val = prompts.montar_prompt_geracao(tipo, tom, tema)
+    # Várias versões do mesmo prompt saem numa única chamada (candidate_count)
+    return gemini_client.gerar_candidatos(default_model_name, prompt_geracao, max_tok, temp, top_p_val, top_k_val,
+                                          candidate_count=versoes, text_type=tipo, usuario=usuario, tom=tom,
+                                          instrucao_sistema=prompts.instrucao_geracao(tipo), cancelamento=cancelamento)
+
+
 # --- CSS Personalizado para o Fundo e Estilo ---
 # Mantido como estava
 custom_css = f"""
@@ -223,63 +331,35 @@ elif st.session_state.page == 'app':
 
         tema = st.text_input(f"Tema/Assunto para o '{tipo_selecionado}':")
 
+        # Geração especulativa: com os campos estáveis, a geração começa antes do clique (GERAI_PREFETCH=1)
+        especulacao = None
+        if prefetch.ativo():
+            especulacao = prefetch.agendar(st.session_state.get('prefetch'), default_model_name, st.session_state.usuario_id,
+                                           tipo_selecionado, tom_selecionado, tema)
+            st.session_state.prefetch = especulacao
+
         if st.button("Gerar Texto", key='btn_gerar'):
             if not tema:
                 st.warning("Por favor, digite um tema/assunto.")
             else:
-                prompt_geracao = f"""Crie um texto completo e bem estruturado do tipo "{tipo_selecionado}" sobre o tema/assunto: "{tema}"
-                Use um tom "{tom_selecionado}".
-                Não use gírias, palavrões ou termos complexos demais a menos que o tema ou o tom técnico exijam e sejam explicados.
-                Responda em formato Markdown.
-                """
-                temp = 0.7
-                max_tok = 1000
-                top_p_val = 0.9
-                top_k_val = 0
-
-                if tipo_selecionado == 'Artigo/Texto Acadêmico':
-                     prompt_geracao += "\nInclua introdução, desenvolvimento com argumentos e exemplos relevantes, e conclusão. Mantenha a formalidade e objetividade."
-                     temp = 0.6
-                     max_tok = 1800
-                     top_p_val = 0.95
-                     top_k_val = 50
-                elif tipo_selecionado == 'E-mail Profissional':
-                     prompt_geracao += "\nFormate a resposta como um e-mail profissional pronto para envio, com linhas para Assunto: e Corpo:."
-                     temp = 0.5
-                     max_tok = 800
-                     top_p_val = 0.9
-                     top_k_val = 0
-                elif tipo_selecionado == 'Post para Redes Sociais':
-                     prompt_geracao += "\nSeja conciso (máximo 280 caracteres se for Twitter, ajuste para outras redes), use linguagem engajadora e inclua hashtags relevantes ao tema."
-                     temp = 0.8
-                     max_tok = 400
-                     top_p_val = 0.9
-                     top_k_val = 0
-                elif tipo_selecionado == 'Conteúdo de Marketing Digital':
-                     prompt_geracao += "\nFoque nos benefícios, crie urgência ou desejo e inclua uma chamada para ação (call to action) clara relevante ao tema/produto/serviço."
-                     temp = 0.9
-                     max_tok = 1000
-                     top_p_val = 0.9
-                     top_k_val = 0
-                elif tipo_selecionado == 'Roteiro Simples':
-                     prompt_geracao += "\nFormate como um roteiro básico, com indicação de cenas, diálogos e ações."
-                     temp = 0.8
-                     max_tok = 1200
-                     top_p_val = 0.95
-                     top_k_val = 50
-                elif tipo_selecionado == 'Descrição de Produto':
-                     prompt_geracao += "\nDescreva as características e benefícios do produto de forma atraente para um público comprador."
-                     temp = 0.7
-                     max_tok = 600
-                     top_p_val = 0.9
-                     top_k_val = 0
+                prompt_geracao, max_tok, temp, top_p_val, top_k_val = prompts.montar_prompt_geracao(tipo_selecionado, tom_selecionado, tema)
 
                 with st.spinner("Gerando texto..."):
-                    texto_novo = interagir_com_gemini(prompt_geracao, max_tok, temp, top_p_val, top_k_val)
+                    texto_novo, do_cache = semantic_cache.gerar_com_cache(
+                        default_model_name, tipo_selecionado, tom_selecionado, tema,
+                        lambda: interagir_com_gemini(prompt_geracao, max_tok, temp, top_p_val, top_k_val, text_type=tipo_selecionado, tone=tom_selecionado,
+                                                     instrucao_sistema=prompts.instrucao_geracao(tipo_selecionado),
+                                                     especulacao=prefetch.aproveitar(especulacao, tipo_selecionado, tom_selecionado, tema))
+                    )
+                prefetch.descartar(especulacao) # Não aproveitada (ex.: o cache semântico respondeu antes)
 
                 if texto_novo:
                     st.subheader("📝 Texto Gerado:")
                     st.markdown(texto_novo)
+                    if do_cache:
+                        st.caption("Texto reaproveitado de um pedido com tema parecido (cache semântico).")
+                    elif especulacao is not None and especulacao.aproveitada:
+                        st.caption("Texto adiantado enquanto você escolhia as opções (geração especulativa).")
 
                     # <-- Adicionado: Adiciona ao histórico da sessão na Geração
                     timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -318,34 +398,175 @@ elif st.session_state.page == 'app':
                              st.warning(f"Não foi possível gerar DOCX para download: {e}")
 
 
+        # --- Modo Comparação: várias versões do mesmo tema lado a lado ---
+        with st.expander("🔀 Comparar versões (vários tons/tipos ao mesmo tempo)"):
+            tipos_comparar = st.multiselect("Tipos de texto:", list(tipos_texto_gerar.keys()), default=[tipo_selecionado], key='comparar_tipos')
+            tons_comparar = st.multiselect("Tons:", list(tons_disponiveis.keys()), default=['Formal', 'Persuasivo', 'Amigável'], key='comparar_tons')
+            versoes_por_combinacao = st.number_input("Versões por combinação:", min_value=1, max_value=4, value=1, key='comparar_versoes')
+
+            if st.button("Comparar Versões", key='btn_comparar'):
+                variantes = [(tipo, tom) for tipo in tipos_comparar for tom in tons_comparar]
+                if not tema:
+                    st.warning("Por favor, digite um tema/assunto.")
+                elif not variantes:
+                    st.warning("Escolha pelo menos um tipo e um tom para comparar.")
+                elif len(variantes) > MAX_VARIANTES_COMPARACAO:
+                    st.warning(f"Escolha no máximo {MAX_VARIANTES_COMPARACAO} combinações de tipo e tom por vez.")
+                else:
+                    # Cria um espaço para cada variante (até 3 por linha), preenchido quando ela terminar
+                    espacos = {}
+                    por_linha = min(3, len(variantes))
+                    for inicio in range(0, len(variantes), por_linha):
+                        colunas = st.columns(por_linha)
+                        for coluna, (tipo, tom) in zip(colunas, variantes[inicio:inicio + por_linha]):
+                            with coluna:
+                                st.markdown(f"**{tipo} · {tom}**")
+                                espacos[(tipo, tom)] = st.empty()
+                                espacos[(tipo, tom)].info("Gerando...")
+
+                    # Dispara todas as variantes ao mesmo tempo: o tempo total fica próximo ao da mais lenta
+                    # Uma chamada nova desta sessão cancela esta comparação; se o script for interrompido no meio
+                    # (rerun, página fechada), as variantes que ainda esperam vaga desistem em vez de rodar à toa
+                    cancelamento = cancellation.substituir(st.session_state.get('chamada_em_andamento'))
+                    st.session_state.chamada_em_andamento = cancelamento
+                    # Sem o `with`: na interrupção, o script não pode ficar esperando as chamadas em andamento
+                    executor = ThreadPoolExecutor(max_workers=len(variantes))
+                    interrompida = True
+                    try:
+                        futuros = {
+                            executor.submit(gerar_variante, tipo, tom, tema, versoes_por_combinacao, st.session_state.usuario_id,
+                                            cancelamento): (tipo, tom)
+                            for tipo, tom in variantes
+                        }
+                        for futuro in as_completed(futuros):
+                            tipo, tom = futuros[futuro]
+                            try:
+                                textos = futuro.result()
+                            except cancellation.ChamadaCancelada:
+                                espacos[(tipo, tom)].info("Cancelada.")
+                                continue
+                            except Exception as e:
+                                espacos[(tipo, tom)].error(f"Ocorreu um erro na interação com o modelo '{default_model_name}': {e}")
+                                continue
+
+                            with espacos[(tipo, tom)].container():
+                                for numero, texto in enumerate(textos, start=1):
+                                    if len(textos) > 1:
+                                        st.caption(f"Versão {numero}")
+                                    st.markdown(texto)
+
+                            # Cada variante vai para o histórico da sessão
+                            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                            for texto in textos:
+                                st.session_state.history.append({
+                                    'type': 'Gerado (comparação)',
+                                    'timestamp': timestamp,
+                                    'content': texto,
+                                    'details': f'Tema: {tema}, Tipo: {tipo}, Tom: {tom}'
+                                })
+                        interrompida = False
+                    finally:
+                        cancelamento.cancelar('abandonada')
+                        # Interrompida (rerun, página fechada): as variantes na fila nem começam e as em andamento
+                        # terminam sozinhas (desistem no próximo pedaço ou na vaga); o script segue sem esperar
+                        executor.shutdown(wait=not interrompida, cancel_futures=interrompida)
+
+
     # --- Seção Corrigir ---
     with tab_corrigir:
         texto_original = st.text_area("Cole o texto que você quer corrigir aqui:", height=300)
+        # Documentos grandes: lidos em fluxo de parágrafos, sem colar (os parágrafos do arquivo são mantidos)
+        arquivo_correcao = st.file_uploader("Ou envie um arquivo (.txt ou .docx):", type=['txt', 'docx'], key='arquivo_corrigir')
         tom_selecionado_correcao = st.selectbox("Tom para a revisão/sugestões:", list(tons_disponiveis.keys()), index=0)
+        # Lista de edições: a IA devolve só o que muda, bem mais rápido em textos longos e quase corretos
+        # Parágrafos alterados: ao corrigir de novo, só o que mudou desde a última correção vai para a IA
+        modo_correcao = st.radio("Modo de correção:", ["Texto completo revisado", "Lista de edições (mais rápido para textos longos)",
+                                                       "Somente parágrafos alterados (reaproveita correções anteriores)"], key='modo_correcao')
 
         if st.button("Corrigir Texto", key='btn_corrigir'):
-            if not texto_original:
-                st.warning("Por favor, cole o texto para corrigir.")
+            if not texto_original and arquivo_correcao is None:
+                st.warning("Por favor, cole o texto ou envie um arquivo para corrigir.")
             else:
-                prompt_correcao = f"""Por favor, revise e aprimore o seguinte texto.
-                Use um tom {tom_selecionado_correcao} na revisão e nas sugestões.
-                Corrija erros de ortografia, gramática, pontuação e dê sugestões para melhorar a clareza, a coesão e a fluidez. Mantenha o significado original do texto.
-                Não use gírias, palavrões ou termos complexos demais a menos que o texto original já os contenha e seja necessário revisá-los.
-                Forneça o texto revisado e, em uma seção separada marcada como "Sugestões:", liste as sugestões de melhoria em tópicos numerados.
-                Responda em formato Markdown.
-
-                Texto a revisar:
-                {texto_original}
-
-                Texto revisado:
-                """
-                temp = 0.5
-                max_tok = 1500
-                top_p_val = 0.9
-                top_k_val = 0
-
-                with st.spinner("Corrigindo e aprimorando texto..."):
-                     texto_revisado_completo = interagir_com_gemini(prompt_correcao, max_tok, temp, top_p_val, top_k_val)
+                correcao_edicoes = None
+                if arquivo_correcao is not None:
+                    with st.spinner("Corrigindo o documento..."), chamada_da_sessao() as cancelamento:
+                        texto_revisado_completo = corrigir_arquivo(arquivo_correcao, tom_selecionado_correcao, cancelamento)
+                else:
+                    # Texto colado sem espaços repetidos (os parágrafos continuam iguais)
+                    texto_original = prompts.normalizar_texto(texto_original)
+                    # As instruções fixas vão em prompts.instrucao_correcao(); aqui só o que muda a cada pedido
+                    prompt_correcao = prompts.montar_prompt_correcao(tom_selecionado_correcao, texto_original)
+                    max_tok, temp, top_p_val, top_k_val = prompts.PARAMETROS_CORRECAO
+
+                    with st.spinner("Corrigindo e aprimorando texto..."), chamada_da_sessao() as cancelamento:
+                        correcao_previa = None
+                        erro_previa = False
+                        if not modo_correcao.startswith("Somente parágrafos") and precheck.ativo():
+                            try:
+                                # Verificação local: sem nada suspeito, nem chama a IA; com poucos trechos, só eles vão
+                                correcao_previa = precheck.corrigir(default_model_name, texto_original, tom_selecionado_correcao,
+                                                                    usuario=st.session_state.usuario_id, cancelamento=cancelamento)
+                            except cancellation.ChamadaCancelada: # Substituída por um pedido mais novo desta sessão
+                                st.info("Correção cancelada: um pedido mais novo tomou o lugar desta.")
+                                erro_previa = True
+                            except Exception as e:
+                                st.error(f"Ocorreu um erro na interação com o modelo '{default_model_name}': {e}")
+                                erro_previa = True
+                        if erro_previa:
+                            texto_revisado_completo = None
+                        elif correcao_previa is not None:
+                            correcao_edicoes = correcao_previa
+                            texto_revisado_completo = correcao_previa['resultado']
+                            if correcao_previa['local']:
+                                st.caption("Verificação local: nenhum problema que precise da IA; o texto não foi enviado e o tom escolhido não foi aplicado.")
+                            else:
+                                st.caption(f"Verificação local: só {correcao_previa['trechos_enviados']} trecho(s) suspeito(s) enviado(s) à IA.")
+                        elif modo_correcao.startswith("Lista de edições"):
+                            try:
+                                # Se as edições não se aplicarem ao texto, cai na correção completa
+                                correcao_edicoes = edit_correction.corrigir_com_edicoes(
+                                    default_model_name, texto_original, tom_selecionado_correcao,
+                                    lambda: interagir_com_gemini(prompt_correcao, max_tok, temp, top_p_val, top_k_val, text_type='corrigir', tone=tom_selecionado_correcao,
+                                                                 instrucao_sistema=prompts.instrucao_correcao(), cancelamento=cancelamento),
+                                    max_tokens=max_tok, usuario=st.session_state.usuario_id, cancelamento=cancelamento
+                                )
+                                texto_revisado_completo = correcao_edicoes['resultado']
+                            except cancellation.ChamadaCancelada: # Substituída por um pedido mais novo desta sessão
+                                st.info("Correção cancelada: um pedido mais novo tomou o lugar desta.")
+                                texto_revisado_completo = None
+                            except Exception as e:
+                                st.error(f"Ocorreu um erro na interação com o modelo '{default_model_name}': {e}")
+                                texto_revisado_completo = None
+                        elif modo_correcao.startswith("Somente parágrafos"):
+                            try:
+                                correcao_incremental = incremental_correction.corrigir_incremental(
+                                    default_model_name, texto_original, tom_selecionado_correcao,
+                                    st.session_state.setdefault('cache_paragrafos', {}),
+                                    lambda: interagir_com_gemini(prompt_correcao, max_tok, temp, top_p_val, top_k_val, text_type='corrigir', tone=tom_selecionado_correcao,
+                                                                 instrucao_sistema=prompts.instrucao_correcao(), cancelamento=cancelamento),
+                                    usuario=st.session_state.usuario_id, cancelamento=cancelamento
+                                )
+                                texto_revisado_completo = correcao_incremental['resultado']
+                                st.caption(f"{correcao_incremental['enviados']} parágrafo(s) enviado(s) à IA, "
+                                           f"{correcao_incremental['reaproveitados']} de {correcao_incremental['total']} reaproveitado(s) de correções anteriores.")
+                            except cancellation.ChamadaCancelada: # Substituída por um pedido mais novo desta sessão
+                                st.info("Correção cancelada: um pedido mais novo tomou o lugar desta.")
+                                texto_revisado_completo = None
+                            except Exception as e:
+                                st.error(f"Ocorreu um erro na interação com o modelo '{default_model_name}': {e}")
+                                texto_revisado_completo = None
+                        else:
+                            texto_revisado_completo = interagir_com_gemini(prompt_correcao, max_tok, temp, top_p_val, top_k_val, text_type='corrigir', tone=tom_selecionado_correcao,
+                                                                       instrucao_sistema=prompts.instrucao_correcao(), cancelamento=cancelamento)
+
+                if texto_revisado_completo and correcao_edicoes and correcao_edicoes['modo'] == 'edicoes':
+                    st.subheader("🔍 Alterações:")
+                    st.markdown(correcao_edicoes['diff'])
+                    with st.expander(f"Edições aplicadas ({len(correcao_edicoes['edicoes'])})"):
+                        for edicao in correcao_edicoes['edicoes']:
+                            st.write(f"~~{edicao['trecho']}~~ → **{edicao['substituicao']}** — {edicao['motivo']}")
+                elif texto_revisado_completo and correcao_edicoes:
+                    st.info("As edições sugeridas não se encaixaram no texto; usamos a correção completa.")
 
                 if texto_revisado_completo:
                     st.subheader("✨ Texto Revisado e Sugestões:")
@@ -0,0 +1,5 @@
+# Os módulos do GerAI ficam na raiz do repositório (scripts, sem pacote)
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
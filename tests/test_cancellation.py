@@ -0,0 +1,16 @@
+import pytest
+
+import cancellation
+
+
+def test_verificar_avisa_antes_de_conferir_o_cancelamento():
+    avisos = []
+    cancelamento = cancellation.substituir(None, ao_verificar=lambda: avisos.append('pedaço'))
+    cancelamento.verificar()
+    assert avisos == ['pedaço']
+
+    # A chamada seguinte da sessão cancela esta; o aviso ainda acontece (é o ponto de interrupção)
+    cancellation.substituir(cancelamento)
+    with pytest.raises(cancellation.ChamadaCancelada):
+        cancelamento.verificar()
+    assert avisos == ['pedaço', 'pedaço']
@@ -0,0 +1,51 @@
+import pytest
+
+pytest.importorskip('google.generativeai') # incremental_correction chama o modelo por gemini_client
+
+import incremental_correction
+
+
+@pytest.fixture
+def modelo_falso(monkeypatch):
+    """Troca a chamada ao modelo por uma "correção" que põe o parágrafo em maiúsculas."""
+    enviados = []
+
+    def corrigir(model_name, paragrafos, tom, usuario=None, cancelamento=None):
+        enviados.append(list(paragrafos))
+        return [p.upper() for p in paragrafos], [(f"Sugestão para {p}",) for p in paragrafos]
+
+    monkeypatch.setattr(incremental_correction, '_corrigir_paragrafos', corrigir)
+    monkeypatch.setattr(incremental_correction, 'MAX_PARAGRAFOS_SESSAO', 3)
+    return enviados
+
+
+def _corrigir(cache, paragrafos):
+    grupos = list(incremental_correction.corrigir_documento('modelo', paragrafos, 'Formal', cache, persistente=False))
+    return [p for grupo in grupos for p in grupo['paragrafos']]
+
+
+def test_paragrafo_reaproveitado_continua_corrigido_quando_sai_do_cache(modelo_falso):
+    cache = {}
+    assert _corrigir(cache, ['velho um', 'velho dois', 'velho tres']) == ['VELHO UM', 'VELHO DOIS', 'VELHO TRES']
+    assert _corrigir(cache, ['velho um', 'novo']) == ['VELHO UM', 'NOVO']
+    assert modelo_falso[-1] == ['novo']
+
+
+def test_cache_da_sessao_tira_o_usado_ha_mais_tempo(modelo_falso):
+    cache = {}
+    _corrigir(cache, ['um', 'dois', 'tres'])
+    _corrigir(cache, ['um']) # Reaproveitado: passa a ser o mais recente
+    _corrigir(cache, ['quatro'])
+    assert _corrigir(cache, ['um']) == ['UM']
+    assert modelo_falso[-1] == ['quatro']
+
+
+def test_sugestoes_dos_paragrafos_reaproveitados_continuam_no_resultado(modelo_falso):
+    cache = {}
+    corrigir = lambda texto: incremental_correction.corrigir_incremental('modelo', texto, 'Formal', cache, lambda: None,
+                                                                          persistente=False)
+    corrigir("primeiro\n\nsegundo")
+    resultado = corrigir("primeiro\n\nsegundo editado")
+    assert modelo_falso[-1] == ['segundo editado']
+    assert "Sugestão para primeiro" in resultado['resultado']
+    assert "Sugestão para segundo editado" in resultado['resultado']
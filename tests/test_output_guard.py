@@ -0,0 +1,47 @@
+import output_guard
+
+
+def _transmitir(guarda, texto, tamanho):
+    saida = ''
+    for inicio in range(0, len(texto), tamanho):
+        saida += guarda.filtrar(texto[inicio:inicio + tamanho])
+        if guarda.motivo is not None:
+            return saida
+    return saida + guarda.finalizar()
+
+
+def test_limite_de_caracteres_corta_no_fim_de_frase():
+    for tamanho in (1, 7, 50, 4000):
+        guarda = output_guard.para_tipo('Post para Redes Sociais')
+        saida = _transmitir(guarda, "Ideia 1: texto curto. " * 60, tamanho)
+        assert guarda.motivo == 'caracteres'
+        assert len(saida) <= 800
+        assert saida.endswith('texto curto.'), (tamanho, saida[-30:])
+
+
+def test_texto_sem_fim_de_frase_corta_no_espaco():
+    guarda = output_guard.para_tipo('Post para Redes Sociais')
+    saida = _transmitir(guarda, "palavra " * 200, 4000)
+    assert guarda.motivo == 'caracteres'
+    assert 0 < len(saida) <= 800
+    assert saida.endswith('palavra')
+
+
+def test_texto_curto_passa_inteiro():
+    guarda = output_guard.para_tipo('Post para Redes Sociais')
+    texto = "Post curto.\n\n#hashtag "
+    assert _transmitir(guarda, texto, 3) == texto
+    assert guarda.motivo is None
+
+
+def test_email_termina_na_assinatura():
+    texto = "Prezado João,\n\nSegue o relatório.\n\nAtenciosamente,\nMaria\nGerente\n\n**Observação:** personalize o nome."
+    for tamanho in (1, 5, 200):
+        guarda = output_guard.para_tipo('E-mail Profissional')
+        assert _transmitir(guarda, texto, tamanho) == "Prezado João,\n\nSegue o relatório.\n\nAtenciosamente,\nMaria\nGerente"
+
+
+def test_tipo_sem_limites_ou_desligado(monkeypatch):
+    assert output_guard.para_tipo('Artigo') is None
+    monkeypatch.setenv('GERAI_LIMITES_SAIDA', '0')
+    assert output_guard.para_tipo('Post para Redes Sociais') is None
@@ -0,0 +1,44 @@
+import pytest
+
+pytest.importorskip('google.generativeai') # precheck chama o modelo por gemini_client
+
+import precheck
+
+
+def _suspeitos(texto):
+    fronteiras = []
+    corrigido, _ = precheck.corrigir_triviais(texto, fronteiras)
+    return corrigido, precheck.trechos_suspeitos(corrigido, fronteiras=fronteiras)
+
+
+def test_ponto_colado_na_frase_seguinte_vai_para_o_modelo():
+    corrigido, trechos = _suspeitos("comprei pão, leite e ovos.ele não gostou.")
+    assert "ovos.ele" in corrigido
+    assert trechos
+
+
+def test_minuscula_depois_de_interrogacao_nao_vira_maiuscula():
+    corrigido, trechos = _suspeitos("Você vem? perguntou ele.")
+    assert corrigido == "Você vem? perguntou ele."
+    assert trechos # Diálogo ou maiúscula esquecida: quem decide é o modelo
+
+
+def test_maiuscula_no_meio_do_texto_nao_e_resultado_final():
+    corrigido, trechos = _suspeitos("o dia foi bom. ele saiu cedo.")
+    assert corrigido == "O dia foi bom. Ele saiu cedo."
+    assert trechos
+
+
+@pytest.mark.parametrize('texto', [
+    "Eu esta cansado e nos vai sair.",
+    "Ele esta cansado.",
+    "Eles tem dois carros.",
+])
+def test_acento_e_concordancia_vao_para_o_modelo(texto):
+    assert _suspeitos(texto)[1]
+
+
+def test_texto_correto_fica_local():
+    corrigido, trechos = _suspeitos("Hoje o dia está bonito. Vamos sair?")
+    assert corrigido == "Hoje o dia está bonito. Vamos sair?"
+    assert trechos == []
@@ -0,0 +1,14 @@
+import prompts
+
+
+def test_normalizar_texto_mantem_o_recuo():
+    texto = "    - item\n        - subitem\n    def f():\n        return 1"
+    assert prompts.normalizar_texto(texto) == texto
+
+
+def test_normalizar_texto_junta_espacos_dentro_das_linhas():
+    assert prompts.normalizar_texto("Um   texto\tcom  espaços.   \r\n  Recuo   mantido.  ") == "Um texto com espaços.\n  Recuo mantido."
+
+
+def test_normalizar_texto_limita_linhas_em_branco():
+    assert prompts.normalizar_texto("\n\nPrimeiro.\n \n\n\t\nSegundo.\n\n") == "Primeiro.\n\nSegundo."
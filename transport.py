@@ -0,0 +1,210 @@
+# Transporte e conexão com a API do Gemini
+# genai.configure(api_key=...) usava sempre os padrões do SDK: gRPC, sem keepalive, prazo padrão
+# de cada método e um cliente novo a cada configure (no Streamlit, a cada rerun do script: uma
+# conexão nova, com handshake TLS, a cada interação). Aqui a configuração vem do .env e vale para
+# os três scripts:
+# - GERAI_TRANSPORTE escolhe gRPC ou REST (HTTP/1.1 + JSON);
+# - no gRPC, o keepalive mantém o canal aquecido entre pedidos espaçados (e detecta conexões mortas);
+# - no REST, o pool de conexões do requests acompanha o limite de chamadas simultâneas;
+# - o cliente só é refeito quando a configuração muda, então o canal é reaproveitado entre reruns;
+# - cada pedido pode ter um prazo (GERAI_PRAZO, por prioridade), passado ao SDK como timeout;
+# - cada chamada iniciada pode ser cancelada de outra thread (ex.: a duplicata perdedora do hedging,
+#   ainda esperando o primeiro pedaço), sem esperar o próximo pedaço chegar.
+# GERAI_API_ENDPOINT aponta para outro servidor (ex.: o servidor local de benchmark_transporte.py);
+# com http:// o canal é aberto sem TLS.
+
+import contextlib
+import functools
+import threading
+import time
+
+import google.generativeai as genai
+import grpc
+import requests
+from google.api_core import exceptions as google_exceptions
+
+import config
+import metrics
+
+TRANSPORTES = ('grpc', 'rest')
+KEEPALIVE_TIMEOUT_PADRAO = 20 # Segundos esperando a resposta do ping antes de dar a conexão como morta
+POOL_REST_MINIMO = 10 # Conexões mantidas pelo requests (o padrão dele)
+
+_configuracao = None # Configuração aplicada por último (não reconfigura se nada mudou)
+_lock = threading.Lock()
+_local = threading.local() # Quem quer saber das chamadas iniciadas nesta thread (ao_iniciar_chamada)
+
+
+class PrazoEsgotado(TimeoutError):
+    """A chamada ao modelo passou do prazo configurado (GERAI_PRAZO)."""
+
+
+def transporte():
+    """Transporte configurado (GERAI_TRANSPORTE): 'grpc' (padrão do SDK) ou 'rest'."""
+    valor = config.ler_str('GERAI_TRANSPORTE', 'grpc').lower()
+    return valor if valor in TRANSPORTES else 'grpc'
+
+
+def prazo(prioridade):
+    """Prazo (s) de uma chamada da prioridade (GERAI_PRAZO_<PRIORIDADE>, senão GERAI_PRAZO). None = padrão do SDK."""
+    valor = config.ler_float(f'GERAI_PRAZO_{prioridade.upper()}', config.ler_float('GERAI_PRAZO', 0))
+    return valor if valor > 0 else None
+
+
+def _ler_configuracao():
+    endpoint = config.ler_str('GERAI_API_ENDPOINT')
+    return {
+        'transporte': transporte(),
+        'endpoint': endpoint,
+        'inseguro': bool(endpoint) and endpoint.startswith('http://'),
+        'keepalive': config.ler_float('GERAI_GRPC_KEEPALIVE', 0),
+        'keepalive_timeout': config.ler_float('GERAI_GRPC_KEEPALIVE_TIMEOUT', KEEPALIVE_TIMEOUT_PADRAO),
+        'pool_rest': max(POOL_REST_MINIMO, config.ler_int('GERAI_MAX_CONCORRENCIA', 8)),
+    }
+
+
+# --- Cancelamento das chamadas em andamento ---
+
+@contextlib.contextmanager
+def ao_iniciar_chamada(funcao):
+    """Durante o bloco, cada chamada ao modelo iniciada nesta thread passa a `funcao` uma função que a cancela.
+
+    No gRPC, cancelar interrompe o RPC mesmo antes do primeiro pedaço; no REST, fecha a resposta
+    (depois que os cabeçalhos chegaram). A thread que lia o stream recebe a exceção do SDK.
+    """
+    anterior = getattr(_local, 'ao_iniciar', None)
+    _local.ao_iniciar = funcao
+    try:
+        yield
+    finally:
+        _local.ao_iniciar = anterior
+
+
+def _avisar_inicio(cancelar):
+    funcao = getattr(_local, 'ao_iniciar', None)
+    if funcao is not None:
+        funcao(cancelar)
+
+
+class _AvisoDeChamada(grpc.UnaryStreamClientInterceptor):
+    """Entrega o RPC de streaming, assim que criado, a quem pediu em ao_iniciar_chamada()."""
+
+    def intercept_unary_stream(self, continuation, client_call_details, request):
+        chamada = continuation(client_call_details, request)
+        _avisar_inicio(chamada.cancel)
+        return chamada
+
+
+def _avisar_resposta_rest(resposta, *args, **kwargs):
+    _avisar_inicio(resposta.close)
+
+
+# --- Cliente do serviço de geração ---
+
+def _opcoes_canal(configuracao):
+    """Opções extras do canal gRPC (keepalive)."""
+    if not configuracao['keepalive']:
+        return []
+    return [
+        ('grpc.keepalive_time_ms', int(configuracao['keepalive'] * 1000)),
+        ('grpc.keepalive_timeout_ms', int(configuracao['keepalive_timeout'] * 1000)),
+        ('grpc.keepalive_permit_without_calls', 1), # Pinga também entre pedidos: é aí que a conexão esfria
+        ('grpc.http2.max_pings_without_data', 0),
+    ]
+
+
+def _criar_canal(configuracao, host, options=(), **kwargs):
+    """Cria o canal gRPC do cliente: com TLS (como o SDK faz) ou sem, para um servidor local."""
+    from google.ai.generativelanguage_v1beta.services.generative_service.transports.grpc import GenerativeServiceGrpcTransport
+
+    options = list(options) + _opcoes_canal(configuracao)
+    if configuracao['inseguro']:
+        canal = grpc.insecure_channel(host, options=options)
+    else:
+        canal = GenerativeServiceGrpcTransport.create_channel(host, options=options, **kwargs)
+    return grpc.intercept_channel(canal, _AvisoDeChamada())
+
+
+def _cliente_geracao(configuracao):
+    """Cliente do GenerativeService com as opções de conexão e o aviso das chamadas iniciadas."""
+    from google.generativeai.client import _client_manager
+
+    if configuracao['transporte'] == 'rest':
+        cliente = _client_manager.make_client('generative')
+        # Acima de 10 chamadas simultâneas o requests descartaria as conexões excedentes a cada pedido
+        adaptador = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=configuracao['pool_rest'])
+        cliente._transport._session.mount('https://', adaptador)
+        cliente._transport._session.mount('http://', adaptador)
+        cliente._transport._session.hooks['response'].append(_avisar_resposta_rest)
+        return cliente
+
+    from google.ai.generativelanguage_v1beta.services.generative_service.transports.grpc import GenerativeServiceGrpcTransport
+    import google.ai.generativelanguage as glm
+
+    opcoes = dict(_client_manager.client_config)
+    opcoes['transport'] = functools.partial(GenerativeServiceGrpcTransport,
+                                            channel=functools.partial(_criar_canal, configuracao))
+    return glm.GenerativeServiceClient(**opcoes)
+
+
+def configurar(api_key):
+    """Configura o SDK (no lugar de genai.configure) com o transporte e as opções de conexão do .env.
+
+    Chamado a cada execução dos scripts; só refaz os clientes (e as conexões) se algo mudou.
+    """
+    global _configuracao
+    configuracao = _ler_configuracao()
+    with _lock:
+        if _configuracao == (api_key, configuracao):
+            return
+        opcoes_cliente = {'api_key': api_key}
+        if configuracao['endpoint']:
+            # O REST entende o http:// do endereço; o gRPC recebe só host:porta
+            endpoint = configuracao['endpoint']
+            if configuracao['transporte'] == 'grpc':
+                endpoint = endpoint.split('://', 1)[-1]
+            opcoes_cliente['api_endpoint'] = endpoint.rstrip('/')
+        genai.configure(transport=configuracao['transporte'], client_options=opcoes_cliente)
+        try:
+            cliente = _cliente_geracao(configuracao)
+        except Exception:
+            # Opção de conexão não suportada por esta versão do SDK: segue com os padrões
+            metrics.incrementar('transporte.erros_configuracao')
+            cliente = None
+        if cliente is not None:
+            from google.generativeai.client import _client_manager
+            _client_manager.clients['generative'] = cliente
+        _configuracao = (api_key, configuracao)
+        metrics.incrementar(f"transporte.configuracoes.{configuracao['transporte']}")
+
+
+# --- Prazo por pedido ---
+
+def opcoes_pedido(limite):
+    """request_options do generate_content para terminar até `limite` (time.monotonic()); {} sem prazo."""
+    if limite is None:
+        return {}
+    restante = limite - time.monotonic()
+    if restante <= 0:
+        metrics.incrementar('transporte.prazos_esgotados')
+        raise PrazoEsgotado("A chamada ao modelo passou do prazo configurado.")
+    return {'timeout': restante}
+
+
+def verificar_prazo(limite):
+    """Levanta PrazoEsgotado se `limite` passou.
+
+    No REST o timeout do SDK vale para cada leitura, não para o stream inteiro: conferimos a cada pedaço.
+    """
+    if limite is not None:
+        opcoes_pedido(limite)
+
+
+@contextlib.contextmanager
+def traduzir_prazo():
+    """Troca o prazo esgotado do lado do SDK (DeadlineExceeded no gRPC, timeout de leitura no REST) por PrazoEsgotado."""
+    try:
+        yield
+    except (google_exceptions.DeadlineExceeded, requests.exceptions.Timeout) as e:
+        metrics.incrementar('transporte.prazos_esgotados')
+        raise PrazoEsgotado("A chamada ao modelo passou do prazo configurado.") from e
@@ -0,0 +1,156 @@
+# Contagem de tokens, custo estimado e orçamentos de uso do Gemini
+# Cada chamada ao modelo grava os tokens de entrada/saída (response.usage_metadata) na tabela
+# `token_usage` do gerai_history.db, com usuário, dia, tipo de texto e tom. Daí saem os resumos
+# (por usuário, dia, tipo e tom) e os orçamentos: antes de enviar, conferimos o consumo do dia e,
+# se um limite foi atingido, a chamada é recusada (ou, perto do limite, vai para o fim da fila).
+
+import sqlite3
+from datetime import datetime
+
+import admission
+import config
+import history_db
+import metrics
+
+# Preço padrão (US$ por milhão de tokens) do gemini-1.5-flash; ajuste via .env para outros modelos
+PRECO_ENTRADA_MILHAO = 0.075
+PRECO_SAIDA_MILHAO = 0.30
+
+# Colunas que podem ser usadas para agrupar o resumo de uso
+AGRUPAMENTOS = {'dia': 'day', 'usuario': 'user_id', 'tipo': 'text_type', 'tom': 'tone', 'modelo': 'model_used'}
+
+
+class OrcamentoEsgotado(Exception):
+    """O limite diário de tokens foi atingido; a chamada nem chegou a ser enviada."""
+
+    def __init__(self, escopo, usado, limite):
+        self.escopo = escopo
+        self.usado = usado
+        self.limite = limite
+        super().__init__(f"Limite diário de uso {escopo} atingido ({usado} de {limite} tokens). Tente novamente amanhã.")
+
+
+def _hoje():
+    return datetime.now().strftime('%Y-%m-%d')
+
+
+def init_tabela(conn):
+    """Cria a tabela de uso se não existir."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS token_usage (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            day TEXT, -- YYYY-MM-DD, para os orçamentos e resumos diários
+            user_id TEXT,
+            model_used TEXT,
+            text_type TEXT,
+            tone TEXT,
+            prompt_tokens INTEGER,
+            output_tokens INTEGER
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_token_usage_day_user ON token_usage (day, user_id)')
+
+
+def ler_uso(response):
+    """Extrai (tokens de entrada, tokens de saída) do usage_metadata de uma resposta, ou None se não houver."""
+    uso = getattr(response, 'usage_metadata', None)
+    if not uso:
+        return None
+    return getattr(uso, 'prompt_token_count', 0) or 0, getattr(uso, 'candidates_token_count', 0) or 0
+
+
+def registrar(model_name, usuario, text_type, tom, prompt_tokens, output_tokens):
+    """Grava o consumo de uma chamada. Falhas no banco não interrompem a geração (só contam nas métricas)."""
+    metrics.incrementar('tokens.entrada', prompt_tokens)
+    metrics.incrementar('tokens.saida', output_tokens)
+    agora = datetime.now()
+    try:
+        conn = history_db.conectar()
+        try:
+            init_tabela(conn)
+            conn.execute('''
+                INSERT INTO token_usage (timestamp, day, user_id, model_used, text_type, tone, prompt_tokens, output_tokens)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (agora.strftime('%Y-%m-%d %H:%M:%S'), agora.strftime('%Y-%m-%d'), usuario or 'anonimo',
+                  model_name, text_type, tom, prompt_tokens, output_tokens))
+            conn.commit()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        metrics.incrementar('tokens.erros_gravacao')
+
+
+def consumo_dia(usuario=None, dia=None):
+    """Total de tokens (entrada + saída) do dia, de um usuário ou de todos."""
+    conn = history_db.conectar()
+    try:
+        init_tabela(conn)
+        sql = 'SELECT COALESCE(SUM(prompt_tokens + output_tokens), 0) FROM token_usage WHERE day = ?'
+        parametros = [dia or _hoje()]
+        if usuario is not None:
+            sql += ' AND user_id = ?'
+            parametros.append(usuario)
+        return conn.execute(sql, parametros).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def verificar_orcamento(usuario, prioridade):
+    """Confere os limites diários antes de enviar uma chamada.
+
+    Levanta OrcamentoEsgotado se um limite foi atingido. Acima da fração de alerta do limite, a chamada
+    continua, mas perde prioridade (vai para a fila do lote). Retorna a prioridade a usar.
+    """
+    limites = [('geral', None, config.ler_int('GERAI_ORCAMENTO_TOKENS_DIA', 0))]
+    if usuario is not None:
+        limites.append(('do usuário', usuario, config.ler_int('GERAI_ORCAMENTO_TOKENS_USUARIO_DIA', 0)))
+
+    fracao_alerta = config.ler_float('GERAI_ORCAMENTO_FRACAO_ALERTA', 0.8)
+    for escopo, dono, limite in limites:
+        if limite <= 0:
+            continue # Sem limite configurado
+        usado = consumo_dia(dono)
+        if usado >= limite:
+            metrics.incrementar('tokens.recusadas_orcamento')
+            raise OrcamentoEsgotado(escopo, usado, limite)
+        if usado >= limite * fracao_alerta and prioridade == admission.INTERATIVA:
+            metrics.incrementar('tokens.rebaixadas_orcamento')
+            prioridade = admission.LOTE
+    return prioridade
+
+
+def custo(prompt_tokens, output_tokens):
+    """Custo estimado (US$) a partir dos preços configurados."""
+    preco_entrada = config.ler_float('GERAI_PRECO_ENTRADA_MILHAO', PRECO_ENTRADA_MILHAO)
+    preco_saida = config.ler_float('GERAI_PRECO_SAIDA_MILHAO', PRECO_SAIDA_MILHAO)
+    return (prompt_tokens * preco_entrada + output_tokens * preco_saida) / 1_000_000
+
+
+def resumo(agrupar_por='dia', dias=30):
+    """Consumo dos últimos `dias` dias agrupado por 'dia', 'usuario', 'tipo', 'tom' ou 'modelo'.
+
+    Retorna uma lista de dicionários (do maior para o menor consumo, ou por dia mais recente).
+    """
+    coluna = AGRUPAMENTOS[agrupar_por]
+    conn = history_db.conectar()
+    try:
+        init_tabela(conn)
+        linhas = conn.execute(f'''
+            SELECT COALESCE({coluna}, '-'), COUNT(*), SUM(prompt_tokens), SUM(output_tokens)
+            FROM token_usage WHERE day >= date('now', 'localtime', ?)
+            GROUP BY 1 ORDER BY {'1 DESC' if agrupar_por == 'dia' else 'SUM(prompt_tokens + output_tokens) DESC'}
+        ''', (f'-{dias} days',)).fetchall()
+    finally:
+        conn.close()
+    return [
+        {
+            agrupar_por: chave,
+            'chamadas': chamadas,
+            'tokens_entrada': entrada,
+            'tokens_saida': saida,
+            'tokens_total': entrada + saida,
+            'custo_usd': round(custo(entrada, saida), 6),
+        }
+        for chave, chamadas, entrada, saida in linhas
+    ]